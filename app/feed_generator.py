@@ -2,21 +2,45 @@
 import os
 import pathlib
 import logging
-import eyed3
 from datetime import datetime, timedelta, timezone
 from wsgiref.handlers import format_date_time
 import glob
 from dataclasses import dataclass
-from itertools import groupby
-from jinja2 import Template, Environment, FileSystemLoader
+from jinja2 import Template, Environment, FileSystemLoader, FileSystemBytecodeCache
 import json
 from typing import Any
 from email.utils import formatdate
 import hashlib
 import time
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple, Callable
 import urllib
 import pickle
+import dataclasses
+import tempfile
+import bisect
+import sqlite3
+import threading
+from contextlib import contextmanager, ExitStack
+import multiprocessing
+import gzip
+import shutil
+import io
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import OrderedDict
+import tag_reader
+import metrics
+import cProfile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
 
 # ロガー設定
 logging.basicConfig(
@@ -30,17 +54,39 @@ app_root_url: str = os.environ["APP_ROOT_URL"]
 
 timezone = timezone(timedelta(hours=9))
 
-@dataclass
+output_files_total = metrics.registry.counter("podcast_output_files_total", "Number of feed and index outputs, by whether the content changed.")
+catalog_size = metrics.registry.gauge("podcast_catalog_size", "Number of tracks and albums in the resident catalog.")
+
+@dataclass(slots=True)
 class MusicInfo:
+    """トラックの情報
+
+    全トラックをメモリ上に常駐させるため、インスタンスごとの __dict__ を持たせない。
+    配信URLはパスから都度求め、アルバム名とサムネイルのURLは同じ値を共有する（intern）。
+    """
     fullpath: str = ""
     album_name: str = ""
     title: str = ""
     duration_seconds: int = ""
-    absolute_url: str = ""
     file_size_bytes: int = 0
     created_timestamp: int = 0
     thumbnail_url: str = ""
 
+    def __post_init__(self):
+        if isinstance(self.album_name, str):
+            self.album_name = sys.intern(self.album_name)
+        if isinstance(self.thumbnail_url, str):
+            self.thumbnail_url = sys.intern(self.thumbnail_url)
+
+    @property
+    def absolute_url(self) -> str:
+        return FileIO.get_absolute_url(self.fullpath)
+
+    @property
+    def mime_type(self) -> str:
+        """enclosure に載せる MIME タイプ（拡張子から求める）"""
+        return FileIO.get_mime_type(self.fullpath)
+
     def md5(self) -> str:
         return hashlib.md5((self.album_name + self.title).encode()).hexdigest()
 
@@ -51,180 +97,917 @@ class FeedInfo:
     def hash(self) -> str:
         return hashlib.md5(self.album_name.encode()).hexdigest()
 
-    def url(self) -> str:
+    def page_suffix(self, page_number: int) -> str:
+        # 0 は先頭ページ、1以上はページ分割時のアーカイブページ（古い方から1始まり）
+        return f"-{page_number}" if page_number > 0 else ""
+
+    def url(self, page_number: int = 0) -> str:
         hash = self.hash()
-        return f"{FileIO.feeds_dir_url}{hash}.xml"
+        return f"{FileIO.feeds_dir_url}{hash}{self.page_suffix(page_number)}.xml"
 
-    def file_path(self) -> str:
+    def file_path(self, page_number: int = 0) -> str:
         hash = self.hash()
-        return f"{FileIO.output_xml_dir_path}{hash}.xml"
+        return f"{FileIO.output_xml_dir_path}{hash}{self.page_suffix(page_number)}.xml"
+
+StatKey = Tuple[int, int, int]
+
+class MusicIndex:
+    """音楽ファイルのインデックス（SQLite）
+
+    トラック単位で追加・削除・検索でき、書き込みはトランザクションで行うため
+    途中でプロセスが落ちてもインデックスが壊れない。
+    タグが無効だったファイルも stat キー付きで記録し、再起動時の再解析を避ける。
+    """
+
+    music_info_columns = ["fullpath", "album_name", "title", "duration_seconds",
+                          "file_size_bytes", "created_timestamp", "thumbnail_url"]
+
+    def __init__(self, db_file_path: str):
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(db_file_path, check_same_thread=False, isolation_level=None)
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS tracks (
+                    fullpath TEXT PRIMARY KEY,
+                    album_name TEXT NOT NULL,
+                    title TEXT,
+                    duration_seconds REAL,
+                    absolute_url TEXT NOT NULL,
+                    file_size_bytes INTEGER NOT NULL,
+                    created_timestamp REAL NOT NULL,
+                    thumbnail_url TEXT NOT NULL,
+                    stat_size INTEGER,
+                    stat_mtime_ns INTEGER,
+                    stat_inode INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS tracks_album_name ON tracks (album_name);
+                CREATE INDEX IF NOT EXISTS tracks_thumbnail_url ON tracks (thumbnail_url);
+                CREATE TABLE IF NOT EXISTS skipped_files (
+                    fullpath TEXT PRIMARY KEY,
+                    stat_size INTEGER,
+                    stat_mtime_ns INTEGER,
+                    stat_inode INTEGER
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value
+                );
+            """)
+
+    @contextmanager
+    def transaction(self):
+        """複数の更新を1つのトランザクションにまとめる"""
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            with metrics.timed("index_commit"):
+                self.connection.execute("COMMIT")
+
+    def _select_music_info(self, where: str = "", params: tuple = ()) -> List[MusicInfo]:
+        columns = ", ".join(MusicIndex.music_info_columns)
+        with self.lock:
+            rows = self.connection.execute(f"SELECT {columns} FROM tracks {where}", params).fetchall()
+        return [MusicInfo(*row) for row in rows]
+
+    def get(self, fullpath: str) -> Optional[MusicInfo]:
+        """パスからトラックを取得"""
+        music_info_list = self._select_music_info("WHERE fullpath = ?", (fullpath,))
+        return music_info_list[0] if music_info_list else None
+
+    def get_album(self, album_name: str) -> List[MusicInfo]:
+        """アルバムに含まれるトラックを取得"""
+        return self._select_music_info("WHERE album_name = ?", (album_name,))
+
+    @metrics.timed("index_load")
+    def get_all(self) -> List[MusicInfo]:
+        """全トラックを取得"""
+        return self._select_music_info("ORDER BY fullpath")
+
+    def album_names(self) -> List[str]:
+        """アルバム名の一覧を取得"""
+        with self.lock:
+            rows = self.connection.execute("SELECT DISTINCT album_name FROM tracks").fetchall()
+        return [row[0] for row in rows]
+
+    def thumbnail_urls(self) -> List[str]:
+        """トラックが参照しているサムネイル画像のURLの一覧を取得"""
+        with self.lock:
+            rows = self.connection.execute("SELECT DISTINCT thumbnail_url FROM tracks").fetchall()
+        return [row[0] for row in rows]
+
+    def count_thumbnail_references(self, thumbnail_url: str) -> int:
+        """サムネイル画像を参照しているトラックの数を取得"""
+        with self.lock:
+            row = self.connection.execute("SELECT COUNT(*) FROM tracks WHERE thumbnail_url = ?", (thumbnail_url,)).fetchone()
+        return row[0]
+
+    def get_stat_keys(self) -> Dict[str, Optional[StatKey]]:
+        """記録済みの全ファイル（タグが無効なものを含む）の stat キーを取得"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT fullpath, stat_size, stat_mtime_ns, stat_inode FROM tracks"
+                " UNION ALL SELECT fullpath, stat_size, stat_mtime_ns, stat_inode FROM skipped_files").fetchall()
+        return {row[0]: (tuple(row[1:]) if row[1] is not None else None) for row in rows}
+
+    def get_stat_key(self, fullpath: str) -> Optional[StatKey]:
+        """記録済みのファイル（タグが無効なものを含む）の stat キーを取得"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT stat_size, stat_mtime_ns, stat_inode FROM tracks WHERE fullpath = ?"
+                " UNION ALL SELECT stat_size, stat_mtime_ns, stat_inode FROM skipped_files WHERE fullpath = ?",
+                (fullpath, fullpath)).fetchone()
+        return tuple(row) if row is not None and row[0] is not None else None
+
+    def upsert(self, music_info: MusicInfo, stat_key: Optional[StatKey] = None):
+        """トラックを追加（既にあれば更新）"""
+        # absolute_url はメモリ上では持たないが、既存のインデックスとの互換のため書き込んでおく
+        values = [getattr(music_info, column) for column in MusicIndex.music_info_columns] + [music_info.absolute_url]
+        stat_values = list(stat_key) if stat_key is not None else [None, None, None]
+        placeholders = ", ".join(["?"] * (len(values) + 3))
+        with self.lock:
+            self.connection.execute("DELETE FROM skipped_files WHERE fullpath = ?", (music_info.fullpath,))
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO tracks ({', '.join(MusicIndex.music_info_columns)}, absolute_url, stat_size, stat_mtime_ns, stat_inode)"
+                f" VALUES ({placeholders})", values + stat_values)
+
+    def mark_skipped(self, fullpath: str, stat_key: StatKey):
+        """タグが無効なファイルを記録"""
+        with self.lock:
+            self.connection.execute("DELETE FROM tracks WHERE fullpath = ?", (fullpath,))
+            self.connection.execute("INSERT OR REPLACE INTO skipped_files VALUES (?, ?, ?, ?)", (fullpath, *stat_key))
+
+    def delete(self, fullpath: str) -> Optional[MusicInfo]:
+        """ファイルをインデックスから削除し、削除したトラックを返す"""
+        with self.lock:
+            music_info = self.get(fullpath)
+            self.connection.execute("DELETE FROM tracks WHERE fullpath = ?", (fullpath,))
+            self.connection.execute("DELETE FROM skipped_files WHERE fullpath = ?", (fullpath,))
+        return music_info
+
+    def get_last_modified(self) -> Optional[float]:
+        """トラックが最後に追加・更新・削除された日時を取得"""
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'last_modified'").fetchone()
+        return row[0] if row else None
+
+    def set_last_modified(self, timestamp: float):
+        """トラックが最後に追加・更新・削除された日時を記録"""
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('last_modified', ?)", (timestamp,))
+
+    def reset_skipped_files(self, reader_version: int):
+        """タグの読み込み処理が変わった場合、無効として記録したファイルを再解析の対象に戻す"""
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'tag_reader_version'").fetchone()
+            if row is not None and row[0] == reader_version:
+                return
+            with self.transaction():
+                self.connection.execute("DELETE FROM skipped_files")
+                self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('tag_reader_version', ?)", (reader_version,))
+
+    def reset_thumbnails(self, thumbnail_setting: str, default_thumbnail_url: str):
+        """サムネイルの設定（縮小サイズ）が変わった場合、カバー画像を持つトラックを再解析の対象に戻す
+
+        stat キーを消しておくと、次の読み込みで stat キーが一致しないトラックとして読み直され、
+        新しい設定でサムネイルが作り直される（古い画像は参照されなくなった時点で削除される）
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'thumbnail_setting'").fetchone()
+            if row is not None and row[0] == thumbnail_setting:
+                return
+            with self.transaction():
+                self.connection.execute(
+                    "UPDATE tracks SET stat_size = NULL, stat_mtime_ns = NULL, stat_inode = NULL WHERE thumbnail_url != ?",
+                    (default_thumbnail_url,))
+                self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('thumbnail_setting', ?)", (thumbnail_setting,))
+
+    def migrate_from_pickle(self, index_file_path: str, tag_cache_file_path: str):
+        """旧形式（pickle）のインデックスとタグ情報キャッシュを取り込み、旧ファイルを削除"""
+        legacy_files = [path for path in [index_file_path, tag_cache_file_path] if os.path.exists(path)]
+        if not legacy_files:
+            return
+
+        logger.info(f"Migrating legacy index files: {legacy_files}")
+        with self.transaction():
+            if os.path.exists(index_file_path):
+                with open(index_file_path, "rb") as f:
+                    for music_info in LegacyUnpickler(f).load():
+                        self.upsert(LegacyUnpickler.to_music_info(music_info))
+            if os.path.exists(tag_cache_file_path):
+                with open(tag_cache_file_path, "rb") as f:
+                    for fullpath, (stat_key, music_info) in LegacyUnpickler(f).load().items():
+                        if music_info is None:
+                            self.mark_skipped(fullpath, stat_key)
+                        else:
+                            self.upsert(LegacyUnpickler.to_music_info(music_info), stat_key)
+        for path in legacy_files:
+            os.remove(path)
+
+class LegacyUnpickler(pickle.Unpickler):
+    """旧形式（pickle）のファイルを読み込む
+
+    旧形式の MusicInfo は __dict__ を持つクラスとして保存されているため、
+    属性をそのまま受け取れるクラスとして読み込み、現在の MusicInfo に変換する
+    """
+
+    class LegacyMusicInfo:
+        pass
+
+    def find_class(self, module: str, name: str):
+        if name == "MusicInfo":
+            return LegacyUnpickler.LegacyMusicInfo
+        return super().find_class(module, name)
+
+    @staticmethod
+    def to_music_info(legacy_music_info: "LegacyUnpickler.LegacyMusicInfo") -> MusicInfo:
+        attributes = vars(legacy_music_info)
+        return MusicInfo(**{field.name: attributes[field.name] for field in dataclasses.fields(MusicInfo) if field.name in attributes})
+
+class MusicCatalog:
+    """メモリ上に常駐するトラックのカタログ
+
+    パス → トラック と アルバム名 → ソート済みトラック一覧 を保持し、
+    追加・削除・検索をライブラリ全体の走査なしで行う。
+    """
+
+    def __init__(self, music_list: Iterable[MusicInfo] = (), last_modified: Optional[float] = None):
+        self.lock = threading.RLock()
+        # トラックが最後に追加・更新・削除された日時
+        self.last_modified = last_modified
+        self.tracks: Dict[str, MusicInfo] = {}
+        # アルバムごとのトラック一覧（sort_key の昇順、フィードではこの逆順に並べる）
+        self.albums: Dict[str, List[MusicInfo]] = {}
+        for music_info in music_list:
+            self.add(music_info)
+
+    @staticmethod
+    def sort_key(music_info: MusicInfo) -> Tuple[str, str]:
+        return (music_info.title or "", music_info.fullpath)
+
+    def __len__(self) -> int:
+        return len(self.tracks)
+
+    def __contains__(self, fullpath: str) -> bool:
+        return fullpath in self.tracks
+
+    def get(self, fullpath: str) -> Optional[MusicInfo]:
+        """パスからトラックを取得"""
+        return self.tracks.get(fullpath)
+
+    def add(self, music_info: MusicInfo):
+        """トラックを追加（同じパスのトラックがあれば置き換える）"""
+        with self.lock:
+            self.remove(music_info.fullpath)
+            self.tracks[music_info.fullpath] = music_info
+            album = self.albums.setdefault(music_info.album_name, [])
+            bisect.insort(album, music_info, key=MusicCatalog.sort_key)
+
+    def remove(self, fullpath: str) -> Optional[MusicInfo]:
+        """トラックを削除し、削除したトラックを返す"""
+        with self.lock:
+            music_info = self.tracks.pop(fullpath, None)
+            if music_info is None:
+                return None
+            album = self.albums[music_info.album_name]
+            del album[bisect.bisect_left(album, MusicCatalog.sort_key(music_info), key=MusicCatalog.sort_key)]
+            if not album:
+                del self.albums[music_info.album_name]
+            return music_info
+
+    def album_tracks(self, album_name: str) -> List[MusicInfo]:
+        """アルバムのトラックをフィードの並び順（タイトルの降順）で取得"""
+        with self.lock:
+            return list(reversed(self.albums.get(album_name, [])))
+
+    def album_names(self) -> List[str]:
+        """アルバム名の一覧を名前順で取得"""
+        with self.lock:
+            return sorted(self.albums)
+
+    def album_summaries(self) -> List[Tuple[str, int, str]]:
+        """(アルバム名, トラック数, フィードの先頭のトラックのサムネイルURL) の一覧を名前順で取得"""
+        with self.lock:
+            return [(album_name, len(self.albums[album_name]), self.albums[album_name][-1].thumbnail_url)
+                    for album_name in sorted(self.albums)]
+
+    def latest_created_timestamp(self) -> int:
+        """最も新しいトラックの作成日時を取得（トラックが無い場合は 0）"""
+        with self.lock:
+            return max((music_info.created_timestamp for music_info in self.tracks.values()), default=0)
 
 class FileIO:
     feeds_dir_name = "feeds"
     htdocs_dir_path = "/usr/local/apache2/htdocs/"
     music_files_dir_path = f"{htdocs_dir_path}music_files/"
     music_extensions: List[str] = ["mp3", "m4a"]
+    # 拡張子ごとの MIME タイプ
+    music_mime_types: Dict[str, str] = {"mp3": "audio/mpeg", "m4a": "audio/mp4"}
     index_html_file_path = f"{htdocs_dir_path}index.html"
+    # 購読用のフィード一覧（OPML）と、カタログの内容（JSON）
+    opml_file_path = f"{htdocs_dir_path}feeds.opml"
+    catalog_json_file_path = f"{htdocs_dir_path}catalog.json"
     output_xml_dir_path = f"{htdocs_dir_path}{feeds_dir_name}/"
     feeds_dir_url = f"{app_root_url}{feeds_dir_name}/"
 
     templates_dir_path = "/usr/src/app/templates/"
     index_html_template_filename = "index-template.html.j2"
     feed_template_filename = "feed-template.xml.j2"
+    feed_item_template_filename = "feed-item-template.xml.j2"
+    opml_template_filename = "feeds-template.opml.j2"
+    template_environment: Optional[Environment] = None
+
+    # 出力済みファイルの内容のハッシュ（ファイルパス → (サイズ, 更新日時[ns], SHA-256)）
+    # サイズか更新日時が変わっていれば（ファイルが削除された場合も）記録は使わない
+    written_file_hashes: Dict[str, Tuple[int, int, str]] = {}
+
+    # 計測値（Prometheus のテキスト形式）の出力先
+    metrics_file_path = f"{htdocs_dir_path}metrics"
+
+    # フィードとインデックスページを事前圧縮するエンコーディング（br は brotli モジュールがある場合のみ）
+    precompressed_file_extensions: Dict[str, str] = {"gzip": "gz", "br": "br"}
+    precompressed_encodings: List[str] = [encoding.strip() for encoding in os.environ.get("PRECOMPRESSED_ENCODINGS", "gzip,br").split(",")]
+    # brotli の圧縮レベル（0〜11）。既定の 11 は数 MB のフィードで秒単位かかるため、描画スレッドを塞がない程度に抑える
+    brotli_quality: int = int(os.environ.get("BROTLI_QUALITY", 5))
 
     thumbnail_dir_name = "thumbs"
     thumbnail_dir_path = f"{htdocs_dir_path}{thumbnail_dir_name}/"
-    default_thumbnail_url = f"{app_root_url}{thumbnail_dir_name}/music.png"
+    thumbnail_dir_url = f"{app_root_url}{thumbnail_dir_name}/"
+    default_thumbnail_url = f"{thumbnail_dir_url}music.png"
+    # サムネイル画像の一辺の最大ピクセル数（0の場合は縮小せず、埋め込まれた画像をそのまま使う。Pillow がある場合のみ有効）
+    thumbnail_max_size: int = int(os.environ.get("THUMBNAIL_MAX_SIZE", 0))
     
     # インデックスファイルのパス
-    index_file_path = f"{htdocs_dir_path}music_index.pkl"
+    index_db_file_path = f"{htdocs_dir_path}music_index.sqlite3"
+    # 旧形式（pickle）のインデックスとタグ情報キャッシュのパス（初回起動時に移行する）
+    legacy_index_file_path = f"{htdocs_dir_path}music_index.pkl"
+    legacy_tag_cache_file_path = f"{htdocs_dir_path}music_tag_cache.pkl"
+    music_index: Optional[MusicIndex] = None
+
+    # タグ読み込みの並列数と、ワーカーへまとめて渡すファイル数
+    tag_parse_workers: int = int(os.environ.get("TAG_PARSE_WORKERS", os.cpu_count() or 1))
+    tag_parse_chunk_size: int = int(os.environ.get("TAG_PARSE_CHUNK_SIZE", 32))
+    # タグ読み込みのワーカープロセスへ引き継ぐ設定（spawn で起動したプロセスは親プロセスで書き換えた値を持たないため）
+    tag_parse_worker_settings: List[str] = ["htdocs_dir_path", "music_files_dir_path", "thumbnail_dir_path", "thumbnail_dir_url",
+                                            "default_thumbnail_url", "thumbnail_max_size"]
 
     @staticmethod
+    @metrics.timed("load_music_list")
     def get_music_list() -> List[MusicInfo]:
         # ファイルのフルパスの一覧を生成
         music_file_fullpaths: List[str] = []
         for extension in FileIO.music_extensions:
             music_file_fullpaths.extend(glob.glob(f"{FileIO.music_files_dir_path}/**/*{extension}", recursive=True))
 
-        # フルパスの一覧からMusicInfoのリストを生成
-        music_info_list: List[MusicInfo] = []
+        # 並列実行時も結果の順序が変わらないよう、パスをソートしておく
+        music_file_fullpaths.sort()
+
+        # インデックスに記録された stat キーと比較し、変更のないファイルは再解析しない
+        music_index = FileIO.get_music_index()
+        known_stat_keys = music_index.get_stat_keys()
+        stat_keys: Dict[str, StatKey] = {}
+        parse_targets: List[str] = []
         for fullpath in music_file_fullpaths:
-            # ファイルごとのメタデータを取得して、MusicInfoに情報を追加
-            file = eyed3.load(fullpath)
-            relative_path_escaped = urllib.parse.quote(str(pathlib.Path(fullpath).relative_to(FileIO.htdocs_dir_path)))
-            absolute_url = f"{app_root_url}{relative_path_escaped}"
-            file_size_bytes = os.path.getsize(fullpath)
-
-            if file is None:
-                logger.warning(f"{fullpath} was skipped (id3 info is none)")
+            try:
+                stat_key = FileIO.get_file_stat_key(fullpath)
+            except OSError as e:
+                logger.warning(f"{fullpath} was skipped (stat failed: {e})")
                 continue
 
-            if file.tag is None:
-                logger.warning(f"{fullpath} was skipped (tag is none)")
-                continue
+            stat_keys[fullpath] = stat_key
+            if known_stat_keys.get(fullpath) != stat_key:
+                parse_targets.append(fullpath)
 
-            if file.tag.album is None:
-                logger.warning(f"{fullpath} was skipped (album_name is none)")
-                continue
+        # 新規または変更されたファイルのみタグを読み込み、消えたファイルのエントリは削除する
+        vanished_fullpaths = [fullpath for fullpath in known_stat_keys if fullpath not in stat_keys]
 
-            music_info = MusicInfo()
-            music_info.fullpath = fullpath
-            music_info.album_name = file.tag.album
-            music_info.title = file.tag.title
-            music_info.duration_seconds = file.info.time_secs
-            music_info.absolute_url = absolute_url
-            music_info.file_size_bytes = file_size_bytes
-            music_info.created_timestamp = os.path.getctime(fullpath)
+        # 消えたファイルと stat キー（inode を含む）が一致する新しいファイルは移動とみなし、タグを読み直さない
+        vanished_paths_by_stat_key = {known_stat_keys[fullpath]: fullpath for fullpath in vanished_fullpaths
+                                      if known_stat_keys[fullpath] is not None}
+        moved_paths: List[Tuple[str, str]] = []
+        for fullpath in parse_targets:
+            src_path = vanished_paths_by_stat_key.pop(stat_keys[fullpath], None)
+            if src_path is not None:
+                moved_paths.append((src_path, fullpath))
+        if moved_paths:
+            moved_dest_paths = {dest_path for _, dest_path in moved_paths}
+            parse_targets = [fullpath for fullpath in parse_targets if fullpath not in moved_dest_paths]
 
-            # サムネイル画像を保存する
-            thumbnail_url = ""
-            for image in file.tag.images:
-                extension = ""
-                if image.mime_type in ["image/jpeg", "image/jpg"]:
-                    extension = "jpg"
-                if image.mime_type == "image/png":
-                    extension = "png"
-                if extension != "":
-                    filename = f"{music_info.md5()}.{extension}"
-                    thumbnail_path = f"{FileIO.thumbnail_dir_path}{filename}"
-                    thumbnail_url = f"{app_root_url}{FileIO.thumbnail_dir_name}/{filename}"
-                    if not os.path.exists(thumbnail_path):
-                        with open(thumbnail_path, "wb") as fo:
-                            fo.write(image.image_data)
-                    break
-            if thumbnail_url != "":
-                music_info.thumbnail_url = thumbnail_url
-            else:
-                music_info.thumbnail_url = FileIO.default_thumbnail_url
+        parsed_music_info_list = FileIO.parse_music_files(parse_targets)
+        # 置き換え・削除されたトラックが参照していたサムネイル画像
+        released_thumbnail_urls = set()
+        with music_index.transaction():
+            tracks_changed = False
+            for src_path, dest_path in moved_paths:
+                replaced_music_info = music_index.get(dest_path)
+                if replaced_music_info is not None:
+                    released_thumbnail_urls.add(replaced_music_info.thumbnail_url)
+                    tracks_changed = True
+                moved_music_info = music_index.delete(src_path)
+                if moved_music_info is None:
+                    music_index.mark_skipped(dest_path, stat_keys[dest_path])
+                    continue
+                music_index.upsert(FileIO.get_moved_music_info(moved_music_info, dest_path), stat_keys[dest_path])
+                tracks_changed = True
+            for fullpath, music_info in zip(parse_targets, parsed_music_info_list):
+                old_music_info = music_index.get(fullpath)
+                if old_music_info is not None:
+                    released_thumbnail_urls.add(old_music_info.thumbnail_url)
+                if music_info is None:
+                    # タグが無効なファイルも記録して、次回以降の再解析を避ける
+                    tracks_changed |= old_music_info is not None
+                    music_index.mark_skipped(fullpath, stat_keys[fullpath])
+                else:
+                    tracks_changed |= old_music_info != music_info
+                    music_index.upsert(music_info, stat_keys[fullpath])
+            moved_src_paths = {src_path for src_path, _ in moved_paths}
+            for fullpath in vanished_fullpaths:
+                if fullpath in moved_src_paths:
+                    continue
+                old_music_info = music_index.delete(fullpath)
+                if old_music_info is not None:
+                    released_thumbnail_urls.add(old_music_info.thumbnail_url)
+                    tracks_changed = True
+            if tracks_changed:
+                music_index.set_last_modified(time.time())
+        FileIO.remove_unreferenced_thumbnails(released_thumbnail_urls)
+        # 起動時は、過去に参照されなくなったまま残っている画像もまとめて片付ける
+        FileIO.remove_orphaned_thumbnails()
+
+        logger.info(f"Music list loaded: {len(stat_keys)} files ({len(parse_targets)} parsed, {len(moved_paths)} moved,"
+                    f" {len(stat_keys) - len(parse_targets) - len(moved_paths)} unchanged, {len(vanished_fullpaths) - len(moved_paths)} removed)")
+
+        return music_index.get_all()
 
-            music_info_list.append(music_info)
+    @staticmethod
+    def get_file_stat_key(fullpath: str) -> StatKey:
+        """ファイルの変更検知に使うキー（サイズ, 更新日時, inode）を取得"""
+        st = os.stat(fullpath)
+        return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+    @staticmethod
+    def get_music_index() -> MusicIndex:
+        """インデックスを開く（初回のみ旧形式からの移行を行う）"""
+        if FileIO.music_index is None:
+            FileIO.music_index = MusicIndex(FileIO.index_db_file_path)
+            FileIO.music_index.migrate_from_pickle(FileIO.legacy_index_file_path, FileIO.legacy_tag_cache_file_path)
+            FileIO.music_index.reset_skipped_files(tag_reader.READER_VERSION)
+            FileIO.music_index.reset_thumbnails(FileIO.thumbnail_setting(), FileIO.default_thumbnail_url)
+        return FileIO.music_index
 
+    @staticmethod
+    def parse_music_files(fullpaths: List[str]) -> List[Optional[MusicInfo]]:
+        """複数の音楽ファイルのタグを読み込む（件数が多い場合はプロセスプールで並列実行）
+
+        戻り値は fullpaths と同じ順序で、読み込めなかったファイルは None となる
+        """
+        if not fullpaths:
+            return []
+        with metrics.timed("tag_parse"):
+            music_info_list = FileIO._parse_music_files(fullpaths)
+        invalid_count = music_info_list.count(None)
+        metrics.files_total.inc(len(music_info_list) - invalid_count, operation="parsed")
+        metrics.files_total.inc(invalid_count, operation="invalid")
         return music_info_list
 
     @staticmethod
+    def _parse_music_files(fullpaths: List[str]) -> List[Optional[MusicInfo]]:
+        # チャンク数より多くのワーカーを起動しても遊ぶだけなので上限を設ける
+        chunk_count = -(-len(fullpaths) // FileIO.tag_parse_chunk_size)
+        workers = min(FileIO.tag_parse_workers, chunk_count)
+        if workers <= 1:
+            return [FileIO.get_music_info_from_file(fullpath) for fullpath in fullpaths]
+
+        logger.info(f"Parsing {len(fullpaths)} files with {workers} workers")
+        # ウォッチャーのスレッドが動いている状態で fork すると子プロセスがロックを抱えたまま固まり得るため spawn で起動する
+        settings = {name: getattr(FileIO, name) for name in FileIO.tag_parse_worker_settings}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=FileIO.init_tag_parse_worker, initargs=(settings,)) as executor:
+            # map は投入順に結果を返すため、出力は直列実行時と同じ順序になる
+            return list(executor.map(FileIO.get_music_info_from_file, fullpaths, chunksize=FileIO.tag_parse_chunk_size))
+
+    @staticmethod
+    def init_tag_parse_worker(settings: Dict[str, Any]):
+        """タグ読み込みのワーカープロセスに親プロセスの設定を反映する"""
+        for name, value in settings.items():
+            setattr(FileIO, name, value)
+
+    @staticmethod
+    def get_template_environment() -> Environment:
+        """プロセス全体で共有するテンプレート環境を取得
+
+        コンパイル済みのテンプレートは環境内にキャッシュされ、テンプレートファイルが
+        更新された場合のみ再コンパイルされる（auto_reload）。
+        コンパイル結果のバイトコードはファイルにもキャッシュし、再起動時のコンパイルも省く。
+        """
+        if FileIO.template_environment is None:
+            FileIO.template_environment = Environment(
+                loader=FileSystemLoader(FileIO.templates_dir_path, encoding="utf8"),
+                bytecode_cache=FileSystemBytecodeCache(),
+                auto_reload=True,
+            )
+        return FileIO.template_environment
+
+    @staticmethod
+    @metrics.timed("template_load")
     def get_feed_xml_template() -> Template:
         #テンプレート読み込み
-        env = Environment(loader=FileSystemLoader(FileIO.templates_dir_path, encoding="utf8"))
-        return env.get_template(FileIO.feed_template_filename)
+        return FileIO.get_template_environment().get_template(FileIO.feed_template_filename)
+
+    @staticmethod
+    @metrics.timed("template_load")
+    def get_feed_item_xml_template() -> Template:
+        #テンプレート読み込み
+        return FileIO.get_template_environment().get_template(FileIO.feed_item_template_filename)
 
     @staticmethod
+    @metrics.timed("template_load")
     def get_index_html_template() -> Template:
         #テンプレート読み込み
-        env = Environment(loader=FileSystemLoader(FileIO.templates_dir_path, encoding="utf8"))
-        return env.get_template(FileIO.index_html_template_filename)
+        return FileIO.get_template_environment().get_template(FileIO.index_html_template_filename)
+
+    @staticmethod
+    @metrics.timed("template_load")
+    def get_opml_template() -> Template:
+        #テンプレート読み込み
+        return FileIO.get_template_environment().get_template(FileIO.opml_template_filename)
+
+    @staticmethod
+    def output_feed_xml(xml_chunks: Iterable[str], feed_info: FeedInfo, page_number: int = 0) -> bool:
+        xml_file_path = feed_info.file_path(page_number)
+        return FileIO.write_file_atomically(xml_file_path, xml_chunks)
+
+    @staticmethod
+    def index_html_page_file_path(page_number: int = 0) -> str:
+        """インデックスページのパス（0 は index.html、1以上は index-2.html, index-3.html, ...）"""
+        if page_number == 0:
+            return FileIO.index_html_file_path
+        base_path, extension = os.path.splitext(FileIO.index_html_file_path)
+        return f"{base_path}-{page_number + 1}{extension}"
+
+    @staticmethod
+    def get_htdocs_url(file_path: str) -> str:
+        """htdocs 直下に出力するファイルの配信URLを取得"""
+        return f"{app_root_url}{urllib.parse.quote(os.path.basename(file_path))}"
+
+    @staticmethod
+    def output_index_html(html_chunks: Iterable[str], page_number: int = 0) -> bool:
+        html_file_path = FileIO.index_html_page_file_path(page_number)
+        return FileIO.write_file_atomically(html_file_path, html_chunks)
+
+    @staticmethod
+    def remove_index_html_pages_after(page_number: int) -> List[str]:
+        """指定したページ番号より後ろのインデックスページを削除し、削除したファイルのパスを返す"""
+        removed_file_paths = []
+        page_number += 1
+        while os.path.exists(FileIO.index_html_page_file_path(page_number)):
+            FileIO.remove_output_file(FileIO.index_html_page_file_path(page_number))
+            removed_file_paths.append(FileIO.index_html_page_file_path(page_number))
+            page_number += 1
+        return removed_file_paths
+
+    @staticmethod
+    def output_opml(opml_chunks: Iterable[str]) -> bool:
+        return FileIO.write_file_atomically(FileIO.opml_file_path, opml_chunks)
+
+    @staticmethod
+    def output_catalog_json(json_chunks: Iterable[str]) -> bool:
+        return FileIO.write_file_atomically(FileIO.catalog_json_file_path, json_chunks)
+
+    @staticmethod
+    def remove_feed_pages_after(feed_info: FeedInfo, page_number: int) -> List[str]:
+        """指定したページ番号より後ろのアーカイブページを削除し、削除したファイルのパスを返す"""
+        removed_file_paths = []
+        page_number += 1
+        while os.path.exists(feed_info.file_path(page_number)):
+            FileIO.remove_output_file(feed_info.file_path(page_number))
+            removed_file_paths.append(feed_info.file_path(page_number))
+            page_number += 1
+        return removed_file_paths
+
+    @staticmethod
+    def write_file_atomically(file_path: str, chunks: Iterable[str]) -> bool:
+        """文字列のチャンクを一時ファイルへ順に書き出し、fsync してから置き換える
+
+        全体を1つの文字列にしないためメモリ使用量は出力サイズに依存せず、
+        配信中のファイルが書きかけの状態で見えることもない。
+        既存ファイルと内容（ハッシュ）が同じ場合は置き換えずに False を返すため、
+        更新日時や ETag が変わらず、クライアントには 304 Not Modified が返される
+        """
+        with FileIO.open_temp_file(file_path) as (f, tmp_file_path):
+            digest = hashlib.sha256()
+            for chunk in chunks:
+                data = chunk.encode("utf-8")
+                digest.update(data)
+                f.write(data)
+            changed = digest.hexdigest() != FileIO.get_written_file_hash(file_path)
+            if changed:
+                # 圧縮済みファイルを先に置き換え、httpd が新しい内容の隣で古い圧縮済みファイルを返さないようにする
+                f.flush()
+                FileIO.write_precompressed_files(file_path, tmp_file_path)
+                FileIO.replace_with_temp_file(f, tmp_file_path, file_path)
+                FileIO.record_written_file_hash(file_path, digest.hexdigest())
+                FileIO.match_precompressed_file_mtimes(file_path)
+        output_files_total.inc(result="written" if changed else "unchanged")
+
+        if not changed:
+            FileIO.write_precompressed_files(file_path)
+        return changed
+
+    @staticmethod
+    @contextmanager
+    def open_temp_file(file_path: str):
+        """出力先と同じディレクトリに一時ファイルを作る（置き換えられなかった一時ファイルは最後に削除する）"""
+        dir_path, filename = os.path.split(file_path)
+        fd, tmp_file_path = tempfile.mkstemp(prefix=f".{filename}.", suffix=".tmp", dir=dir_path)
+        try:
+            with open(fd, "wb") as f:
+                yield f, tmp_file_path
+        finally:
+            if os.path.exists(tmp_file_path):
+                os.remove(tmp_file_path)
+
+    @staticmethod
+    @metrics.timed("file_replace")
+    def replace_with_temp_file(f, tmp_file_path: str, file_path: str):
+        """一時ファイルを fsync してから出力先と置き換える"""
+        f.flush()
+        os.fsync(f.fileno())
+        # mkstemp は所有者のみ読み書き可能なファイルを作るため、httpd から読めるようにする
+        os.chmod(tmp_file_path, 0o644)
+        os.replace(tmp_file_path, file_path)
+
+    @staticmethod
+    @metrics.timed("precompress")
+    def write_precompressed_files(file_path: str, source_path: Optional[str] = None):
+        """httpd がそのまま返せるよう、圧縮済みのファイル（.gz / .br）を出力する
+
+        source_path（置き換える前の一時ファイル）を指定した場合は、その内容から必ず作り直す。
+        指定しない場合は、圧縮済みファイルが無いか、元のファイルより古い場合のみ作り直す。
+        すべての形式を圧縮し終えてから置き換えるため、圧縮に失敗した場合はどの形式も置き換えない。
+        出力しない形式（無効にされた形式や、brotli モジュールが無い場合の .br）の古いファイルは、
+        httpd が更新前の内容を返し続けないよう削除する
+        """
+        source_mtime_ns = os.stat(file_path).st_mtime_ns if source_path is None else None
+        compressed_file_paths: Dict[str, str] = {}
+        for encoding, extension in FileIO.precompressed_file_extensions.items():
+            compressed_file_path = f"{file_path}.{extension}"
+            if encoding not in FileIO.precompressed_encodings or (encoding == "br" and brotli is None):
+                try:
+                    os.remove(compressed_file_path)
+                except FileNotFoundError:
+                    pass
+                continue
+            if source_mtime_ns is not None:
+                try:
+                    if os.stat(compressed_file_path).st_mtime_ns >= source_mtime_ns:
+                        continue
+                except FileNotFoundError:
+                    pass
+            compressed_file_paths[encoding] = compressed_file_path
+        if not compressed_file_paths:
+            return
+
+        with ExitStack() as stack:
+            temp_files = []
+            for encoding, compressed_file_path in compressed_file_paths.items():
+                src = stack.enter_context(open(source_path or file_path, "rb"))
+                f, tmp_file_path = stack.enter_context(FileIO.open_temp_file(compressed_file_path))
+                if encoding == "gzip":
+                    # 内容が同じなら圧縮結果も同じになるよう、ヘッダーの日時は固定する
+                    with gzip.GzipFile(filename="", mode="wb", fileobj=f, mtime=0) as gz:
+                        shutil.copyfileobj(src, gz)
+                else:
+                    compressor = brotli.Compressor(quality=FileIO.brotli_quality)
+                    for data in iter(lambda: src.read(1024 * 1024), b""):
+                        f.write(compressor.process(data))
+                    f.write(compressor.finish())
+                temp_files.append((f, tmp_file_path, compressed_file_path))
+            for f, tmp_file_path, compressed_file_path in temp_files:
+                FileIO.replace_with_temp_file(f, tmp_file_path, compressed_file_path)
+
+    @staticmethod
+    def match_precompressed_file_mtimes(file_path: str):
+        """圧縮済みファイルの更新日時を元のファイルに揃える（先に置き換えた圧縮済みファイルを古いとみなさないため）"""
+        source_stat = os.stat(file_path)
+        for extension in FileIO.precompressed_file_extensions.values():
+            try:
+                os.utime(f"{file_path}.{extension}", ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+            except FileNotFoundError:
+                pass
 
     @staticmethod
-    def output_feed_xml(xml_text: str, feed_info: FeedInfo):
-        xml_file_path = feed_info.file_path()
-        with open(xml_file_path, "w") as f:
-            f.write(xml_text)
+    def output_metrics(text: str):
+        """計測値をファイルへ出力（事前圧縮や内容の比較はしない）"""
+        with FileIO.open_temp_file(FileIO.metrics_file_path) as (f, tmp_file_path):
+            f.write(text.encode("utf-8"))
+            f.flush()
+            # 失われても次の出力で作り直されるため fsync はしない
+            os.chmod(tmp_file_path, 0o644)
+            os.replace(tmp_file_path, FileIO.metrics_file_path)
 
     @staticmethod
-    def output_index_html(html_text: str):
-        html_file_path = FileIO.index_html_file_path
-        with open(html_file_path, "w") as f:
-            f.write(html_text)
+    def remove_output_file(file_path: str):
+        """出力済みのファイルを圧縮済みのファイルも含めて削除"""
+        for path in [file_path] + [f"{file_path}.{extension}" for extension in FileIO.precompressed_file_extensions.values()]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        FileIO.written_file_hashes.pop(file_path, None)
 
     @staticmethod
-    def save_music_index(music_list: List[MusicInfo]):
-        """音楽ファイルのインデックスを保存"""
-        with open(FileIO.index_file_path, "wb") as f:
-            pickle.dump(music_list, f)
+    def get_written_file_hash(file_path: str) -> Optional[str]:
+        """出力済みファイルの内容のハッシュを取得
+
+        記録が無いか、記録した後にファイルのサイズ・更新日時が変わっている場合はファイルを読んで計算し直す。
+        ファイルが無い場合は None を返す
+        """
+        if FileIO.is_written_file_intact(file_path):
+            return FileIO.written_file_hashes[file_path][2]
+        try:
+            digest = hashlib.sha256()
+            with open(file_path, "rb") as f:
+                for data in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(data)
+            FileIO.record_written_file_hash(file_path, digest.hexdigest())
+        except FileNotFoundError:
+            FileIO.written_file_hashes.pop(file_path, None)
+            return None
+        return digest.hexdigest()
 
     @staticmethod
-    def load_music_index() -> List[MusicInfo]:
-        """音楽ファイルのインデックスを読み込み"""
+    def record_written_file_hash(file_path: str, digest: str):
+        """出力済みファイルのハッシュを、現在のサイズ・更新日時とともに記録"""
+        stat = os.stat(file_path)
+        FileIO.written_file_hashes[file_path] = (stat.st_size, stat.st_mtime_ns, digest)
+
+    @staticmethod
+    def is_written_file_intact(file_path: str) -> bool:
+        """出力済みファイルが、ハッシュを記録した時から削除・変更されていないか"""
+        recorded = FileIO.written_file_hashes.get(file_path)
+        if recorded is None:
+            return False
         try:
-            with open(FileIO.index_file_path, "rb") as f:
-                return pickle.load(f)
+            stat = os.stat(file_path)
         except FileNotFoundError:
-            return []
+            return False
+        return (stat.st_size, stat.st_mtime_ns) == recorded[:2]
+
+    @staticmethod
+    def save_thumbnail(cover: tag_reader.CoverArt, fullpath: str, extension: str) -> str:
+        """カバー画像を、画像を識別するハッシュをファイル名にしてサムネイルとして保存し、URLを返す
+
+        ハッシュは画像の先頭と末尾の一部だけから求めるため、保存済みの画像は全体を読み込まない。
+        同じ画像を持つトラック（アルバム内の全トラックなど）は1つのファイルを共有する。
+        thumbnail_max_size が指定されていれば、それより大きい画像は縮小して保存する
+        """
+        digest = cover.fingerprint(fullpath)
+        filename = f"{digest}.{extension}"
+        if FileIO.thumbnail_max_size > 0 and Image is not None:
+            filename = f"{digest}-{FileIO.thumbnail_max_size}.{extension}"
+        thumbnail_path = f"{FileIO.thumbnail_dir_path}{filename}"
+        if not os.path.exists(thumbnail_path):
+            # 複数のワーカーが同じ画像を同時に保存しても壊れないよう、一時ファイルから置き換える
+            with metrics.timed("thumbnail_write"), FileIO.open_temp_file(thumbnail_path) as (f, tmp_file_path):
+                f.write(FileIO.resize_thumbnail(cover.read(fullpath), extension))
+                FileIO.replace_with_temp_file(f, tmp_file_path, thumbnail_path)
+        return f"{FileIO.thumbnail_dir_url}{filename}"
+
+    @staticmethod
+    def thumbnail_setting() -> str:
+        """保存するサムネイルに影響する設定（実際に縮小する場合の最大サイズ。縮小しない場合は 0）"""
+        return str(FileIO.thumbnail_max_size if FileIO.thumbnail_max_size > 0 and Image is not None else 0)
+
+    @staticmethod
+    def resize_thumbnail(image_data: bytes, extension: str) -> bytes:
+        """画像を thumbnail_max_size に収まるよう縮小する（縮小が不要か、できない場合は元のデータを返す）"""
+        if FileIO.thumbnail_max_size <= 0 or Image is None:
+            return image_data
+        try:
+            with Image.open(io.BytesIO(image_data)) as image:
+                if max(image.size) <= FileIO.thumbnail_max_size:
+                    return image_data
+                image.thumbnail((FileIO.thumbnail_max_size, FileIO.thumbnail_max_size))
+                if extension == "jpg" and image.mode not in ("RGB", "L"):
+                    image = image.convert("RGB")
+                output = io.BytesIO()
+                image.save(output, format="JPEG" if extension == "jpg" else "PNG")
+                return output.getvalue()
+        except Exception as e:
+            logger.warning(f"Failed to resize thumbnail: {e}")
+            return image_data
+
+    @staticmethod
+    def remove_unreferenced_thumbnails(thumbnail_urls: Iterable[str]):
+        """どのトラックからも参照されなくなったサムネイル画像を削除"""
+        music_index = FileIO.get_music_index()
+        for thumbnail_url in thumbnail_urls:
+            if thumbnail_url == FileIO.default_thumbnail_url or not thumbnail_url.startswith(FileIO.thumbnail_dir_url):
+                continue
+            if music_index.count_thumbnail_references(thumbnail_url) > 0:
+                continue
+            filename = thumbnail_url[len(FileIO.thumbnail_dir_url):]
+            try:
+                os.remove(f"{FileIO.thumbnail_dir_path}{filename}")
+                logger.info(f"Removed unreferenced thumbnail: {filename}")
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def remove_orphaned_thumbnails():
+        """どのトラックからも参照されていないサムネイル画像をまとめて削除
+
+        ファイル名の付け方が変わる前に保存された画像（楽曲の MD5 をファイル名にしたものなど）のうち、
+        トラックの読み込み直しなどで参照されなくなったものを起動時に片付ける
+        """
+        referenced_filenames = {thumbnail_url[len(FileIO.thumbnail_dir_url):]
+                                for thumbnail_url in FileIO.get_music_index().thumbnail_urls()
+                                if thumbnail_url.startswith(FileIO.thumbnail_dir_url)}
+        default_filename = FileIO.default_thumbnail_url[len(FileIO.thumbnail_dir_url):]
+        try:
+            entries = list(os.scandir(FileIO.thumbnail_dir_path))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            # 書き込み中の一時ファイル（.<ファイル名>.xxx.tmp）と既定の画像は残す
+            if entry.name.startswith(".") or entry.name == default_filename or not entry.is_file():
+                continue
+            if entry.name in referenced_filenames:
+                continue
+            try:
+                os.remove(entry.path)
+                logger.info(f"Removed orphaned thumbnail: {entry.name}")
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def get_absolute_url(fullpath: str) -> str:
+        """音楽ファイルの配信URLを取得"""
+        if fullpath.startswith(FileIO.htdocs_dir_path):
+            relative_path = fullpath[len(FileIO.htdocs_dir_path):]
+        else:
+            relative_path = str(pathlib.Path(fullpath).relative_to(FileIO.htdocs_dir_path))
+        return f"{app_root_url}{urllib.parse.quote(relative_path)}"
+
+    @staticmethod
+    def get_mime_type(fullpath: str) -> str:
+        """音楽ファイルの MIME タイプを拡張子から取得"""
+        extension = os.path.splitext(fullpath)[1][1:].lower()
+        return FileIO.music_mime_types.get(extension, "audio/mpeg")
+
+    @staticmethod
+    def get_moved_music_info(music_info: MusicInfo, fullpath: str) -> MusicInfo:
+        """移動されたファイルの MusicInfo を、タグを読み直さずにパスだけ書き換えて作る（URLはパスから求まる）"""
+        return dataclasses.replace(music_info, fullpath=fullpath)
 
     @staticmethod
     def get_music_info_from_file(fullpath: str) -> Optional[MusicInfo]:
-        """単一の音楽ファイルからMusicInfoを生成"""
+        """単一の音楽ファイルからMusicInfoを生成
+
+        タグと再生時間はファイルのヘッダー部分だけを読んで取得し、
+        カバー画像は先頭と末尾の一部だけで識別して、サムネイルがまだ保存されていない場合のみ全体を読み込む
+        """
         try:
             # ファイルの存在とアクセス可能性を確認
-            if not os.path.exists(fullpath) or not os.access(fullpath, os.R_OK):
+            try:
+                st = os.stat(fullpath)
+            except OSError:
                 logger.warning(f"{fullpath} is not accessible")
                 return None
-                
-            file = eyed3.load(fullpath)
-            relative_path_escaped = urllib.parse.quote(str(pathlib.Path(fullpath).relative_to(FileIO.htdocs_dir_path)))
-            absolute_url = f"{app_root_url}{relative_path_escaped}"
-            file_size_bytes = os.path.getsize(fullpath)
-
-            if file is None or file.tag is None or file.tag.album is None:
-                logger.warning(f"{fullpath} has no valid ID3 tag information")
+
+            tag_info = tag_reader.read_tags(fullpath)
+
+            if tag_info is None or tag_info.album is None:
+                logger.warning(f"{fullpath} has no valid tag information")
                 return None
 
             music_info = MusicInfo()
             music_info.fullpath = fullpath
-            music_info.album_name = file.tag.album
-            music_info.title = file.tag.title if file.tag.title else os.path.basename(fullpath)
-            music_info.duration_seconds = file.info.time_secs
-            music_info.absolute_url = absolute_url
-            music_info.file_size_bytes = file_size_bytes
-            music_info.created_timestamp = os.path.getctime(fullpath)
+            music_info.album_name = sys.intern(tag_info.album)
+            music_info.title = tag_info.title if tag_info.title else os.path.basename(fullpath)
+            music_info.duration_seconds = tag_info.duration_seconds
+            music_info.file_size_bytes = st.st_size
+            music_info.created_timestamp = st.st_ctime
 
             # サムネイル画像を保存する
             thumbnail_url = ""
-            for image in file.tag.images:
+            cover = tag_info.cover
+            if cover is not None:
                 extension = ""
-                if image.mime_type in ["image/jpeg", "image/jpg"]:
+                if cover.mime_type in ["image/jpeg", "image/jpg"]:
                     extension = "jpg"
-                if image.mime_type == "image/png":
+                if cover.mime_type == "image/png":
                     extension = "png"
                 if extension != "":
-                    filename = f"{music_info.md5()}.{extension}"
-                    thumbnail_path = f"{FileIO.thumbnail_dir_path}{filename}"
-                    thumbnail_url = f"{app_root_url}{FileIO.thumbnail_dir_name}/{filename}"
-                    if not os.path.exists(thumbnail_path):
-                        with open(thumbnail_path, "wb") as fo:
-                            fo.write(image.image_data)
-                    break
+                    thumbnail_url = FileIO.save_thumbnail(cover, fullpath, extension)
             if thumbnail_url != "":
-                music_info.thumbnail_url = thumbnail_url
+                music_info.thumbnail_url = sys.intern(thumbnail_url)
             else:
                 music_info.thumbnail_url = FileIO.default_thumbnail_url
 
@@ -234,146 +1017,537 @@ class FileIO:
             logger.warning(f"Error reading file {fullpath}: {e}")
             return None
 
-
 class TemplateRenderer:
+    # 1ページあたりのエピソード数（0の場合はページ分割せず、全エピソードを1つのフィードに出力する）
+    feed_page_size: int = int(os.environ.get("FEED_PAGE_SIZE", 0))
+    # 描画済みアーカイブページの内容のシグネチャ（ファイルパス → シグネチャ）
+    feed_page_signatures: Dict[str, int] = {}
+    # インデックスページ1ページあたりのアルバム数（0の場合は分割しない）
+    index_page_size: int = int(os.environ.get("INDEX_PAGE_SIZE", 1000))
+    # 描画済みのインデックスページ（2ページ目以降）の内容のシグネチャ（ファイルパス → シグネチャ）
+    index_page_signatures: Dict[str, int] = {}
+    # 描画済みの <item> 要素（ファイルパス → (トラックの内容, 描画結果)）と、描画に使ったテンプレート
+    item_xml_cache: "OrderedDict[str, Tuple[Tuple, str]]" = OrderedDict()
+    item_xml_cache_template: Optional[Template] = None
+    # 保持する <item> 要素の上限（超えたら最も長く使われていないものから捨てる。0の場合は保持しない）
+    item_xml_cache_size: int = int(os.environ.get("ITEM_XML_CACHE_SIZE", 20000))
+    item_xml_cache_lock = threading.Lock()
+
     @staticmethod
     def render_feed_xml(feed_info: FeedInfo, music_info_list: List[MusicInfo]):
-        items: List[Dict[str: Any]] = []
-
-        for music_info in music_info_list:
-            items.append({
-                "title": music_info.title,
-                "date_text_rfc1123": format_date_time(music_info.created_timestamp),
-                "md5": music_info.md5(),
-                "duration_hhmmss": time.strftime('%H:%M:%S', time.gmtime(music_info.duration_seconds)),
-                "url": music_info.absolute_url,
-                "file_size_bytes": music_info.file_size_bytes,
-                "thumbnail_url": music_info.thumbnail_url
-            })
+        channel_thumbnail_url = music_info_list[0].thumbnail_url
+        feed_pages = TemplateRenderer.feed_pages(feed_info, music_info_list)
+        for page_number, page_music_info_list, first_url, next_url in feed_pages:
+            TemplateRenderer._render_feed_page(feed_info, page_number, page_music_info_list, channel_thumbnail_url,
+                                               first_url=first_url, next_url=next_url)
+        TemplateRenderer._remove_feed_pages_after(feed_info, len(feed_pages) - 1)
+
+    @staticmethod
+    def feed_pages(feed_info: FeedInfo, music_info_list: List[MusicInfo]) -> List[Tuple[int, List[MusicInfo], Optional[str], Optional[str]]]:
+        """フィードのページ分割（ページ番号, エピソード, 先頭ページのURL, 次のページのURL）の一覧を取得"""
+        page_size = TemplateRenderer.feed_page_size
+        if page_size <= 0 or len(music_info_list) <= page_size:
+            return [(0, music_info_list, None, None)]
+
+        # RFC 5005 のページ分割フィード
+        # アーカイブページは古いエピソードから page_size 件ずつ詰めるため、
+        # 新しいエピソードが追加されても既存のアーカイブページの内容は変わらない
+        archive_page_count = (len(music_info_list) - 1) // page_size
+        first_page_size = len(music_info_list) - archive_page_count * page_size
+        pages = [(0, music_info_list[:first_page_size], None, feed_info.url(archive_page_count))]
+        for page_number in range(1, archive_page_count + 1):
+            start = len(music_info_list) - page_number * page_size
+            next_url = feed_info.url(page_number - 1) if page_number > 1 else None
+            pages.append((page_number, music_info_list[start:start + page_size], feed_info.url(), next_url))
+        return pages
+
+    @staticmethod
+    def _remove_feed_pages_after(feed_info: FeedInfo, page_number: int):
+        """エピソードが減って不要になったアーカイブページを削除"""
+        for file_path in FileIO.remove_feed_pages_after(feed_info, page_number):
+            TemplateRenderer.feed_page_signatures.pop(file_path, None)
+
+    @staticmethod
+    @metrics.timed("render_feed")
+    def _render_feed_page(feed_info: FeedInfo, page_number: int, music_info_list: List[MusicInfo], channel_thumbnail_url: str,
+                          first_url: Optional[str] = None, next_url: Optional[str] = None):
+        """フィードの1ページを描画して出力（アーカイブページは内容が変わった場合のみ）"""
+        is_archive_page = page_number > 0
+        if is_archive_page:
+            signature = hash((feed_info.album_name, channel_thumbnail_url, first_url, next_url,
+                              tuple(dataclasses.astuple(music_info) for music_info in music_info_list)))
+            # 外部で削除・変更されたページは、内容が同じでも出力し直す
+            if TemplateRenderer.feed_page_signatures.get(feed_info.file_path(page_number)) == signature \
+                    and FileIO.is_written_file_intact(feed_info.file_path(page_number)):
+                return
+
+        xml_chunks = TemplateRenderer.generate_feed_xml(feed_info, music_info_list, channel_thumbnail_url, first_url, next_url)
+        FileIO.output_feed_xml(xml_chunks, feed_info, page_number)
+        if is_archive_page:
+            TemplateRenderer.feed_page_signatures[feed_info.file_path(page_number)] = signature
+
+    @staticmethod
+    def generate_feed_xml(feed_info: FeedInfo, music_info_list: List[MusicInfo], channel_thumbnail_url: str,
+                          first_url: Optional[str] = None, next_url: Optional[str] = None) -> Iterator[str]:
+        """フィードの1ページを描画し、文字列のチャンクを順に返す"""
+        item_template = FileIO.get_feed_item_xml_template()
+        if TemplateRenderer.item_xml_cache_template is not item_template:
+            # テンプレートが更新された場合は、描画済みの <item> 要素を使わない
+            TemplateRenderer.clear_item_xml_cache()
+            TemplateRenderer.item_xml_cache_template = item_template
+
+        # アルバム全体の要素を一度に作らないよう、テンプレートの描画に合わせて1件ずつ取り出す
+        items: Iterable[str] = (TemplateRenderer.get_item_xml(item_template, music_info) for music_info in music_info_list)
 
         rendering_params = {
             "channel": {
               "title": feed_info.album_name,
-              "thumbnail_url": music_info_list[0].thumbnail_url
+              "thumbnail_url": channel_thumbnail_url,
+              "first_url": first_url,
+              "next_url": next_url
             },
             "items": items
           }
 
-        xml = FileIO.get_feed_xml_template().render(rendering_params)
-        FileIO.output_feed_xml(xml, feed_info)
+        return FileIO.get_feed_xml_template().generate(rendering_params)
+
+    @staticmethod
+    def get_item_xml(item_template: Template, music_info: MusicInfo) -> str:
+        """トラックの <item> 要素を取得（内容が変わっていなければ描画済みのものを使う）"""
+        # <item> 要素の描画に使う値だけをキーにする（配信URLはパスから求まるため含めない）
+        key = (music_info.album_name, music_info.title, music_info.created_timestamp, music_info.duration_seconds,
+               music_info.file_size_bytes, music_info.thumbnail_url)
+        with TemplateRenderer.item_xml_cache_lock:
+            cached = TemplateRenderer.item_xml_cache.get(music_info.fullpath)
+            if cached is not None and cached[0] == key:
+                TemplateRenderer.item_xml_cache.move_to_end(music_info.fullpath)
+                return cached[1]
+
+        item_xml = item_template.module.item_xml({
+            "title": music_info.title,
+            "date_text_rfc1123": format_date_time(music_info.created_timestamp),
+            "md5": music_info.md5(),
+            "duration_hhmmss": time.strftime('%H:%M:%S', time.gmtime(music_info.duration_seconds)),
+            "url": music_info.absolute_url,
+            "mime_type": music_info.mime_type,
+            "file_size_bytes": music_info.file_size_bytes,
+            "thumbnail_url": music_info.thumbnail_url
+        })
+        if TemplateRenderer.item_xml_cache_size <= 0:
+            return item_xml
+        with TemplateRenderer.item_xml_cache_lock:
+            TemplateRenderer.item_xml_cache[music_info.fullpath] = (key, item_xml)
+            TemplateRenderer.item_xml_cache.move_to_end(music_info.fullpath)
+            while len(TemplateRenderer.item_xml_cache) > TemplateRenderer.item_xml_cache_size:
+                TemplateRenderer.item_xml_cache.popitem(last=False)
+        return item_xml
+
+    @staticmethod
+    def forget_item_xml(fullpaths: Iterable[str]):
+        """削除・移動されたトラックの描画済みの <item> 要素を破棄"""
+        with TemplateRenderer.item_xml_cache_lock:
+            for fullpath in fullpaths:
+                TemplateRenderer.item_xml_cache.pop(fullpath, None)
+
+    @staticmethod
+    def clear_item_xml_cache():
+        """描画済みの <item> 要素をすべて破棄"""
+        with TemplateRenderer.item_xml_cache_lock:
+            TemplateRenderer.item_xml_cache.clear()
 
     @staticmethod
-    def render_index_html(feed_info_list: List[FeedInfo]):
-        feeds: List[Dict[str: Any]] = []
-        for feed_info in feed_info_list:
-            feeds.append({
-              "path": feed_info.url(),
-              "title": feed_info.album_name
-            })
+    @metrics.timed("render_index")
+    def render_index_html(feed_info_list: List[FeedInfo], last_update_date: datetime):
+        """インデックスページを描画して出力
+
+        アルバム名の順に index_page_size 件ずつのページに分け、
+        2ページ目以降は載せるアルバムが変わった場合のみ出力し直す
+        """
+        feed_info_list = sorted(feed_info_list, key=lambda feed_info: feed_info.album_name)
+        page_size = TemplateRenderer.index_page_size
+        if page_size <= 0:
+            page_size = max(len(feed_info_list), 1)
+        page_count = max((len(feed_info_list) + page_size - 1) // page_size, 1)
+        pages = [{
+                "number": page_number + 1,
+                "path": FileIO.get_htdocs_url(FileIO.index_html_page_file_path(page_number))
+            } for page_number in range(page_count)] if page_count > 1 else []
+
+        for page_number in range(page_count):
+            page_feed_info_list = feed_info_list[page_number * page_size:(page_number + 1) * page_size]
+            html_file_path = FileIO.index_html_page_file_path(page_number)
+            # 最終更新日時は先頭ページにのみ載せるため、2ページ目以降は変更の無いページを描画しない
+            is_archive_page = page_number > 0
+            if is_archive_page:
+                signature = hash((page_count, tuple(feed_info.album_name for feed_info in page_feed_info_list)))
+                if TemplateRenderer.index_page_signatures.get(html_file_path) == signature \
+                        and FileIO.is_written_file_intact(html_file_path):
+                    continue
+
+            feeds: Iterable[Dict[str, Any]] = ({
+                  "path": feed_info.url(),
+                  "title": feed_info.album_name
+                } for feed_info in page_feed_info_list)
 
-        rendering_params = { "last_update_date": datetime.now(timezone), "feeds": feeds }
+            rendering_params = {
+                "last_update_date": last_update_date if not is_archive_page else None,
+                "feeds": feeds,
+                "pages": pages,
+                "current_page_number": page_number + 1,
+                "opml_path": FileIO.get_htdocs_url(FileIO.opml_file_path),
+                "catalog_json_path": FileIO.get_htdocs_url(FileIO.catalog_json_file_path)
+            }
 
-        html = FileIO.get_index_html_template().render(rendering_params)
-        FileIO.output_index_html(html)
+            html_chunks = FileIO.get_index_html_template().generate(rendering_params)
+            FileIO.output_index_html(html_chunks, page_number)
+            if is_archive_page:
+                TemplateRenderer.index_page_signatures[html_file_path] = signature
+
+        # アルバムが減って不要になったページを削除
+        for file_path in FileIO.remove_index_html_pages_after(page_count - 1):
+            TemplateRenderer.index_page_signatures.pop(file_path, None)
+
+    @staticmethod
+    @metrics.timed("render_opml")
+    def render_opml(feed_info_list: List[FeedInfo]):
+        """全フィードを購読するための OPML を出力（アルバムの増減が無ければ内容は変わらない）"""
+        outlines: Iterable[Dict[str, Any]] = ({
+              "title": feed_info.album_name,
+              "url": feed_info.url()
+            } for feed_info in sorted(feed_info_list, key=lambda feed_info: feed_info.album_name))
+
+        opml_chunks = FileIO.get_opml_template().generate({"outlines": outlines})
+        FileIO.output_opml(opml_chunks)
+
+    @staticmethod
+    @metrics.timed("render_catalog_json")
+    def render_catalog_json(album_summaries: List[Tuple[str, int, str]]):
+        """カタログの内容（アルバムごとのフィードのURL・トラック数・サムネイル）を JSON で出力"""
+        albums = [{
+                "title": album_name,
+                "feed_url": FeedInfo(album_name=album_name).url(),
+                "track_count": track_count,
+                "thumbnail_url": thumbnail_url
+            } for album_name, track_count, thumbnail_url in album_summaries]
+
+        json_chunks = json.JSONEncoder(ensure_ascii=False, indent=2).iterencode({"albums": albums})
+        FileIO.output_catalog_json(json_chunks)
+
+class RenderScheduler:
+    """フィードとインデックスページの描画を、上限付きのワーカースレッドで非同期に行う
+
+    描画はキー（アルバム名など）ごとに高々1つだけ実行・待機させ、描画中に同じキーの
+    描画が要求された場合は、終わった後に最新の内容で描画し直す（途中の要求はまとめる）。
+    実行中の描画は中断しないため、その描画の出力は直後の描画し直しで置き換えられる。
+    同じキーの描画は同時に走らないため、インデックスページは常に1つの書き手が出力する。
+    """
+
+    def __init__(self, max_workers: int):
+        self.condition = threading.Condition()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="feed-render")
+        # キーごとの要求の通し番号
+        self.versions: Dict[Any, int] = {}
+        # 描画の実行中・待機中のキー
+        self.scheduled_keys: set = set()
+        # True の間は、描画を要求したスレッドでそのまま描画する（プロファイルの取得時など）
+        self.inline = False
+
+    def schedule(self, key: Any, render: Callable[[], None]):
+        """描画を要求（同じキーの描画が実行中・待機中であれば、それに任せる）"""
+        if self.inline:
+            RenderScheduler._render(key, render)
+            return
+        with self.condition:
+            self.versions[key] = self.versions.get(key, 0) + 1
+            if key in self.scheduled_keys:
+                return
+            self.scheduled_keys.add(key)
+        self.executor.submit(self._run, key, render)
+
+    def _run(self, key: Any, render: Callable[[], None]):
+        while True:
+            with self.condition:
+                version = self.versions[key]
+            RenderScheduler._render(key, render)
+            with self.condition:
+                # 描画中に新しい要求が来ていれば、最新の内容で描画し直す
+                if self.versions[key] == version:
+                    self.scheduled_keys.discard(key)
+                    self.condition.notify_all()
+                    return
+
+    @staticmethod
+    def _render(key: Any, render: Callable[[], None]):
+        try:
+            render()
+        except Exception as e:
+            logger.error(f"Failed to render {key}: {e}")
+
+    def wait(self):
+        """要求済みの描画がすべて終わるまで待つ"""
+        with self.condition:
+            self.condition.wait_for(lambda: not self.scheduled_keys)
 
 class FeedGenerator:
+    # ウォッチャープロセスが保持し続けるカタログ（初回アクセス時にインデックスから読み込む）
+    catalog: Optional[MusicCatalog] = None
+    # フィードをファイルに出力せず、リクエストに応じて描画する（feed_server.py が配信する）
+    on_demand_feeds: bool = os.environ.get("FEED_SERVING_MODE", "static") == "ondemand"
+    # アルバムのトラックが変わった時に呼ばれる関数（描画済みフィードのキャッシュの破棄に使う）
+    album_change_listeners: List[Callable[[str], None]] = []
+    # 全体生成のプロファイル（cProfile）の出力先（空の場合はプロファイルを取らない）
+    generate_profile_path: str = os.environ.get("GENERATE_PROFILE_PATH", "")
+    # アルバムのフィードとインデックスページを描画するワーカースレッド
+    render_scheduler = RenderScheduler(max_workers=int(os.environ.get("FEED_RENDER_WORKERS", 4)))
+
+    @staticmethod
+    def get_catalog() -> MusicCatalog:
+        """カタログを取得"""
+        if FeedGenerator.catalog is None:
+            music_index = FileIO.get_music_index()
+            FeedGenerator.catalog = MusicCatalog(music_index.get_all(), last_modified=music_index.get_last_modified())
+        return FeedGenerator.catalog
+
     @staticmethod
     def generate():
-        """初回起動時の全体生成"""
+        """初回起動時の全体生成（generate_profile_path が指定されていれば cProfile の結果を出力する）
+
+        cProfile は呼び出したスレッドしか計測しないため、プロファイルを取る間は
+        フィードの描画もワーカースレッドではなくこのスレッドで行う
+        """
+        if not FeedGenerator.generate_profile_path:
+            FeedGenerator._generate()
+            return
+
+        profiler = cProfile.Profile()
+        FeedGenerator.render_scheduler.inline = True
+        try:
+            profiler.runcall(FeedGenerator._generate)
+        finally:
+            FeedGenerator.render_scheduler.inline = False
+            profiler.dump_stats(FeedGenerator.generate_profile_path)
+            logger.info(f"Profile of generate() written to {FeedGenerator.generate_profile_path}")
+
+    @staticmethod
+    @metrics.timed("generate")
+    def _generate():
         music_list = FileIO.get_music_list()
-        FileIO.save_music_index(music_list)
-        FeedGenerator._regenerate_all_feeds(music_list)
+        FeedGenerator.catalog = MusicCatalog(music_list, last_modified=FileIO.get_music_index().get_last_modified())
+        FeedGenerator._regenerate_all_feeds()
 
     @staticmethod
     def add_music_file(file_path: str):
         """新しい音楽ファイルを追加し、フィードを差分更新"""
-        logger.info(f"Adding music file: {file_path}")
-        
-        # 新しいファイルの情報を取得
-        new_music_info = FileIO.get_music_info_from_file(file_path)
-        if new_music_info is None:
-            logger.warning(f"{file_path} was skipped (invalid music file)")
-            return
+        FeedGenerator.apply_changes(added_paths=[file_path])
+
+    @staticmethod
+    def remove_music_file(file_path: str):
+        """音楽ファイルを削除し、フィードを差分更新"""
+        FeedGenerator.apply_changes(removed_paths=[file_path])
+
+    @staticmethod
+    def move_music_file(src_path: str, dest_path: str):
+        """音楽ファイルの移動を反映し、フィードを差分更新"""
+        FeedGenerator.apply_changes(moved_paths=[(src_path, dest_path)])
 
-        # 既存のインデックスを読み込み
-        existing_music_list = FileIO.load_music_index()
-        
-        # 重複チェック
-        for existing in existing_music_list:
-            if existing.fullpath == file_path:
+    @staticmethod
+    @metrics.timed("apply_changes")
+    def apply_changes(added_paths: Iterable[str] = (), removed_paths: Iterable[str] = (),
+                      moved_paths: Iterable[Tuple[str, str]] = ()):
+        """複数ファイルの追加・削除・移動をまとめてインデックスに反映し、
+        影響のあったアルバムのフィードとインデックスページの描画をそれぞれ1回だけ要求する
+
+        描画は render_scheduler のワーカースレッドで行われ、完了を待たずに戻る。
+
+        追加されたファイルが既にインデックスにあり、サイズや更新日時が変わっている場合は読み込み直す。
+        同じパスが両方に含まれる場合は、削除してから追加する（ファイルの置き換え）。
+        移動（移動元, 移動先）はタグを読み直さずにパスとURLだけを書き換える。
+        移動元がインデックスに無いか、サイズや更新日時が変わっている場合は削除と追加として扱う
+        """
+        catalog = FeedGenerator.get_catalog()
+        music_index = FileIO.get_music_index()
+        affected_album_names = set()
+        # 削除・置き換えられたトラックが参照していたサムネイル画像
+        released_thumbnail_urls = set()
+        added_paths = list(added_paths)
+        removed_paths = list(removed_paths)
+
+        # 移動（移動元のトラックを、パスだけ書き換えて移動先へ移す）
+        moves: List[Tuple[str, str, StatKey, Optional[MusicInfo]]] = []
+        for src_path, dest_path in moved_paths:
+            logger.info(f"Moving music file: {src_path} -> {dest_path}")
+            try:
+                stat_key = FileIO.get_file_stat_key(dest_path)
+            except OSError:
+                stat_key = None
+            known_stat_key = music_index.get_stat_key(src_path)
+            # ファイルシステムをまたぐ移動では inode が変わるため、サイズと更新日時だけを比べる
+            if stat_key is None or known_stat_key is None or known_stat_key[:2] != stat_key[:2]:
+                removed_paths.append(src_path)
+                added_paths.append(dest_path)
+                continue
+            moved_music = catalog.get(src_path)
+            if moved_music is not None:
+                moved_music = FileIO.get_moved_music_info(moved_music, dest_path)
+            moves.append((src_path, dest_path, stat_key, moved_music))
+
+        # 追加（重複チェックをしてから、新しいファイルの情報をまとめて取得）
+        # インデックス済みのファイルでも stat キーが変わっていれば読み込み直す
+        # 削除と追加の両方に含まれるパス（置き換え）は stat キーが同じでも読み込み直す
+        removed_path_set = set(removed_paths)
+        new_file_paths: List[str] = []
+        stat_keys: Dict[str, Optional[StatKey]] = {}
+        for file_path in added_paths:
+            logger.info(f"Adding music file: {file_path}")
+            try:
+                stat_key = FileIO.get_file_stat_key(file_path)
+            except OSError:
+                stat_key = None
+            if (stat_key is not None and file_path not in removed_path_set
+                    and music_index.get_stat_key(file_path) == stat_key):
                 logger.info(f"File already exists in index: {file_path}")
-                return
+                continue
+            if file_path in catalog and file_path not in removed_path_set:
+                logger.info(f"File was modified, re-reading: {file_path}")
+            new_file_paths.append(file_path)
+            stat_keys[file_path] = stat_key
 
-        # インデックスに追加
-        existing_music_list.append(new_music_info)
-        FileIO.save_music_index(existing_music_list)
+        TemplateRenderer.forget_item_xml(removed_paths + [src_path for src_path, _, _, _ in moves])
+        metrics.files_total.inc(len(moves), operation="moved")
+        metrics.files_total.inc(len(removed_paths), operation="removed")
+        metrics.files_total.inc(len(new_file_paths), operation="added")
 
-        # 該当アルバムのフィードのみ更新
-        FeedGenerator._update_album_feed(new_music_info.album_name, existing_music_list)
-        
-        # インデックスページを更新
-        all_feeds = FeedGenerator._get_all_feeds(existing_music_list)
-        TemplateRenderer.render_index_html(all_feeds)
+        # タグの読み込みには時間がかかるため、カタログを変更する前に済ませておく
+        new_music_info_list = FileIO.parse_music_files(new_file_paths)
 
-    @staticmethod
-    def remove_music_file(file_path: str):
-        """音楽ファイルを削除し、フィードを差分更新"""
-        logger.info(f"Removing music file: {file_path}")
-        
-        # 既存のインデックスを読み込み
-        existing_music_list = FileIO.load_music_index()
-        
-        # 削除対象を探す
-        removed_music = None
-        updated_music_list = []
-        for music in existing_music_list:
-            if music.fullpath == file_path:
-                removed_music = music
-            else:
-                updated_music_list.append(music)
+        # 削除と追加をまとめて1回のロックの中でカタログへ反映し、
+        # 描画中のスレッドが途中の状態（置き換えたトラックが無いなど）を読まないようにする
+        with catalog.lock:
+            for src_path, dest_path, stat_key, moved_music in moves:
+                replaced_music = catalog.remove(dest_path)
+                if replaced_music is not None:
+                    affected_album_names.add(replaced_music.album_name)
+                    released_thumbnail_urls.add(replaced_music.thumbnail_url)
+                if moved_music is not None:
+                    catalog.remove(src_path)
+                    catalog.add(moved_music)
+                    affected_album_names.add(moved_music.album_name)
+
+            for file_path in removed_paths:
+                logger.info(f"Removing music file: {file_path}")
+                removed_music = catalog.remove(file_path)
+                if removed_music is None:
+                    logger.info(f"File not found in index: {file_path}")
+                    continue
+                affected_album_names.add(removed_music.album_name)
+                released_thumbnail_urls.add(removed_music.thumbnail_url)
+
+            for file_path, new_music_info in zip(new_file_paths, new_music_info_list):
+                # 変更されたファイルの読み込み前のトラック
+                replaced_music = catalog.remove(file_path)
+                if replaced_music is not None:
+                    affected_album_names.add(replaced_music.album_name)
+                    released_thumbnail_urls.add(replaced_music.thumbnail_url)
+                if new_music_info is not None:
+                    catalog.add(new_music_info)
+                    affected_album_names.add(new_music_info.album_name)
+
+            if affected_album_names:
+                catalog.last_modified = time.time()
 
-        if removed_music is None:
-            logger.info(f"File not found in index: {file_path}")
+        with music_index.transaction():
+            for src_path, dest_path, stat_key, moved_music in moves:
+                music_index.delete(src_path)
+                if moved_music is None:
+                    # タグが無効なファイルは、無効なまま移動先で記録する
+                    music_index.mark_skipped(dest_path, stat_key)
+                else:
+                    music_index.upsert(moved_music, stat_key)
+            for file_path in removed_paths:
+                music_index.delete(file_path)
+            for file_path, new_music_info in zip(new_file_paths, new_music_info_list):
+                stat_key = stat_keys[file_path]
+                if new_music_info is None:
+                    logger.warning(f"{file_path} was skipped (invalid music file)")
+                    # 変更前はインデックスにあったファイルも含め、無効なファイルとして記録する
+                    if stat_key is not None:
+                        music_index.mark_skipped(file_path, stat_key)
+                    else:
+                        music_index.delete(file_path)
+                    continue
+                music_index.upsert(new_music_info, stat_key)
+            if affected_album_names:
+                music_index.set_last_modified(catalog.last_modified)
+        FileIO.remove_unreferenced_thumbnails(released_thumbnail_urls)
+
+        if not affected_album_names:
             return
 
-        # インデックスを更新
-        FileIO.save_music_index(updated_music_list)
+        # 該当アルバムのフィードのみ更新
+        for album_name in sorted(affected_album_names):
+            FeedGenerator._update_album_feed(album_name)
 
-        # 該当アルバムのフィードを更新
-        FeedGenerator._update_album_feed(removed_music.album_name, updated_music_list)
-        
         # インデックスページを更新
-        all_feeds = FeedGenerator._get_all_feeds(updated_music_list)
-        TemplateRenderer.render_index_html(all_feeds)
-
-    @staticmethod
-    def _regenerate_all_feeds(music_list: List[MusicInfo]):
-        """全フィードを再生成"""
-        music_list_grouped_by_album_name = groupby(sorted(music_list, key=lambda e: e.album_name), key=lambda e: e.album_name)
-        
-        all_feeds: List[FeedInfo] = []
-        for key, music_list in music_list_grouped_by_album_name:
-            feed = FeedInfo(album_name=key)
-            all_feeds.append(feed)
-            sorted_music_list: List[MusicInfo] = sorted(list(music_list), key=lambda e: e.title, reverse=True)
-            TemplateRenderer.render_feed_xml(feed, sorted_music_list)
+        FeedGenerator._update_index_html()
+
+    @staticmethod
+    def _regenerate_all_feeds():
+        """全フィードを再生成（リクエストに応じて描画する場合はインデックスページのみ）し、描画の完了を待つ"""
+        for feed in FeedGenerator._get_all_feeds():
+            FeedGenerator._update_album_feed(feed.album_name)
+
+        FeedGenerator._update_index_html()
+        FeedGenerator.render_scheduler.wait()
 
-        TemplateRenderer.render_index_html(all_feeds)
+    @staticmethod
+    def _update_album_feed(album_name: str):
+        """特定のアルバムのフィードのみ更新を要求"""
+        for listener in FeedGenerator.album_change_listeners:
+            listener(album_name)
+        if FeedGenerator.on_demand_feeds:
+            return
+        FeedGenerator.render_scheduler.schedule(("feed", album_name), lambda: FeedGenerator._render_album_feed(album_name))
 
     @staticmethod
-    def _update_album_feed(album_name: str, music_list: List[MusicInfo]):
-        """特定のアルバムのフィードのみ更新"""
-        album_music_list = [music for music in music_list if music.album_name == album_name]
-        if album_music_list:
+    def _render_album_feed(album_name: str):
+        """アルバムのフィードを、描画を始める時点のカタログの内容で描画"""
+        sorted_music_list = FeedGenerator.get_catalog().album_tracks(album_name)
+        if sorted_music_list:
             feed = FeedInfo(album_name=album_name)
-            sorted_music_list: List[MusicInfo] = sorted(album_music_list, key=lambda e: e.title, reverse=True)
             TemplateRenderer.render_feed_xml(feed, sorted_music_list)
 
     @staticmethod
-    def _get_all_feeds(music_list: List[MusicInfo]) -> List[FeedInfo]:
+    def _update_index_html():
+        """インデックスページ・OPML・カタログの JSON の更新を要求"""
+        FeedGenerator.render_scheduler.schedule(("index",), FeedGenerator._render_catalog_outputs)
+
+    @staticmethod
+    def _render_catalog_outputs():
+        """カタログ全体から作る出力（インデックスページ・OPML・カタログの JSON）を描画"""
+        all_feeds = FeedGenerator._get_all_feeds()
+        TemplateRenderer.render_index_html(all_feeds, FeedGenerator._get_last_update_date())
+        TemplateRenderer.render_opml(all_feeds)
+        TemplateRenderer.render_catalog_json(FeedGenerator.get_catalog().album_summaries())
+
+    @staticmethod
+    def _get_all_feeds() -> List[FeedInfo]:
         """全フィード情報を取得"""
-        album_names = list(set([music.album_name for music in music_list]))
-        return [FeedInfo(album_name=name) for name in album_names]
+        return [FeedInfo(album_name=name) for name in FeedGenerator.get_catalog().album_names()]
+
+    @staticmethod
+    def _get_last_update_date() -> datetime:
+        """カタログが最後に変更された日時を取得
+
+        記録が無い場合（旧バージョンからの移行直後など）は最も新しいトラックの作成日時を使う
+        """
+        catalog = FeedGenerator.get_catalog()
+        last_modified = catalog.last_modified
+        if last_modified is None:
+            last_modified = catalog.latest_created_timestamp()
+        return datetime.fromtimestamp(last_modified, timezone)
+
+catalog_size.set_function(lambda: len(FeedGenerator.catalog) if FeedGenerator.catalog is not None else 0, kind="tracks")
+catalog_size.set_function(lambda: len(FeedGenerator.catalog.albums) if FeedGenerator.catalog is not None else 0, kind="albums")
 
 if __name__ == "__main__":
     FeedGenerator.generate()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""フィードをリクエストに応じて描画する WSGI アプリ（FEED_SERVING_MODE=ondemand の場合に使う）
+
+httpd の /feeds/ をこのアプリへプロキシし、ウォッチャーのプロセス内のカタログから
+feeds/<hash>.xml（ページ分割時は <hash>-<ページ番号>.xml）を描画して返す。
+描画結果は件数に上限のある LRU キャッシュに保持し、アルバムが変わった時にそのアルバムの分だけ破棄する。
+If-None-Match / If-Modified-Since には 304 Not Modified で応える。
+"""
+import gzip
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from socketserver import ThreadingMixIn
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from feed_generator import FeedGenerator, FeedInfo, TemplateRenderer
+import metrics
+
+logger = logging.getLogger(__name__)
+
+feed_requests_total = metrics.registry.counter("podcast_feed_requests_total", "Number of on-demand feed requests, by result.")
+feed_cache_size = metrics.registry.gauge("podcast_feed_cache_size", "Number of rendered feed pages held in the on-demand cache.")
+
+@dataclass
+class RenderedFeed:
+    body: bytes
+    etag: str
+    last_modified: float
+    gzip_body: Optional[bytes] = None
+
+class FeedCache:
+    """描画済みフィードの LRU キャッシュ（(アルバム名, ページ番号) → RenderedFeed）"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[Tuple[str, int], RenderedFeed]" = OrderedDict()
+        # アルバムごとの変更回数（描画中に変更されたアルバムの古い結果をキャッシュしないため）
+        self.generations: Dict[str, int] = {}
+        # アルバムごとの最終変更日時（Last-Modified は秒単位のため、整数の秒で持つ）
+        self.modified_at: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, album_name: str, page_number: int) -> Optional[RenderedFeed]:
+        with self.lock:
+            rendered_feed = self.entries.get((album_name, page_number))
+            if rendered_feed is not None:
+                self.entries.move_to_end((album_name, page_number))
+            return rendered_feed
+
+    def generation(self, album_name: str) -> int:
+        with self.lock:
+            return self.generations.get(album_name, 0)
+
+    def put(self, album_name: str, page_number: int, rendered_feed: RenderedFeed, generation: int):
+        with self.lock:
+            if self.generations.get(album_name, 0) != generation:
+                return
+            self.entries[(album_name, page_number)] = rendered_feed
+            self.entries.move_to_end((album_name, page_number))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, album_name: str, previous_modified_at: Optional[float] = None):
+        """アルバムの描画結果を破棄
+
+        最終変更日時は、同じ秒のうちに変更が続いても If-Modified-Since だけを送るクライアントに
+        304 を返さないよう、前回（記録が無ければ previous_modified_at）より必ず1秒以上進める
+        """
+        with self.lock:
+            self.generations[album_name] = self.generations.get(album_name, 0) + 1
+            now = int(time.time())
+            previous = self.modified_at.get(album_name, previous_modified_at)
+            self.modified_at[album_name] = now if previous is None else max(now, int(previous) + 1)
+            for key in [key for key in self.entries if key[0] == album_name]:
+                del self.entries[key]
+
+class FeedServer:
+    """フィードを描画して返す WSGI アプリ"""
+
+    feed_path_pattern = re.compile(r"^/feeds/([0-9a-f]{32})(?:-([1-9][0-9]*))?\.xml$")
+
+    def __init__(self, cache_size: int = 256):
+        self.cache = FeedCache(cache_size)
+        # フィードのハッシュ → アルバム名（アルバムが変わった時に作り直す）
+        self.album_names_by_hash: Optional[Dict[str, str]] = None
+        self.started_at = time.time()
+        FeedGenerator.album_change_listeners.append(self.invalidate_album)
+        feed_cache_size.set_function(lambda: len(self.cache))
+
+    def invalidate_album(self, album_name: str):
+        # 起動後に初めて変更されたアルバムは、それまでカタログの最終変更日時を返していた
+        self.cache.invalidate(album_name, FeedGenerator.get_catalog().last_modified or self.started_at)
+        self.album_names_by_hash = None
+
+    def find_album_name(self, feed_hash: str) -> Optional[str]:
+        album_names_by_hash = self.album_names_by_hash
+        if album_names_by_hash is None:
+            album_names_by_hash = {FeedInfo(album_name=album_name).hash(): album_name
+                                   for album_name in FeedGenerator.get_catalog().album_names()}
+            self.album_names_by_hash = album_names_by_hash
+        return album_names_by_hash.get(feed_hash)
+
+    def album_last_modified(self, album_name: str) -> float:
+        """アルバムの最終変更日時（起動後に変更されていなければカタログの最終変更日時）"""
+        modified_at = self.cache.modified_at.get(album_name)
+        if modified_at is not None:
+            return modified_at
+        return FeedGenerator.get_catalog().last_modified or self.started_at
+
+    def render(self, album_name: str, page_number: int) -> Optional[RenderedFeed]:
+        """フィードの1ページを描画（キャッシュにあればそれを返す。存在しないページの場合は None）"""
+        rendered_feed = self.cache.get(album_name, page_number)
+        if rendered_feed is not None:
+            feed_requests_total.inc(result="hit")
+            return rendered_feed
+
+        generation = self.cache.generation(album_name)
+        last_modified = self.album_last_modified(album_name)
+        music_info_list = FeedGenerator.get_catalog().album_tracks(album_name)
+        if not music_info_list:
+            return None
+        feed_info = FeedInfo(album_name=album_name)
+        feed_pages = TemplateRenderer.feed_pages(feed_info, music_info_list)
+        if page_number >= len(feed_pages):
+            return None
+        _, page_music_info_list, first_url, next_url = feed_pages[page_number]
+
+        with metrics.timed("render_feed_on_demand"):
+            xml_chunks = TemplateRenderer.generate_feed_xml(feed_info, page_music_info_list, music_info_list[0].thumbnail_url,
+                                                            first_url, next_url)
+            body = "".join(xml_chunks).encode("utf-8")
+        rendered_feed = RenderedFeed(body=body, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"', last_modified=last_modified)
+        self.cache.put(album_name, page_number, rendered_feed, generation)
+        feed_requests_total.inc(result="miss")
+        return rendered_feed
+
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        method = environ.get("REQUEST_METHOD", "GET")
+        if method not in ("GET", "HEAD"):
+            start_response("405 Method Not Allowed", [("Allow", "GET, HEAD"), ("Content-Length", "0")])
+            return []
+
+        match = FeedServer.feed_path_pattern.match(environ.get("PATH_INFO", ""))
+        album_name = self.find_album_name(match.group(1)) if match else None
+        rendered_feed = self.render(album_name, int(match.group(2) or 0)) if album_name is not None else None
+        if rendered_feed is None:
+            feed_requests_total.inc(result="not_found")
+            start_response("404 Not Found", [("Content-Type", "text/plain"), ("Content-Length", "9")])
+            return [b"Not Found"] if method == "GET" else []
+
+        headers = [
+            ("ETag", rendered_feed.etag),
+            ("Last-Modified", formatdate(rendered_feed.last_modified, usegmt=True)),
+            ("Cache-Control", "no-cache"),
+            ("Vary", "Accept-Encoding"),
+        ]
+        if self.is_not_modified(environ, rendered_feed):
+            feed_requests_total.inc(result="not_modified")
+            start_response("304 Not Modified", headers)
+            return []
+
+        body = rendered_feed.body
+        if "gzip" in environ.get("HTTP_ACCEPT_ENCODING", ""):
+            if rendered_feed.gzip_body is None:
+                rendered_feed.gzip_body = gzip.compress(rendered_feed.body, mtime=0)
+            body = rendered_feed.gzip_body
+            headers.append(("Content-Encoding", "gzip"))
+        headers += [("Content-Type", "application/xml; charset=utf-8"), ("Content-Length", str(len(body)))]
+        start_response("200 OK", headers)
+        return [body] if method == "GET" else []
+
+    @staticmethod
+    def is_not_modified(environ: dict, rendered_feed: RenderedFeed) -> bool:
+        """条件付きリクエストの条件から 304 を返せるか判定（If-None-Match があれば If-Modified-Since より優先する）"""
+        if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+        if if_none_match is not None:
+            # 弱い比較（W/ の有無は区別しない）
+            etags: List[str] = [etag.strip().removeprefix("W/") for etag in if_none_match.split(",")]
+            return "*" in etags or rendered_feed.etag in etags
+
+        if_modified_since = environ.get("HTTP_IF_MODIFIED_SINCE")
+        if if_modified_since is None:
+            return False
+        try:
+            return int(rendered_feed.last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        # アクセスログは httpd に任せる
+        pass
+
+def start_feed_server(host: str = "127.0.0.1", port: int = 8081, cache_size: int = 256) -> WSGIServer:
+    """フィード配信サーバーをバックグラウンドのスレッドで起動"""
+    server = make_server(host, port, FeedServer(cache_size), server_class=ThreadingWSGIServer, handler_class=QuietWSGIRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, name="feed-server")
+    thread.daemon = True
+    thread.start()
+    logger.info(f"On-demand feed server listening on {host}:{port}")
+    return server
@@ -5,9 +5,18 @@ import time
 import logging
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+try:
+    from watchdog.observers.inotify import InotifyObserver
+except ImportError:
+    InotifyObserver = None
 from feed_generator import FeedGenerator, FileIO
+import metrics
+from feed_server import start_feed_server
 import threading
-from typing import Dict
+import queue
+import heapq
+from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
 import stat
 
 # ロガー設定
@@ -17,204 +26,612 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+watcher_state = metrics.registry.gauge("podcast_watcher_state", "Number of queued events, pending and still-being-written files in the watcher.")
+threads_gauge = metrics.registry.gauge("podcast_threads", "Number of live threads in the watcher process.")
+threads_gauge.set_function(threading.active_count)
+
 class MusicFileHandler(FileSystemEventHandler):
-    """音楽ファイルの変更を監視するハンドラー"""
-    
-    def __init__(self):
+    """音楽ファイルの変更を監視するハンドラー
+
+    イベントは上限付きのキューに積み、単一のワーカースレッドがデバウンス期間内に
+    届いたイベントを1つのバッチにまとめてフィードへ反映する。
+
+    書き込みの完了は、書き込み後のクローズイベント（inotify の IN_CLOSE_WRITE）で検知する。
+    クローズイベントが届かない環境やポーリングで見つかったファイルは、更新日時が落ち着いたかで判定する。
+    書き込み中のファイルは再確認の予定時刻順に1つのタイマーで管理し、ファイルごとにスレッドを待機させない。
+    """
+
+    def __init__(self, debounce_seconds: float = 2.0, queue_size: int = 10000, settle_seconds: float = 60.0,
+                 close_events_supported: bool = False):
         super().__init__()
         self.music_extensions = ['.mp3', '.m4a']
-        # 処理の重複を避けるためのロック
-        self.lock = threading.Lock()
-        # ファイルサイズ監視用の辞書
-        self.file_sizes: Dict[str, int] = {}
-        # 処理済みファイルの記録
-        self.processed_files: set = set()
-        
+        # 最後のイベントからこの秒数だけ新しいイベントが来なければバッチを処理する
+        self.debounce_seconds = debounce_seconds
+        # イベントが途切れない場合でも、この秒数を超えたらバッチを処理する
+        self.max_batch_delay_seconds = debounce_seconds * 10
+        # 最終更新からこの秒数以上経っているファイルは、書き込み完了済みとみなす
+        self.settle_seconds = settle_seconds
+        # 未処理のイベント（キューが一杯の場合、イベントの通知元はブロックされる）
+        self.event_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        # バッチ処理待ちのファイル（パス → 種別）
+        self.pending_events: Dict[str, str] = {}
+        # 移動されたファイルの移動元（移動先のパス → 移動元のパス）
+        self.move_sources: Dict[str, str] = {}
+        # 監視の仕組みがクローズイベントを通知するか
+        self.close_events_supported = close_events_supported
+        # 書き込みイベントが届いた（クローズイベントで完了を知らされるはずの）ファイル
+        self.written_files: set = set()
+        # 書き込み後にクローズされたファイル
+        self.closed_files: set = set()
+        # 書き込み中のファイル（パス → 種別）と、その再確認の予定（(時刻, パス) のヒープ）
+        self.writing_files: Dict[str, str] = {}
+        self.recheck_schedule: List[Tuple[float, str]] = []
+
+        watcher_state.set_function(self.event_queue.qsize, kind="queued_events")
+        watcher_state.set_function(lambda: len(self.pending_events), kind="pending_files")
+        watcher_state.set_function(lambda: len(self.writing_files), kind="writing_files")
+
+        self.worker = threading.Thread(target=self._process_events)
+        self.worker.daemon = True
+        self.worker.start()
+
     def is_music_file(self, file_path: str) -> bool:
         """音楽ファイルかどうか判定"""
         return any(file_path.lower().endswith(ext) for ext in self.music_extensions)
-    
-    def is_file_write_complete(self, file_path: str, max_attempts: int = 5, wait_time: float = 1.0) -> bool:
+
+    def is_file_write_complete(self, file_path: str) -> bool:
         """ファイルの書き込みが完了しているかチェック"""
-        if not os.path.exists(file_path):
-            return False
-            
-        for attempt in range(max_attempts):
+        if file_path in self.closed_files:
+            return True
+        if self.close_events_supported and file_path in self.written_files:
+            # クローズイベントを待つ（書き込み途中で長く止まっているファイルは settle_seconds で諦めて完了とみなす）
             try:
-                # ファイルサイズをチェック
-                current_size = os.path.getsize(file_path)
-                
-                # 初回または前回と同じサイズの場合
-                if file_path not in self.file_sizes:
-                    self.file_sizes[file_path] = current_size
-                    time.sleep(wait_time)
-                    continue
-                    
-                # サイズが変わっていない場合
-                if self.file_sizes[file_path] == current_size:
-                    # ファイルが開けるかテスト
-                    try:
-                        with open(file_path, 'rb') as f:
-                            # ファイルの先頭と末尾を読み取ってアクセス可能か確認
-                            f.read(1024)
-                            if current_size > 1024:
-                                f.seek(-1024, 2)
-                                f.read(1024)
-                        
-                        # ファイルのロック状態をチェック（Unix系）
-                        if hasattr(os, 'access') and not os.access(file_path, os.W_OK):
-                            time.sleep(wait_time)
-                            continue
-                            
-                        return True
-                    except (IOError, OSError):
-                        # ファイルがまだロックされている
-                        time.sleep(wait_time)
-                        continue
-                else:
-                    # サイズが変わった場合は更新
-                    self.file_sizes[file_path] = current_size
-                    time.sleep(wait_time)
-                    
-            except (IOError, OSError):
-                time.sleep(wait_time)
-                continue
-                
-        return False
-    
-    def cleanup_file_tracking(self, file_path: str):
-        """ファイル追跡情報をクリーンアップ"""
-        if file_path in self.file_sizes:
-            del self.file_sizes[file_path]
-    
+                return time.time() - os.stat(file_path).st_mtime >= self.settle_seconds
+            except OSError:
+                return False
+        return self.is_file_write_settled(file_path)
+
+    def is_file_write_settled(self, file_path: str) -> bool:
+        """ファイルの書き込みが落ち着いているか（デバウンス期間中に更新されておらず、読み込めるか）をチェック"""
+        try:
+            st = os.stat(file_path)
+            age_seconds = time.time() - st.st_mtime
+            if age_seconds >= self.settle_seconds:
+                return True
+            if age_seconds < self.debounce_seconds:
+                return False
+            with open(file_path, 'rb') as f:
+                f.read(1)
+            return True
+        except (IOError, OSError):
+            return False
+
+    def enqueue(self, kind: str, file_path: str, src_path: Optional[str] = None):
+        """イベントをキューに積む（kind: "created"、"written"、"closed"、"deleted" または "moved"）
+
+        "moved" の場合、file_path は移動先、src_path は移動元のパス
+        """
+        metrics.watcher_events_total.inc(kind=kind)
+        self.event_queue.put((kind, file_path, src_path))
+
     def on_created(self, event):
         """ファイルが作成された時の処理"""
         if not event.is_directory and self.is_music_file(event.src_path):
-            # バックグラウンドで処理するためのスレッドを起動
-            thread = threading.Thread(target=self._handle_file_created, args=(event.src_path,))
-            thread.daemon = True
-            thread.start()
-    
+            self.enqueue("created", event.src_path)
+
     def on_modified(self, event):
-        """ファイルが変更された時の処理（書き込み完了を検知するため）"""
+        """ファイルが変更された時の処理
+
+        作成イベントだけのファイル（監視開始前に書き込みが終わっていた新しいディレクトリ内のファイルなど）は
+        クローズイベントが届かないことがあるため、クローズを待つのは書き込みイベントが届いたファイルに限る
+        """
         if not event.is_directory and self.is_music_file(event.src_path):
-            # 作成イベントと重複しないように処理済みファイルかチェック
-            if event.src_path not in self.processed_files:
-                thread = threading.Thread(target=self._handle_file_created, args=(event.src_path,))
-                thread.daemon = True
-                thread.start()
-    
+            self.enqueue("written", event.src_path)
+
+    def on_closed(self, event):
+        """書き込み用に開かれたファイルが閉じられた時の処理（書き込み完了を検知するため）"""
+        if not event.is_directory and self.is_music_file(event.src_path):
+            self.enqueue("closed", event.src_path)
+
     def on_deleted(self, event):
         """ファイルが削除された時の処理"""
         if not event.is_directory and self.is_music_file(event.src_path):
-            with self.lock:
-                logger.info(f"File deleted: {event.src_path}")
-                # 追跡情報をクリーンアップ
-                self.cleanup_file_tracking(event.src_path)
-                self.processed_files.discard(event.src_path)
-                FeedGenerator.remove_music_file(event.src_path)
-    
-    def _handle_file_created(self, file_path: str):
-        """ファイル作成処理を別スレッドで実行"""
-        try:
-            logger.info(f"Detected file: {file_path}, waiting for write completion...")
-            
-            # ファイルの書き込み完了を待つ
-            if self.is_file_write_complete(file_path):
-                with self.lock:
-                    # 重複処理を避ける
-                    if file_path in self.processed_files:
-                        return
-                    
-                    self.processed_files.add(file_path)
-                    logger.info(f"File write completed: {file_path}")
-                    FeedGenerator.add_music_file(file_path)
-                    # 追跡情報をクリーンアップ
-                    self.cleanup_file_tracking(file_path)
+            self.enqueue("deleted", event.src_path)
+
+    def on_moved(self, event):
+        """ファイルが移動・名前変更された時の処理
+
+        ディレクトリの移動では、配下のファイルごとの移動イベントも通知されるため、ファイルのイベントだけを扱う
+        """
+        if event.is_directory:
+            return
+        src_is_music_file = self.is_music_file(event.src_path)
+        dest_is_music_file = self.is_music_file(event.dest_path)
+        if src_is_music_file and dest_is_music_file:
+            self.enqueue("moved", event.dest_path, event.src_path)
+        elif src_is_music_file:
+            self.enqueue("deleted", event.src_path)
+        elif dest_is_music_file:
+            self.enqueue("created", event.dest_path)
+
+    def _process_events(self):
+        """キューからイベントを取り出し、落ち着いたところでバッチとして処理する"""
+        batch_started_at: Optional[float] = None
+        while True:
+            try:
+                kind, file_path, src_path = self.event_queue.get(timeout=self._next_timeout())
+                self._merge_event(kind, file_path, src_path)
+                if batch_started_at is None:
+                    batch_started_at = time.monotonic()
+                if time.monotonic() - batch_started_at < self.max_batch_delay_seconds:
+                    continue
+            except queue.Empty:
+                pass
+
+            self._resume_due_writing_files()
+            if self.pending_events:
+                try:
+                    self._apply_pending_events()
+                except Exception as e:
+                    logger.error(f"Error applying file events: {e}")
+            batch_started_at = None
+
+    def _next_timeout(self) -> Optional[float]:
+        """次にワーカーが起きるまでの秒数（待つものが無ければ None）"""
+        if self.pending_events:
+            return self.debounce_seconds
+        if self.recheck_schedule:
+            return max(0.0, self.recheck_schedule[0][0] - time.monotonic())
+        return None
+
+    def _merge_event(self, kind: str, file_path: str, src_path: Optional[str] = None):
+        """同じファイルへのイベントをまとめる"""
+        if kind == "moved":
+            self._merge_move(src_path, file_path)
+            return
+        if kind == "closed":
+            self.closed_files.add(file_path)
+            kind = "created"
+        elif kind == "written":
+            # クローズ後に再び書き込まれた場合は、改めてクローズを待つ
+            self.written_files.add(file_path)
+            self.closed_files.discard(file_path)
+            kind = "created"
+        elif kind == "deleted":
+            self.written_files.discard(file_path)
+            self.closed_files.discard(file_path)
+
+        previous = self.pending_events.get(file_path) or self.writing_files.pop(file_path, None)
+        if kind == "created" and previous in ("deleted", "replaced"):
+            # 削除後に作成された場合はファイルの置き換えとして扱う
+            kind = "replaced"
+        elif previous == "moved":
+            if kind == "created":
+                # 移動後に書き込まれた場合も移動として扱う（内容が変わっていれば反映時に読み直される）
+                kind = "moved"
             else:
-                logger.warning(f"File write completion timeout: {file_path}")
-                self.cleanup_file_tracking(file_path)
-                
-        except Exception as e:
-            logger.error(f"Error handling file {file_path}: {e}")
-            self.cleanup_file_tracking(file_path)
+                # 移動後に削除された場合は、移動元を削除する
+                self.pending_events[self.move_sources.pop(file_path)] = "deleted"
+        self.pending_events[file_path] = kind
+
+    def _merge_move(self, src_path: str, dest_path: str):
+        """移動イベントをまとめる
+
+        移動元がまだ反映されていない新しいファイルの場合は、移動先の作成として扱う。
+        移動を繰り返した場合は、最初の移動元から最後の移動先への移動にまとめる
+        """
+        previous = self.pending_events.pop(src_path, None) or self.writing_files.pop(src_path, None)
+        for files in (self.written_files, self.closed_files):
+            if src_path in files:
+                files.discard(src_path)
+                files.add(dest_path)
+        self.writing_files.pop(dest_path, None)
+
+        if previous == "moved":
+            src_path = self.move_sources.pop(src_path)
+        elif previous in ("created", "replaced"):
+            if previous == "replaced":
+                # 移動元に元々あったファイルは削除されている
+                self.pending_events[src_path] = "deleted"
+            self.move_sources.pop(dest_path, None)
+            self.pending_events[dest_path] = "created"
+            return
+
+        if src_path == dest_path:
+            # 元の場所に戻された
+            self.pending_events.pop(dest_path, None)
+            return
+        self.move_sources[dest_path] = src_path
+        self.pending_events[dest_path] = "moved"
+
+    def _schedule_recheck(self, file_path: str, kind: str):
+        """書き込み中のファイルを再確認する予定に入れる
+
+        クローズイベントを待っているファイルは、新しいイベントが届けば処理待ちに戻るため
+        settle_seconds 後まで確認しない
+        """
+        self.writing_files[file_path] = kind
+        if self.close_events_supported and file_path in self.written_files:
+            delay_seconds = self.settle_seconds
+        else:
+            delay_seconds = self.debounce_seconds
+        heapq.heappush(self.recheck_schedule, (time.monotonic() + delay_seconds, file_path))
+
+    def _resume_due_writing_files(self):
+        """再確認の時刻になった書き込み中のファイルを処理待ちに戻す"""
+        now = time.monotonic()
+        while self.recheck_schedule and self.recheck_schedule[0][0] <= now:
+            _, file_path = heapq.heappop(self.recheck_schedule)
+            # 新しいイベントで既に処理待ちに戻っている場合は、予定が残っていても何もしない
+            kind = self.writing_files.pop(file_path, None)
+            if kind is not None:
+                self.pending_events[file_path] = kind
+
+    def _apply_pending_events(self):
+        """処理待ちのイベントをまとめてフィードへ反映する
+
+        書き込み中のファイルは再確認の予定に入れ、後のバッチで処理する
+        """
+        added_paths = []
+        removed_paths = []
+        moved_paths = []
+        for file_path, kind in self.pending_events.items():
+            if kind == "deleted":
+                removed_paths.append(file_path)
+                continue
+            if not os.path.exists(file_path):
+                # 書き込み完了前に消えたファイル
+                if kind == "replaced":
+                    removed_paths.append(file_path)
+                if kind == "moved":
+                    removed_paths.append(self.move_sources.pop(file_path))
+                self.written_files.discard(file_path)
+                self.closed_files.discard(file_path)
+                continue
+            if not self.is_file_write_complete(file_path):
+                self._schedule_recheck(file_path, kind)
+                continue
+            self.written_files.discard(file_path)
+            self.closed_files.discard(file_path)
+            if kind == "moved":
+                moved_paths.append((self.move_sources.pop(file_path), file_path))
+                continue
+            if kind == "replaced":
+                removed_paths.append(file_path)
+            added_paths.append(file_path)
+        self.pending_events = {}
+
+        if not added_paths and not removed_paths and not moved_paths:
+            return
+
+        logger.info(f"Applying file events: {len(added_paths)} added, {len(removed_paths)} removed, {len(moved_paths)} moved,"
+                    f" {len(self.writing_files)} still being written")
+        # 変更の反映はこのワーカースレッドだけが行う（フィードの描画は FeedGenerator.render_scheduler のスレッドで行う）
+        FeedGenerator.apply_changes(added_paths=added_paths, removed_paths=removed_paths, moved_paths=moved_paths)
+
+FileState = Tuple[int, int, int]
+
+@dataclass
+class DirectoryState:
+    mtime_ns: int
+    # ディレクトリ直下の音楽ファイル（ファイル名 → (サイズ, 更新日時, inode)）
+    files: Dict[str, FileState] = field(default_factory=dict)
+    # ディレクトリ直下のサブディレクトリのパス
+    subdirectories: List[str] = field(default_factory=list)
+
+@dataclass
+class ScanResult:
+    created: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    # 移動されたファイル（移動元, 移動先）
+    moved: List[Tuple[str, str]] = field(default_factory=list)
+    # 中身を読み直したディレクトリの数
+    rescanned_directories: int = 0
+
+    def has_changes(self) -> bool:
+        return bool(self.created or self.modified or self.deleted or self.moved)
+
+class DirectoryScanner:
+    """os.scandir による差分スキャナー
+
+    ディレクトリごとに mtime と直下のエントリをキャッシュし、mtime が変わっていない
+    ディレクトリは中身を読み直さない（ディレクトリ1つにつき stat 1回で済む）。
+    ファイルの追加・削除に加えて、サイズや更新日時の変化も検出する。
+    ファイルの上書きではディレクトリの mtime が変わらないため、最近更新されたファイルは
+    ディレクトリに変化が無くても個別に stat して確認する。
+    それ以外のファイルの上書きは、定期的な全体スキャン（full=True）で検出する。
+    消えたファイルと (サイズ, 更新日時, inode) が一致する新しいファイルは、移動として検出する。
+    ディレクトリが読めなかった場合（NFS の ESTALE など一時的なエラー）は、配下の前回の状態を保ったまま
+    次回のスキャンで読み直し、配下のファイルを削除として扱わない。
+    """
+
+    def __init__(self, root_directory: str, extensions: List[str], recent_file_seconds: float = 300.0):
+        self.root_directory = os.path.normpath(root_directory)
+        self.extensions = tuple(extensions)
+        # 最終更新からこの秒数が経つまでは、個別に stat して書き込みを追跡する
+        self.recent_file_seconds = recent_file_seconds
+        self.directories: Dict[str, DirectoryState] = {}
+        # 最近更新されたファイル（パス → 所属ディレクトリ）
+        self.recent_files: Dict[str, str] = {}
+
+    def files(self) -> Dict[str, FileState]:
+        """前回のスキャン時点の音楽ファイルの一覧（パス → (サイズ, 更新日時, inode)）"""
+        return {
+            os.path.join(directory_path, filename): file_state
+            for directory_path, directory_state in self.directories.items()
+            for filename, file_state in directory_state.files.items()
+        }
+
+    def scan(self, full: bool = False) -> ScanResult:
+        """前回のスキャンからの変更を検出（full の場合は mtime に関わらず全ディレクトリを読み直す）"""
+        result = ScanResult()
+        # 消えたファイルの最後の状態（移動の検出に使う）
+        deleted_file_states: Dict[str, FileState] = {}
+        visited = set()
+        pending_directories = [self.root_directory]
+        while pending_directories:
+            directory_path = pending_directories.pop()
+            visited.add(directory_path)
+            try:
+                mtime_ns = os.stat(directory_path).st_mtime_ns
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            except OSError as e:
+                logger.warning(f"Failed to stat directory {directory_path}: {e}")
+                visited.update(self._cached_subtree(directory_path))
+                continue
+
+            directory_state = self.directories.get(directory_path)
+            if full or directory_state is None or directory_state.mtime_ns != mtime_ns:
+                directory_state = self._rescan_directory(directory_path, mtime_ns, result, deleted_file_states)
+                if directory_state is None:
+                    visited.update(self._cached_subtree(directory_path))
+                    continue
+            pending_directories.extend(directory_state.subdirectories)
+
+        # 消えたディレクトリ配下のファイルは削除として扱う
+        for directory_path in [path for path in self.directories if path not in visited]:
+            for filename, file_state in self.directories.pop(directory_path).files.items():
+                file_path = os.path.join(directory_path, filename)
+                result.deleted.append(file_path)
+                deleted_file_states[file_path] = file_state
+
+        self._detect_moves(result, deleted_file_states)
+        self._check_recent_files(result)
+        return result
+
+    def _cached_subtree(self, directory_path: str) -> List[str]:
+        """前回のスキャン時点で、ディレクトリとその配下にあったディレクトリの一覧"""
+        prefix = os.path.join(directory_path, "")
+        return [path for path in self.directories if path == directory_path or path.startswith(prefix)]
+
+    def _detect_moves(self, result: ScanResult, deleted_file_states: Dict[str, FileState]):
+        """状態が一致する削除と作成の組を、移動に置き換える"""
+        if not result.created or not deleted_file_states:
+            return
+        deleted_paths_by_state = {file_state: file_path for file_path, file_state in deleted_file_states.items()}
+        created = []
+        for file_path in result.created:
+            directory_path, filename = os.path.split(file_path)
+            src_path = deleted_paths_by_state.pop(self.directories[directory_path].files[filename], None)
+            if src_path is None:
+                created.append(file_path)
+            else:
+                result.moved.append((src_path, file_path))
+        moved_src_paths = {src_path for src_path, _ in result.moved}
+        result.created = created
+        result.deleted = [file_path for file_path in result.deleted if file_path not in moved_src_paths]
+
+    def _rescan_directory(self, directory_path: str, mtime_ns: int, result: ScanResult,
+                          deleted_file_states: Dict[str, FileState]) -> Optional[DirectoryState]:
+        """ディレクトリの中身を読み直し、前回との差分を result に追加する
+
+        一時的なエラーで読めなかった場合は、前回の状態を変えずに None を返す
+        （mtime を記録しないため、次回のスキャンで読み直される）
+        """
+        result.rescanned_directories += 1
+        previous_state = self.directories.get(directory_path)
+        previous_files = previous_state.files if previous_state is not None else {}
+        directory_state = DirectoryState(mtime_ns=mtime_ns)
+        try:
+            with os.scandir(directory_path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            directory_state.subdirectories.append(entry.path)
+                        elif entry.is_file() and entry.name.lower().endswith(self.extensions):
+                            st = entry.stat()
+                            directory_state.files[entry.name] = (st.st_size, st.st_mtime_ns, st.st_ino)
+                    except OSError:
+                        continue
+        except (FileNotFoundError, NotADirectoryError):
+            # スキャンの途中でディレクトリが削除された
+            directory_state = DirectoryState(mtime_ns=mtime_ns)
+        except OSError as e:
+            logger.warning(f"Failed to scan directory {directory_path}, will retry: {e}")
+            return None
+
+        now_ns = time.time_ns()
+        for filename, file_state in directory_state.files.items():
+            file_path = os.path.join(directory_path, filename)
+            previous_file_state = previous_files.get(filename)
+            if previous_file_state is None:
+                result.created.append(file_path)
+            elif previous_file_state != file_state:
+                result.modified.append(file_path)
+            if now_ns - file_state[1] < self.recent_file_seconds * 1e9:
+                self.recent_files[file_path] = directory_path
+        for filename, file_state in previous_files.items():
+            if filename not in directory_state.files:
+                file_path = os.path.join(directory_path, filename)
+                result.deleted.append(file_path)
+                deleted_file_states[file_path] = file_state
+
+        self.directories[directory_path] = directory_state
+        return directory_state
+
+    def _check_recent_files(self, result: ScanResult):
+        """最近更新されたファイルを個別に stat し、ディレクトリの mtime に表れない書き込みを検出する"""
+        now_ns = time.time_ns()
+        already_reported = set(result.created) | set(result.modified) | set(result.deleted) | {dest_path for _, dest_path in result.moved}
+        for file_path, directory_path in list(self.recent_files.items()):
+            directory_state = self.directories.get(directory_path)
+            filename = os.path.basename(file_path)
+            if directory_state is None or filename not in directory_state.files:
+                del self.recent_files[file_path]
+                continue
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                # 削除はディレクトリの mtime の変化で検出される
+                del self.recent_files[file_path]
+                continue
+            file_state = (st.st_size, st.st_mtime_ns, st.st_ino)
+            if file_state != directory_state.files[filename]:
+                directory_state.files[filename] = file_state
+                if file_path not in already_reported:
+                    result.modified.append(file_path)
+            if now_ns - st.st_mtime_ns >= self.recent_file_seconds * 1e9:
+                del self.recent_files[file_path]
 
 class FileWatcher:
-    """ファイル監視システム（イベントベース + ポーリング）"""
-    
-    def __init__(self, watch_directory: str, polling_interval: int = 30):
+    """ファイル監視システム（イベントベース + ポーリング）
+
+    ポーリング間隔は変更を検出すると min_polling_interval まで短くなり、
+    変更が無ければ polling_interval まで倍々に延びる。
+    ディレクトリの mtime に表れないファイルの上書きを拾うため、full_scan_interval ごとに全体をスキャンする。
+    """
+
+    def __init__(self, watch_directory: str, polling_interval: int = 30, debounce_seconds: float = 2.0, queue_size: int = 10000,
+                 settle_seconds: float = 60.0, min_polling_interval: int = 5, full_scan_interval: int = 3600):
         self.watch_directory = watch_directory
         self.observer = Observer()
-        self.handler = MusicFileHandler()
+        self.handler = MusicFileHandler(debounce_seconds=debounce_seconds, queue_size=queue_size, settle_seconds=settle_seconds,
+                                        close_events_supported=InotifyObserver is not None and isinstance(self.observer, InotifyObserver))
         self.polling_interval = polling_interval
-        self.known_files = set()
-        
+        self.min_polling_interval = min(min_polling_interval, polling_interval)
+        self.current_polling_interval = polling_interval
+        self.full_scan_interval = full_scan_interval
+        self.last_full_scan_at = time.monotonic()
+        self.scanner = DirectoryScanner(watch_directory, self.handler.music_extensions)
+
+    @metrics.timed("startup_reconcile")
+    def reconcile_with_index(self):
+        """起動時に、ディレクトリ内のファイルとインデックスの差分だけを処理対象にする
+
+        既存ファイルは FeedGenerator.generate() でインデックス済みのため、
+        1回のディレクトリ走査でスキャナーのキャッシュを初期化し、インデックスとの差分だけをキューに積む
+        """
+        self.scanner.scan()
+        current_files = self.scanner.files()
+        indexed_stat_keys = FileIO.get_music_index().get_stat_keys()
+
+        new_files = [path for path in current_files if path not in indexed_stat_keys]
+        for new_file in new_files:
+            logger.info(f"Startup scan detected new file: {new_file}")
+            self.handler.enqueue("created", new_file)
+
+        deleted_files = [path for path in indexed_stat_keys if path not in current_files]
+        for deleted_file in deleted_files:
+            logger.info(f"Startup scan detected deleted file: {deleted_file}")
+            self.handler.enqueue("deleted", deleted_file)
+
+        logger.info(f"Startup scan finished: {len(current_files)} files, {len(new_files)} new, {len(deleted_files)} deleted")
+
+    @metrics.timed("poll_scan")
     def scan_for_new_files(self):
-        """ポーリングによる新しいファイルの検索"""
+        """ポーリングによる新しいファイル・変更されたファイル・削除されたファイルの検索"""
         try:
-            current_files = set()
-            for extension in ['.mp3', '.m4a']:
-                import glob
-                files = glob.glob(os.path.join(self.watch_directory, f"**/*{extension}"), recursive=True)
-                current_files.update(files)
-            
-            # 新しいファイルをチェック
-            new_files = current_files - self.known_files
-            for new_file in new_files:
+            full = time.monotonic() - self.last_full_scan_at >= self.full_scan_interval
+            if full:
+                self.last_full_scan_at = time.monotonic()
+            result = self.scanner.scan(full=full)
+
+            for new_file in result.created:
                 logger.info(f"Polling detected new file: {new_file}")
-                self.handler._handle_file_created(new_file)
-            
-            # 削除されたファイルをチェック
-            deleted_files = self.known_files - current_files
-            for deleted_file in deleted_files:
+                self.handler.enqueue("created", new_file)
+
+            # 変更されたファイルは、インデックスの stat キーと比較して読み込み直される
+            for modified_file in result.modified:
+                logger.info(f"Polling detected modified file: {modified_file}")
+                self.handler.enqueue("created", modified_file)
+
+            for deleted_file in result.deleted:
                 logger.info(f"Polling detected deleted file: {deleted_file}")
-                with self.handler.lock:
-                    FeedGenerator.remove_music_file(deleted_file)
-                    self.handler.cleanup_file_tracking(deleted_file)
-                    self.handler.processed_files.discard(deleted_file)
-            
-            self.known_files = current_files
-            
+                self.handler.enqueue("deleted", deleted_file)
+
+            for src_file, dest_file in result.moved:
+                logger.info(f"Polling detected moved file: {src_file} -> {dest_file}")
+                self.handler.enqueue("moved", dest_file, src_file)
+
+            # 変更があった直後は短い間隔で、落ち着いたら徐々に間隔を延ばしてポーリングする
+            if result.has_changes():
+                self.current_polling_interval = self.min_polling_interval
+            else:
+                self.current_polling_interval = min(self.current_polling_interval * 2, self.polling_interval)
+            logger.debug(f"Polling rescanned {result.rescanned_directories} directories, next scan in {self.current_polling_interval} seconds")
+
         except Exception as e:
             logger.error(f"Error in polling: {e}")
-    
+
     def start(self):
         """監視を開始（イベントベース + ポーリング）"""
         logger.info(f"Starting file watcher for directory: {self.watch_directory}")
-        logger.info(f"Polling interval: {self.polling_interval} seconds")
-        
-        # 初回スキャンで既存ファイルを記録
-        self.scan_for_new_files()
-        
+        logger.info(f"Polling interval: {self.min_polling_interval}-{self.polling_interval} seconds")
+
         # イベントベース監視を開始
         self.observer.schedule(self.handler, self.watch_directory, recursive=True)
         self.observer.start()
+
+        # 初回スキャンで既存ファイルを記録（監視開始後に行い、その間の変更を取りこぼさないようにする）
+        self.reconcile_with_index()
         logger.info("File watcher started")
-        
+
         try:
             while True:
-                time.sleep(self.polling_interval)
+                time.sleep(self.current_polling_interval)
                 logger.debug("Running periodic scan...")
                 self.scan_for_new_files()
         except KeyboardInterrupt:
             self.stop()
-    
+
     def stop(self):
         """監視を停止"""
         logger.info("Stopping file watcher")
         self.observer.stop()
         self.observer.join()
+        # 要求済みのフィードの描画を書き終えてから終了する
+        FeedGenerator.render_scheduler.wait()
         logger.info("File watcher stopped")
 
 if __name__ == "__main__":
     # 監視対象ディレクトリ
     watch_dir = FileIO.music_files_dir_path
+
+    # 計測値を定期的に htdocs へ書き出す（0の場合は出力しない）
+    metrics_interval = float(os.environ.get("METRICS_INTERVAL", 15))
+    if metrics_interval > 0:
+        metrics.MetricsExporter(FileIO.output_metrics, interval_seconds=metrics_interval).start()
     
     # 初回起動時にフィード全体を生成
     logger.info("Generating initial feeds...")
     FeedGenerator.generate()
     logger.info("Initial feeds generated")
+
+    # フィードをリクエストに応じて描画する場合は、httpd からプロキシされる配信サーバーを起動
+    if FeedGenerator.on_demand_feeds:
+        start_feed_server(port=int(os.environ.get("FEED_SERVER_PORT", 8081)),
+                          cache_size=int(os.environ.get("FEED_CACHE_SIZE", 256)))
     
-    # ファイル監視を開始（本番用ポーリング間隔: 30秒）
-    watcher = FileWatcher(watch_dir, polling_interval=30)
+    # ファイル監視を開始（本番用ポーリング間隔: 変更直後は5秒、落ち着いたら最大30秒）
+    watcher = FileWatcher(
+        watch_dir,
+        polling_interval=int(os.environ.get("WATCH_POLLING_INTERVAL", 30)),
+        min_polling_interval=int(os.environ.get("WATCH_MIN_POLLING_INTERVAL", 5)),
+        full_scan_interval=int(os.environ.get("WATCH_FULL_SCAN_INTERVAL", 3600)),
+        debounce_seconds=float(os.environ.get("WATCH_DEBOUNCE_SECONDS", 2.0)),
+        queue_size=int(os.environ.get("WATCH_QUEUE_SIZE", 10000)),
+        settle_seconds=float(os.environ.get("WATCH_SETTLE_SECONDS", 60.0)),
+    )
     watcher.start() 
\ No newline at end of file
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""処理段階ごとの計測値（カウンター・ヒストグラム・ゲージ）と、Prometheus のテキスト形式での出力"""
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[Tuple[str, str], ...]
+
+def _label_values(labels: Dict[str, str]) -> LabelValues:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _format_labels(label_values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(label_values) + ([extra] if extra is not None else [])
+    if not pairs:
+        return ""
+    escaped = [(name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for name, value in pairs]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Counter:
+    """増えるだけの値（ラベルの組み合わせごと）"""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.lock = threading.Lock()
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = _label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in sorted(self.values.items())]
+
+class Gauge:
+    """増減する値（処理中の件数やキューの長さなど）
+
+    関数を登録したラベルは、出力のたびに関数を呼んで値を取得する
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.lock = threading.Lock()
+        self.values: Dict[LabelValues, float] = {}
+        self.functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: str):
+        with self.lock:
+            self.values[_label_values(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = _label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float], **labels: str):
+        with self.lock:
+            self.functions[_label_values(labels)] = function
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            values = dict(self.values)
+            functions = dict(self.functions)
+        for key, function in functions.items():
+            try:
+                values[key] = function()
+            except Exception as e:
+                logger.debug(f"Failed to read gauge {self.name}: {e}")
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in sorted(values.items())]
+
+class Histogram:
+    """値の分布（所要時間など）をバケットごとの累積件数と合計で記録する"""
+    kind = "histogram"
+    default_buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = default_buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        # ラベルの組み合わせ → (バケットごとの件数, 合計, 件数)
+        self.values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = _label_values(labels)
+        with self.lock:
+            bucket_counts, total, count = self.values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                bucket_counts[index] += 1
+            self.values[key] = (bucket_counts, total + value, count + 1)
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self.lock:
+            values = {key: (list(bucket_counts), total, count) for key, (bucket_counts, total, count) in self.values.items()}
+        for key, (bucket_counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _format_value(upper_bound)))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """プロセス内の計測値をまとめ、Prometheus のテキスト形式で出力する"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter(name, help_text))
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self._register(Gauge(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = Histogram.default_buckets) -> Histogram:
+        return self._register(Histogram(name, help_text, buckets))
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+stage_duration_seconds = registry.histogram("podcast_stage_duration_seconds", "Time spent in each processing stage.")
+stage_in_flight = registry.gauge("podcast_stage_in_flight", "Number of stage executions currently running.")
+stage_failures_total = registry.counter("podcast_stage_failures_total", "Number of stage executions that raised an exception.")
+files_total = registry.counter("podcast_files_total", "Number of music files processed, by operation.")
+watcher_events_total = registry.counter("podcast_watcher_events_total", "Number of file events received by the watcher, by kind.")
+
+@contextmanager
+def timed(stage: str):
+    """処理段階の所要時間・実行中の数・失敗数を記録する"""
+    stage_in_flight.inc(stage=stage)
+    started_at = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        stage_failures_total.inc(stage=stage)
+        raise
+    finally:
+        stage_duration_seconds.observe(time.perf_counter() - started_at, stage=stage)
+        stage_in_flight.dec(stage=stage)
+
+class MetricsExporter:
+    """計測値を一定間隔でファイルへ書き出すスレッド"""
+
+    def __init__(self, write: Callable[[str], None], interval_seconds: float = 15.0):
+        self.write = write
+        self.interval_seconds = interval_seconds
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="metrics-exporter")
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.export()
+
+    def export(self):
+        try:
+            self.write(registry.render())
+        except Exception as e:
+            logger.warning(f"Failed to export metrics: {e}")
+
+    def _run(self):
+        self.export()
+        while not self.stopped.wait(self.interval_seconds):
+            self.export()
@@ -7,6 +7,15 @@ if [ ! -e "music_files" ]; then
     ln -s /volumes/music_files music_files
 fi
 
+# リクエストに応じてフィードを描画する場合の、アプリの待ち受けポート（httpd のプロキシ設定でも使う）
+export FEED_SERVER_PORT="${FEED_SERVER_PORT:-8081}"
+
 # ファイル監視システムをバックグラウンドで起動（ログを標準出力にリダイレクト）
 python3 -B /usr/src/app/file_watcher.py 2>&1 &
-httpd -D FOREGROUND
+
+# フィードをリクエストに応じて描画する場合は、/feeds/ をアプリへプロキシする
+if [ "${FEED_SERVING_MODE:-static}" = "ondemand" ]; then
+    httpd -D FOREGROUND -D ONDEMAND_FEEDS
+else
+    httpd -D FOREGROUND
+fi
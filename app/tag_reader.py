@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""音楽ファイルのタグと再生時間をヘッダー部分だけ読んで取得する軽量なリーダー
+
+MP3 は ID3v2 タグ（無ければ末尾の ID3v1 タグ）と、先頭フレームの Xing/Info/VBRI ヘッダーから再生時間を求める。
+M4A は moov/mvhd から再生時間を、moov/udta/meta/ilst からタグを読む。
+どちらも音声データやカバー画像の本体は読まず、カバー画像は位置だけを記録して必要になった時に読み込む。
+"""
+import hashlib
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+# 読み込み処理の互換性が変わったら上げる（無効として記録済みのファイルを再解析させるため）
+READER_VERSION = 1
+
+# 先頭の MPEG フレームを探す範囲（ID3v2 タグの直後から）
+mpeg_frame_search_bytes = 64 * 1024
+
+# カバー画像を識別するために読む、画像の先頭と末尾それぞれのバイト数
+cover_fingerprint_sample_bytes = 16 * 1024
+
+@dataclass
+class CoverArt:
+    """カバー画像の種類と、ファイル内での位置"""
+    mime_type: str
+    offset: int = 0
+    size: int = 0
+    # 非同期化（unsynchronisation）されたタグなど、位置から直接読めない場合は解析時にデータを保持する
+    data: Optional[bytes] = None
+
+    def read(self, fullpath: str) -> bytes:
+        """画像データを読み込む"""
+        if self.data is not None:
+            return self.data
+        with open(fullpath, "rb") as f:
+            f.seek(self.offset)
+            return f.read(self.size)
+
+    def fingerprint(self, fullpath: str) -> str:
+        """画像全体を読まずに画像を識別するハッシュ（種類・サイズと、先頭と末尾の一部から求める）
+
+        画像が cover_fingerprint_sample_bytes の2倍以下であれば全体から求める
+        """
+        data = self.data
+        if data is None:
+            with open(fullpath, "rb") as f:
+                f.seek(self.offset)
+                if self.size <= cover_fingerprint_sample_bytes * 2:
+                    data = f.read(self.size)
+                else:
+                    data = f.read(cover_fingerprint_sample_bytes)
+                    f.seek(self.offset + self.size - cover_fingerprint_sample_bytes)
+                    data += f.read(cover_fingerprint_sample_bytes)
+        elif len(data) > cover_fingerprint_sample_bytes * 2:
+            data = data[:cover_fingerprint_sample_bytes] + data[-cover_fingerprint_sample_bytes:]
+        size = self.size if self.data is None else len(self.data)
+        digest = hashlib.sha256(f"{self.mime_type}\0{size}\0".encode())
+        digest.update(data)
+        return digest.hexdigest()
+
+@dataclass
+class TagInfo:
+    album: Optional[str] = None
+    title: Optional[str] = None
+    duration_seconds: float = 0
+    cover: Optional[CoverArt] = None
+
+def read_tags(fullpath: str) -> Optional[TagInfo]:
+    """ファイルの種類を判別してタグを読む（対応していない形式の場合は None）"""
+    with open(fullpath, "rb") as f:
+        head = f.read(12)
+        if head[4:8] == b"ftyp":
+            return read_mp4_tags(f)
+        if head[:3] == b"ID3" or os.path.splitext(fullpath)[1].lower() == ".mp3":
+            return read_mp3_tags(f)
+    return None
+
+# ---------------------------------------------------------------------------
+# MP3
+# ---------------------------------------------------------------------------
+
+# ID3v2.2 の3文字のフレームIDを、v2.3 以降の4文字のIDに対応付ける
+id3v22_frame_ids = {b"TAL": b"TALB", b"TT2": b"TIT2", b"PIC": b"APIC"}
+id3v22_image_formats = {b"JPG": "image/jpeg", b"PNG": "image/png"}
+text_encodings = {0: "latin-1", 1: "utf-16", 2: "utf-16-be", 3: "utf-8"}
+
+def read_mp3_tags(f: BinaryIO) -> TagInfo:
+    tag_info = TagInfo()
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    f.seek(0)
+    header = f.read(10)
+    audio_start = 0
+    if len(header) == 10 and header[:3] == b"ID3":
+        tag_size = _syncsafe_int(header[6:10])
+        audio_start = 10 + tag_size + (10 if header[5] & 0x10 else 0)
+        _read_id3v2_frames(f, header, tag_size, tag_info)
+    if tag_info.album is None:
+        _read_id3v1(f, file_size, tag_info)
+    tag_info.duration_seconds = _read_mpeg_duration(f, audio_start, file_size)
+    return tag_info
+
+def _syncsafe_int(data: bytes) -> int:
+    return (data[0] & 0x7f) << 21 | (data[1] & 0x7f) << 14 | (data[2] & 0x7f) << 7 | (data[3] & 0x7f)
+
+def _read_id3v2_frames(f: BinaryIO, header: bytes, tag_size: int, tag_info: TagInfo):
+    """ID3v2 のフレームを順に読む（カバー画像のフレームは本体を読まずに位置だけ記録する）"""
+    major_version, flags = header[3], header[5]
+    if major_version not in (2, 3, 4):
+        return
+
+    if flags & 0x80 and major_version < 4:
+        # タグ全体が非同期化されている場合は、元に戻すためにタグ全体をメモリ上で扱う
+        body = f.read(tag_size).replace(b"\xff\x00", b"\xff")
+        _read_id3v2_frames_from_bytes(body, major_version, flags, tag_info)
+        return
+
+    position = 10
+    end = 10 + tag_size
+    if flags & 0x40 and major_version >= 3:
+        # 拡張ヘッダーを読み飛ばす（v2.3 はサイズ自身を含まず、v2.4 は含む）
+        size_bytes = f.read(4)
+        extended_header_size = struct.unpack(">I", size_bytes)[0] + 4 if major_version == 3 else _syncsafe_int(size_bytes)
+        position += extended_header_size
+
+    frame_header_size = 6 if major_version == 2 else 10
+    while position + frame_header_size <= end:
+        f.seek(position)
+        frame_header = f.read(frame_header_size)
+        frame_id, frame_size, frame_flags = _parse_id3v2_frame_header(frame_header, major_version)
+        if frame_id is None or frame_size <= 0 or position + frame_header_size + frame_size > end:
+            break
+        data_offset = position + frame_header_size
+        position = data_offset + frame_size
+
+        if frame_id in (b"TALB", b"TIT2"):
+            text = _decode_id3v2_text_frame(_read_id3v2_frame_data(f.read(frame_size), frame_flags, major_version))
+            _set_id3v2_text(tag_info, frame_id, text)
+        elif frame_id == b"APIC" and tag_info.cover is None:
+            # 画像本体より前のフィールドは短いため、先頭部分だけ読んで画像データの開始位置を求める
+            if frame_flags:
+                # 圧縮や非同期化されたフレームは位置から直接読めないため、ここでデータを取り出す
+                data = _read_id3v2_frame_data(f.read(frame_size), frame_flags, major_version)
+                tag_info.cover = _parse_apic(data, major_version, 0, len(data), data)
+                continue
+            head = f.read(min(frame_size, 1024))
+            cover = _parse_apic(head, major_version, data_offset, frame_size)
+            if cover is None and len(head) < frame_size:
+                f.seek(data_offset)
+                cover = _parse_apic(f.read(frame_size), major_version, data_offset, frame_size)
+            tag_info.cover = cover
+
+        if tag_info.album is not None and tag_info.title is not None and tag_info.cover is not None:
+            break
+
+def _read_id3v2_frames_from_bytes(body: bytes, major_version: int, flags: int, tag_info: TagInfo):
+    """非同期化されたタグのフレームをメモリ上で読む"""
+    position = 0
+    if flags & 0x40 and major_version == 3:
+        position = struct.unpack(">I", body[:4])[0] + 4
+    frame_header_size = 6 if major_version == 2 else 10
+    while position + frame_header_size <= len(body):
+        frame_id, frame_size, frame_flags = _parse_id3v2_frame_header(body[position:position + frame_header_size], major_version)
+        if frame_id is None or frame_size <= 0:
+            break
+        data = _read_id3v2_frame_data(body[position + frame_header_size:position + frame_header_size + frame_size], frame_flags, major_version)
+        position += frame_header_size + frame_size
+        if frame_id in (b"TALB", b"TIT2"):
+            _set_id3v2_text(tag_info, frame_id, _decode_id3v2_text_frame(data))
+        elif frame_id == b"APIC" and tag_info.cover is None:
+            tag_info.cover = _parse_apic(data, major_version, 0, len(data), data)
+
+def _parse_id3v2_frame_header(frame_header: bytes, major_version: int) -> Tuple[Optional[bytes], int, int]:
+    """フレームヘッダーから (フレームID, サイズ, フラグ) を取り出す（パディングに達した場合、フレームIDは None）"""
+    if major_version == 2:
+        frame_id = frame_header[:3]
+        if frame_id[:1] == b"\x00":
+            return None, 0, 0
+        return id3v22_frame_ids.get(frame_id, frame_id), int.from_bytes(frame_header[3:6], "big"), 0
+    frame_id = frame_header[:4]
+    if frame_id[:1] == b"\x00":
+        return None, 0, 0
+    size_bytes = frame_header[4:8]
+    frame_size = _syncsafe_int(size_bytes) if major_version == 4 else struct.unpack(">I", size_bytes)[0]
+    # v2.3 と v2.4 でフラグのビット位置が違うため、(圧縮, 暗号化, グループ, 非同期化, データ長) の形にそろえる
+    format_flags = frame_header[9]
+    return frame_id, frame_size, format_flags if major_version == 4 else _id3v23_format_flags_as_v24(format_flags)
+
+def _id3v23_format_flags_as_v24(format_flags: int) -> int:
+    converted = 0
+    if format_flags & 0x80:
+        # v2.3 の圧縮フレームは、展開後のサイズ（v2.4 のデータ長に相当）を先頭に持つ
+        converted |= 0x08 | 0x01
+    if format_flags & 0x40:
+        converted |= 0x04
+    if format_flags & 0x20:
+        converted |= 0x40
+    return converted
+
+def _read_id3v2_frame_data(data: bytes, frame_flags: int, major_version: int) -> bytes:
+    """フレームのフラグに応じて、グループID・データ長を読み飛ばし、非同期化と圧縮を元に戻す"""
+    if frame_flags & 0x04:
+        # 暗号化されたフレームは読めない
+        return b""
+    if frame_flags & 0x40:
+        data = data[1:]
+    if frame_flags & 0x01:
+        data = data[4:]
+    if frame_flags & 0x02:
+        data = data.replace(b"\xff\x00", b"\xff")
+    if frame_flags & 0x08:
+        data = zlib.decompress(data)
+    return data
+
+def _decode_id3v2_text_frame(data: bytes) -> Optional[str]:
+    if not data:
+        return None
+    encoding = text_encodings.get(data[0], "latin-1")
+    text = data[1:].decode(encoding, errors="replace")
+    # v2.4 は複数の値を NUL 区切りで持てるため、最初の値を使う
+    text = text.split("\x00")[0].strip()
+    return text or None
+
+def _set_id3v2_text(tag_info: TagInfo, frame_id: bytes, text: Optional[str]):
+    if frame_id == b"TALB" and tag_info.album is None:
+        tag_info.album = text
+    elif frame_id == b"TIT2" and tag_info.title is None:
+        tag_info.title = text
+
+def _parse_apic(data: bytes, major_version: int, data_offset: int, frame_size: int,
+                frame_data: Optional[bytes] = None) -> Optional[CoverArt]:
+    """APIC（v2.2 は PIC）フレームの先頭から画像の種類と画像データの位置を求める
+
+    data はフレームの先頭部分で、説明文の終端が見つからない場合は None を返す
+    """
+    if len(data) < 2:
+        return None
+    encoding = data[0]
+    if major_version == 2:
+        mime_type = id3v22_image_formats.get(data[1:4].upper(), "")
+        position = 4
+    else:
+        mime_end = data.find(b"\x00", 1)
+        if mime_end < 0:
+            return None
+        mime_type = data[1:mime_end].decode("latin-1").lower()
+        if mime_type and "/" not in mime_type:
+            mime_type = f"image/{mime_type}"
+        position = mime_end + 1
+    # 画像の種別（1バイト）の後ろに、文字コードに応じた NUL で終わる説明文が続く
+    position += 1
+    terminator = b"\x00\x00" if encoding in (1, 2) else b"\x00"
+    while True:
+        description_end = data.find(terminator, position)
+        if description_end < 0:
+            return None
+        if len(terminator) == 1 or (description_end - position) % 2 == 0:
+            break
+        position = description_end + 1
+    image_start = description_end + len(terminator)
+    if frame_data is not None:
+        return CoverArt(mime_type=mime_type, data=frame_data[image_start:])
+    return CoverArt(mime_type=mime_type, offset=data_offset + image_start, size=frame_size - image_start)
+
+def _read_id3v1(f: BinaryIO, file_size: int, tag_info: TagInfo):
+    """末尾128バイトの ID3v1 タグからアルバム名とタイトルを読む"""
+    if file_size < 128:
+        return
+    f.seek(file_size - 128)
+    data = f.read(128)
+    if data[:3] != b"TAG":
+        return
+
+    def decode(field: bytes) -> Optional[str]:
+        return field.split(b"\x00")[0].decode("latin-1").strip() or None
+
+    if tag_info.title is None:
+        tag_info.title = decode(data[3:33])
+    tag_info.album = decode(data[63:93])
+
+# MPEG フレームヘッダーの値の表（バージョン: 1 = MPEG1, 2 = MPEG2, 2.5 = MPEG2.5）
+mpeg_versions = {0: 2.5, 2: 2, 3: 1}
+mpeg_sample_rates = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 2.5: (11025, 12000, 8000)}
+mpeg_bitrates_kbps: Dict[Tuple[int, int], Tuple[int, ...]] = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+def _read_mpeg_duration(f: BinaryIO, audio_start: int, file_size: int) -> float:
+    """先頭の MPEG フレームから再生時間（秒）を求める
+
+    Xing/Info または VBRI ヘッダーがあればフレーム数から、無ければ固定ビットレートとみなしてファイルサイズから計算する
+    """
+    f.seek(audio_start)
+    data = f.read(mpeg_frame_search_bytes)
+    position = 0
+    while True:
+        position = data.find(b"\xff", position)
+        if position < 0 or position + 4 > len(data):
+            return 0
+        frame = _parse_mpeg_frame_header(data[position:position + 4])
+        if frame is not None:
+            break
+        position += 1
+
+    version, layer, bitrate_kbps, sample_rate, mono = frame
+    samples_per_frame = 384 if layer == 1 else (1152 if layer == 2 or version == 1 else 576)
+    if len(data) < position + 4 + 32 + 16:
+        data += f.read(position + 4 + 32 + 16 - len(data))
+
+    # Xing/Info ヘッダーはサイド情報の直後にある
+    side_info_size = (17 if mono else 32) if version == 1 else (9 if mono else 17)
+    xing_position = position + 4 + side_info_size
+    if data[xing_position:xing_position + 4] in (b"Xing", b"Info"):
+        xing_flags = struct.unpack(">I", data[xing_position + 4:xing_position + 8])[0]
+        if xing_flags & 0x01:
+            frame_count = struct.unpack(">I", data[xing_position + 8:xing_position + 12])[0]
+            return frame_count * samples_per_frame / sample_rate
+
+    # VBRI ヘッダーはフレームヘッダーから32バイト後ろにある
+    vbri_position = position + 4 + 32
+    if data[vbri_position:vbri_position + 4] == b"VBRI":
+        frame_count = struct.unpack(">I", data[vbri_position + 14:vbri_position + 18])[0]
+        return frame_count * samples_per_frame / sample_rate
+
+    if bitrate_kbps == 0:
+        return 0
+    audio_size = file_size - (audio_start + position)
+    # 末尾の ID3v1 タグは音声データに含めない
+    if file_size >= 128:
+        f.seek(file_size - 128)
+        if f.read(3) == b"TAG":
+            audio_size -= 128
+    return audio_size * 8 / (bitrate_kbps * 1000)
+
+def _parse_mpeg_frame_header(header: bytes) -> Optional[Tuple[float, int, int, int, bool]]:
+    """MPEG フレームヘッダーから (バージョン, レイヤー, ビットレート(kbps), サンプリング周波数, モノラルか) を取り出す"""
+    if header[0] != 0xff or header[1] & 0xe0 != 0xe0:
+        return None
+    version = mpeg_versions.get((header[1] >> 3) & 0x03)
+    layer = 4 - ((header[1] >> 1) & 0x03)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version is None or layer == 4 or bitrate_index == 0x0f or sample_rate_index == 0x03:
+        return None
+    bitrates = mpeg_bitrates_kbps[(1, layer) if version == 1 else (2, 1 if layer == 1 else 2)]
+    mono = (header[3] >> 6) == 0x03
+    return version, layer, bitrates[bitrate_index], mpeg_sample_rates[version][sample_rate_index], mono
+
+# ---------------------------------------------------------------------------
+# M4A (MP4)
+# ---------------------------------------------------------------------------
+
+# ilst の中でデータを持つアトム（© は 0xA9）
+mp4_album_atom = b"\xa9alb"
+mp4_title_atom = b"\xa9nam"
+mp4_cover_atom = b"covr"
+# data アトムの型（well-known type）
+mp4_data_type_mime_types = {13: "image/jpeg", 14: "image/png"}
+
+def read_mp4_tags(f: BinaryIO) -> TagInfo:
+    tag_info = TagInfo()
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    for atom_type, start, end in _iter_mp4_atoms(f, 0, file_size):
+        if atom_type == b"moov":
+            _read_mp4_moov(f, start, end, tag_info)
+            break
+    return tag_info
+
+def _iter_mp4_atoms(f: BinaryIO, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """start から end までのアトムを (種類, 中身の開始位置, 終了位置) で列挙する（中身は読まない）"""
+    position = start
+    while position + 8 <= end:
+        f.seek(position)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        atom_size, atom_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if atom_size == 1:
+            atom_size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif atom_size == 0:
+            atom_size = end - position
+        if atom_size < header_size or position + atom_size > end:
+            return
+        yield atom_type, position + header_size, position + atom_size
+        position += atom_size
+
+def _read_mp4_moov(f: BinaryIO, start: int, end: int, tag_info: TagInfo):
+    for atom_type, child_start, child_end in _iter_mp4_atoms(f, start, end):
+        if atom_type == b"mvhd":
+            f.seek(child_start)
+            data = f.read(32)
+            if data[:1] == b"\x01":
+                timescale, duration = struct.unpack(">IQ", data[20:32])
+            else:
+                timescale, duration = struct.unpack(">II", data[12:20])
+            if timescale:
+                tag_info.duration_seconds = duration / timescale
+        elif atom_type == b"udta":
+            for meta_type, meta_start, meta_end in _iter_mp4_atoms(f, child_start, child_end):
+                if meta_type == b"meta":
+                    # meta はバージョンとフラグ（4バイト）の後ろに子アトムが続く
+                    for ilst_type, ilst_start, ilst_end in _iter_mp4_atoms(f, meta_start + 4, meta_end):
+                        if ilst_type == b"ilst":
+                            _read_mp4_ilst(f, ilst_start, ilst_end, tag_info)
+
+def _read_mp4_ilst(f: BinaryIO, start: int, end: int, tag_info: TagInfo):
+    for item_type, item_start, item_end in _iter_mp4_atoms(f, start, end):
+        if item_type not in (mp4_album_atom, mp4_title_atom, mp4_cover_atom):
+            continue
+        for data_type, data_start, data_end in _iter_mp4_atoms(f, item_start, item_end):
+            if data_type != b"data":
+                continue
+            # data アトムは型（4バイト）とロケール（4バイト）の後ろに値が続く
+            f.seek(data_start)
+            well_known_type = struct.unpack(">I", f.read(8)[:4])[0] & 0x00ffffff
+            value_start = data_start + 8
+            if item_type == mp4_cover_atom:
+                if tag_info.cover is None:
+                    mime_type = mp4_data_type_mime_types.get(well_known_type) or _sniff_image_mime_type(f.read(8))
+                    tag_info.cover = CoverArt(mime_type=mime_type, offset=value_start, size=data_end - value_start)
+            else:
+                text = f.read(data_end - value_start).decode("utf-8", errors="replace").strip() or None
+                if item_type == mp4_album_atom:
+                    tag_info.album = text
+                else:
+                    tag_info.title = text
+            break
+
+def _sniff_image_mime_type(head: bytes) -> str:
+    if head.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG"):
+        return "image/png"
+    return ""
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""合成したライブラリでフィード生成パイプライン全体を計測するベンチマーク
+
+一時ディレクトリに htdocs を作り、タグ（と任意でカバー画像）付きの小さな MP3 / M4A ファイルを
+アルバム数 × トラック数だけ生成してから、以下の処理の所要時間を計測する。
+
+- FeedGenerator.generate()（初回 / インデックス済みの再起動）
+- add_music_file / remove_music_file（1ファイル）
+- 複数ファイルの一括追加（apply_changes）
+- FileWatcher.scan_for_new_files（変更なし / 全体スキャン）
+- フィードとインデックスページの描画
+
+結果はピークRSSとあわせて JSON で出力し、実行ごとに比較できるようにする。
+
+使い方:
+    python benchmarks/bench_pipeline.py --albums 50 --tracks 20 --output results.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict
+
+os.environ.setdefault("APP_ROOT_URL", "http://localhost:8080/")
+app_dir_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+sys.path.insert(0, app_dir_path)
+# 合成した音楽ファイルはテストと同じものを使う
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests"))
+
+from audio_fixtures import cover_image_data, make_m4a, make_mp3  # noqa: E402
+from feed_generator import FeedGenerator, FeedInfo, FileIO, MusicCatalog, TemplateRenderer  # noqa: E402
+from file_watcher import FileWatcher  # noqa: E402
+
+
+def write_track(directory_path: str, album_name: str, track_number: int, use_m4a: bool, with_cover: bool) -> str:
+    title = f"{album_name} - Track {track_number:04d}"
+    cover = cover_image_data if with_cover else None
+    if use_m4a:
+        file_path = os.path.join(directory_path, f"{track_number:04d}.m4a")
+        data = make_m4a(album_name, title, cover=cover)
+    else:
+        file_path = os.path.join(directory_path, f"{track_number:04d}.mp3")
+        data = make_mp3(album_name, title, cover=cover)
+    with open(file_path, "wb") as f:
+        f.write(data)
+    return file_path
+
+
+def generate_library(music_files_dir_path: str, albums: int, tracks: int, m4a_ratio: float, with_cover: bool) -> int:
+    """アルバムごとのディレクトリに合成したトラックを書き出し、ファイル数を返す"""
+    m4a_every = round(1 / m4a_ratio) if m4a_ratio > 0 else 0
+    for album_number in range(albums):
+        album_name = f"Album {album_number:04d}"
+        directory_path = os.path.join(music_files_dir_path, album_name)
+        os.makedirs(directory_path, exist_ok=True)
+        for track_number in range(tracks):
+            use_m4a = m4a_every > 0 and track_number % m4a_every == 0
+            write_track(directory_path, album_name, track_number, use_m4a, with_cover)
+    return albums * tracks
+
+
+def configure_htdocs(root_dir_path: str):
+    """FileIO の入出力先を一時ディレクトリの htdocs に向ける"""
+    htdocs_dir_path = os.path.join(root_dir_path, "htdocs", "")
+    FileIO.htdocs_dir_path = htdocs_dir_path
+    FileIO.music_files_dir_path = f"{htdocs_dir_path}music_files/"
+    FileIO.index_html_file_path = f"{htdocs_dir_path}index.html"
+    FileIO.opml_file_path = f"{htdocs_dir_path}feeds.opml"
+    FileIO.catalog_json_file_path = f"{htdocs_dir_path}catalog.json"
+    FileIO.output_xml_dir_path = f"{htdocs_dir_path}{FileIO.feeds_dir_name}/"
+    FileIO.thumbnail_dir_path = f"{htdocs_dir_path}{FileIO.thumbnail_dir_name}/"
+    FileIO.index_db_file_path = f"{htdocs_dir_path}music_index.sqlite3"
+    FileIO.legacy_index_file_path = f"{htdocs_dir_path}music_index.pkl"
+    FileIO.legacy_tag_cache_file_path = f"{htdocs_dir_path}music_tag_cache.pkl"
+    FileIO.templates_dir_path = os.path.join(app_dir_path, "templates", "")
+    for dir_path in [FileIO.music_files_dir_path, FileIO.output_xml_dir_path, FileIO.thumbnail_dir_path]:
+        os.makedirs(dir_path, exist_ok=True)
+
+
+def reset_process_state():
+    """再起動を模擬するため、プロセス内に保持しているインデックスやキャッシュを捨てる"""
+    if FileIO.music_index is not None:
+        FileIO.music_index.connection.close()
+    FileIO.music_index = None
+    FileIO.written_file_hashes = {}
+    FeedGenerator.catalog = None
+    TemplateRenderer.feed_page_signatures = {}
+    TemplateRenderer.index_page_signatures = {}
+    TemplateRenderer.clear_item_xml_cache()
+    TemplateRenderer.item_xml_cache_template = None
+
+
+def check_indexed_track_count(expected_count: int) -> int:
+    """インデックスされたトラック数が生成したファイル数と一致しなければ、計測結果が無効なため終了する"""
+    indexed_track_count = len(FeedGenerator.get_catalog())
+    if indexed_track_count != expected_count:
+        raise SystemExit(f"indexed {indexed_track_count} of {expected_count} tracks; some files were skipped, aborting the benchmark")
+    return indexed_track_count
+
+
+def peak_rss_kb() -> int:
+    """このプロセスと終了済みの子プロセス（タグ読み込みのワーカー）のうち大きい方のピークRSS（KB）"""
+    scale = 1024 if sys.platform == "darwin" else 1
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale
+    return max(self_rss, children_rss)
+
+
+def measure(results: Dict[str, Dict[str, float]], name: str, run: Callable[[], None], iterations: int = 1):
+    latencies = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - started_at)
+    latencies.sort()
+    results[name] = {
+        "seconds": sum(latencies) / len(latencies),
+        "min_seconds": latencies[0],
+        "max_seconds": latencies[-1],
+        "iterations": iterations,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+    print(f"{name:<28} {results[name]['seconds'] * 1000:10.2f}ms  peak_rss={results[name]['peak_rss_kb'] / 1024:8.1f}MB", file=sys.stderr)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=app_dir_path, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--albums", type=int, default=50, help="アルバム数")
+    parser.add_argument("--tracks", type=int, default=20, help="1アルバムあたりのトラック数")
+    parser.add_argument("--m4a-ratio", type=float, default=0.25, help="M4A ファイルの割合（0で MP3 のみ）")
+    parser.add_argument("--no-cover", action="store_true", help="カバー画像を埋め込まない")
+    parser.add_argument("--burst", type=int, default=100, help="一括追加するファイル数")
+    parser.add_argument("--render-iterations", type=int, default=20, help="フィードとインデックスページの描画の計測回数")
+    parser.add_argument("--workers", type=int, default=FileIO.tag_parse_workers, help="タグ読み込みの並列プロセス数")
+    parser.add_argument("--output", help="結果の JSON を書き出すファイル（省略時は標準出力）")
+    parser.add_argument("--keep", action="store_true", help="合成したライブラリを削除せずに残す")
+    args = parser.parse_args()
+
+    FileIO.tag_parse_workers = args.workers
+    root_dir_path = tempfile.mkdtemp(prefix="bench_pipeline_")
+    configure_htdocs(root_dir_path)
+    results: Dict[str, Dict[str, float]] = {}
+    try:
+        started_at = time.perf_counter()
+        file_count = generate_library(FileIO.music_files_dir_path, args.albums, args.tracks, args.m4a_ratio, not args.no_cover)
+        print(f"library: {file_count} files in {time.perf_counter() - started_at:.2f}s ({root_dir_path})", file=sys.stderr)
+
+        measure(results, "generate_cold", FeedGenerator.generate)
+        check_indexed_track_count(file_count)
+
+        def generate_warm():
+            reset_process_state()
+            FeedGenerator.generate()
+        measure(results, "generate_warm", generate_warm)
+
+        extra_dir_path = os.path.join(FileIO.music_files_dir_path, "bench extra")
+        os.makedirs(extra_dir_path, exist_ok=True)
+        single_file_path = write_track(extra_dir_path, "Bench Extra", 0, False, not args.no_cover)
+        # フィードの描画はワーカースレッドで行われるため、描画の完了までを計測する
+        def add_single_file():
+            FeedGenerator.add_music_file(single_file_path)
+            FeedGenerator.render_scheduler.wait()
+        measure(results, "add_music_file", add_single_file)
+
+        def remove_single_file():
+            os.remove(single_file_path)
+            FeedGenerator.remove_music_file(single_file_path)
+            FeedGenerator.render_scheduler.wait()
+        measure(results, "remove_music_file", remove_single_file)
+
+        burst_dir_path = os.path.join(FileIO.music_files_dir_path, "bench burst")
+        os.makedirs(burst_dir_path, exist_ok=True)
+        burst_file_paths = [write_track(burst_dir_path, "Bench Burst", i, False, not args.no_cover) for i in range(args.burst)]
+        def apply_burst():
+            FeedGenerator.apply_changes(added_paths=burst_file_paths)
+            FeedGenerator.render_scheduler.wait()
+        measure(results, "apply_changes_burst", apply_burst)
+
+        # ワーカーがイベントを処理しないよう、デバウンス時間を十分に長くしておく
+        watcher = FileWatcher(FileIO.music_files_dir_path, debounce_seconds=3600)
+        watcher.scanner.scan()
+        measure(results, "scan_for_new_files", watcher.scan_for_new_files, iterations=5)
+
+        def full_scan():
+            watcher.last_full_scan_at = float("-inf")
+            watcher.scan_for_new_files()
+        measure(results, "scan_for_new_files_full", full_scan, iterations=5)
+
+        catalog: MusicCatalog = FeedGenerator.get_catalog()
+        indexed_track_count = check_indexed_track_count(file_count + args.burst)
+        largest_album_name = max(catalog.album_names(), key=lambda album_name: len(catalog.albums[album_name]))
+        largest_album_tracks = catalog.album_tracks(largest_album_name)
+        feed_info = FeedInfo(album_name=largest_album_name)
+
+        def render_feed():
+            TemplateRenderer.feed_page_signatures = {}
+            TemplateRenderer.render_feed_xml(feed_info, largest_album_tracks)
+        measure(results, "render_feed_xml", render_feed, iterations=args.render_iterations)
+
+        feed_info_list = FeedGenerator._get_all_feeds()
+        last_update_date = FeedGenerator._get_last_update_date()
+        measure(results, "render_index_html", lambda: TemplateRenderer.render_index_html(feed_info_list, last_update_date),
+                iterations=args.render_iterations)
+    finally:
+        reset_process_state()
+        if not args.keep:
+            shutil.rmtree(root_dir_path, ignore_errors=True)
+
+    report = {
+        "benchmark": "pipeline",
+        "timestamp": datetime.now().astimezone().isoformat(),
+        "revision": git_revision(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "parameters": {
+            "albums": args.albums,
+            "tracks": args.tracks,
+            "files": file_count,
+            "indexed_tracks": indexed_track_count,
+            "m4a_ratio": args.m4a_ratio,
+            "cover": not args.no_cover,
+            "burst": args.burst,
+            "workers": args.workers,
+        },
+        "results": results,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+    report_json = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report_json + "\n")
+    else:
+        print(report_json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""テンプレート描画1回あたりのレイテンシを計測するベンチマーク
+
+毎回 Environment を作り直してテンプレートを読み込み・コンパイルする従来の方式（before）と、
+プロセス全体で共有するテンプレートキャッシュを使う方式（after）を比較する。
+before ではフィード・<item> 要素・インデックスページのすべてのテンプレートを、
+キャッシュを持たない新しい Environment から読み込む（描画済みの <item> 要素も使わない）。
+描画を省く署名と出力済みファイルのハッシュは、どちらの方式でも計測ごとに消去する。
+
+使い方:
+    python benchmarks/bench_template_render.py --tracks 100 --iterations 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, List
+
+os.environ.setdefault("APP_ROOT_URL", "http://localhost:8080/")
+app_dir_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+sys.path.insert(0, app_dir_path)
+
+from jinja2 import Environment, FileSystemLoader  # noqa: E402
+from feed_generator import FeedInfo, FileIO, MusicInfo, TemplateRenderer  # noqa: E402
+
+
+def uncached_template_environment() -> Environment:
+    """従来の方式: テンプレートを読み込むたびに、キャッシュを持たない Environment を作る"""
+    return Environment(loader=FileSystemLoader(FileIO.templates_dir_path, encoding="utf8"), cache_size=0)
+
+
+def reset_render_state():
+    """描画・書き込みを省くための状態を消去する（計測時間には含めない）"""
+    TemplateRenderer.feed_page_signatures.clear()
+    TemplateRenderer.index_page_signatures.clear()
+    FileIO.written_file_hashes.clear()
+
+
+def make_music_list(album_name: str, track_count: int) -> List[MusicInfo]:
+    return [
+        MusicInfo(
+            fullpath=f"{FileIO.music_files_dir_path}{album_name}/{i:04d}.mp3",
+            album_name=album_name,
+            title=f"Track {i:04d}",
+            duration_seconds=180 + i,
+            file_size_bytes=3_000_000 + i,
+            created_timestamp=1_600_000_000 + i,
+            thumbnail_url=FileIO.default_thumbnail_url,
+        )
+        for i in range(track_count)
+    ]
+
+
+def measure(render: Callable[[], None], iterations: int, setup: Callable[[], None] = reset_render_state) -> List[float]:
+    latencies = []
+    for _ in range(iterations):
+        setup()
+        started_at = time.perf_counter()
+        render()
+        latencies.append(time.perf_counter() - started_at)
+    return latencies
+
+
+def summarize(label: str, latencies: List[float]):
+    latencies = sorted(latencies)
+    mean = sum(latencies) / len(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{label:<24} mean={mean * 1000:8.3f}ms  p50={p50 * 1000:8.3f}ms  p95={p95 * 1000:8.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tracks", type=int, default=100, help="1アルバムあたりのトラック数")
+    parser.add_argument("--albums", type=int, default=100, help="インデックスページに載せるアルバム数")
+    parser.add_argument("--iterations", type=int, default=200, help="計測回数")
+    args = parser.parse_args()
+
+    output_dir = tempfile.mkdtemp(prefix="bench_template_render_")
+    FileIO.templates_dir_path = os.path.join(app_dir_path, "templates", "")
+    FileIO.output_xml_dir_path = os.path.join(output_dir, "")
+    FileIO.index_html_file_path = os.path.join(output_dir, "index.html")
+
+    feed_info = FeedInfo(album_name="bench")
+    music_list = make_music_list(feed_info.album_name, args.tracks)
+    feed_info_list = [FeedInfo(album_name=f"album {i}") for i in range(args.albums)]
+    last_update_date = datetime.now()
+
+    def render_feed():
+        TemplateRenderer.render_feed_xml(feed_info, music_list)
+
+    def render_index():
+        TemplateRenderer.render_index_html(feed_info_list, last_update_date)
+
+    def reset_uncached_state():
+        reset_render_state()
+        TemplateRenderer.clear_item_xml_cache()
+        TemplateRenderer.item_xml_cache_template = None
+
+    cached_template_environment = FileIO.get_template_environment
+
+    print(f"feed: {args.tracks} tracks, index: {args.albums} albums, {args.iterations} iterations")
+
+    FileIO.get_template_environment = uncached_template_environment
+    summarize("feed   before (no cache)", measure(render_feed, args.iterations, reset_uncached_state))
+    summarize("index  before (no cache)", measure(render_index, args.iterations, reset_uncached_state))
+
+    FileIO.get_template_environment = cached_template_environment
+    FileIO.template_environment = None
+    summarize("feed   after  (cached)", measure(render_feed, args.iterations))
+    summarize("index  after  (cached)", measure(render_index, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""テスト用の小さな音楽ファイル（タグのみ・音声データはダミー）を作る"""
+import struct
+from typing import Optional
+
+# カバー画像として埋め込むダミーの JPEG
+cover_image_data = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 4 + b"\xff\xd9"
+# MPEG1 Layer III 128kbps 44.1kHz ステレオのフレームヘッダー（1フレーム 1152 サンプル）
+mpeg_frame_header = b"\xff\xfb\x90\x00"
+
+
+def syncsafe(value: int) -> bytes:
+    return bytes([(value >> 21) & 0x7f, (value >> 14) & 0x7f, (value >> 7) & 0x7f, value & 0x7f])
+
+
+def id3_text(text: str, version: int) -> bytes:
+    # v2.4 は UTF-8、v2.3 は BOM 付き UTF-16
+    if version == 4:
+        return b"\x03" + text.encode("utf-8")
+    return b"\x01" + text.encode("utf-16")
+
+
+def id3_frame(frame_id: bytes, data: bytes, version: int) -> bytes:
+    size = syncsafe(len(data)) if version == 4 else struct.pack(">I", len(data))
+    return frame_id + size + b"\x00\x00" + data
+
+
+def make_mp3(album_name: Optional[str], title: Optional[str], version: int = 3, cover: Optional[bytes] = None,
+             frame_count: int = 100, id3v1: bool = False) -> bytes:
+    """ID3v2（2.3 / 2.4）タグと Xing ヘッダー付きの MP3 を作る（id3v1=True の場合は末尾の ID3v1 タグのみ）"""
+    data = b""
+    if not id3v1:
+        frames = b""
+        if title is not None:
+            frames += id3_frame(b"TIT2", id3_text(title, version), version)
+        if album_name is not None:
+            frames += id3_frame(b"TALB", id3_text(album_name, version), version)
+        if cover is not None:
+            frames += id3_frame(b"APIC", b"\x00image/jpeg\x00\x03\x00" + cover, version)
+        data += b"ID3" + bytes([version, 0, 0]) + syncsafe(len(frames)) + frames
+    xing_frame = mpeg_frame_header + b"\x00" * 32 + b"Xing" + struct.pack(">II", 1, frame_count)
+    data += xing_frame + b"\x00" * (417 - len(xing_frame))
+    data += (mpeg_frame_header + b"\x00" * 413) * 4
+    if id3v1:
+        data += b"TAG" + (title or "").encode("latin-1").ljust(30, b"\x00") + b"\x00" * 30 \
+            + (album_name or "").encode("latin-1").ljust(30, b"\x00") + b"\x00" * 34 + b"\xff"
+    return data
+
+
+def mp4_atom(atom_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I", len(payload) + 8) + atom_type + payload
+
+
+def mp4_data_atom(data_type: int, payload: bytes) -> bytes:
+    return mp4_atom(b"data", struct.pack(">II", data_type, 0) + payload)
+
+
+def make_m4a(album_name: Optional[str], title: Optional[str], cover: Optional[bytes] = None,
+             timescale: int = 44100, duration: int = 44100 * 90) -> bytes:
+    """moov/mvhd と udta/meta/ilst（©alb / ©nam / covr）を持つ M4A を作る"""
+    items = b""
+    if title is not None:
+        items += mp4_atom(b"\xa9nam", mp4_data_atom(1, title.encode("utf-8")))
+    if album_name is not None:
+        items += mp4_atom(b"\xa9alb", mp4_data_atom(1, album_name.encode("utf-8")))
+    if cover is not None:
+        items += mp4_atom(b"covr", mp4_data_atom(13, cover))
+    meta = mp4_atom(b"meta", b"\x00\x00\x00\x00" + mp4_atom(b"hdlr", b"\x00" * 8 + b"mdir" + b"\x00" * 13)
+                    + mp4_atom(b"ilst", items))
+    mvhd = mp4_atom(b"mvhd", b"\x00\x00\x00\x00" + struct.pack(">IIII", 0, 0, timescale, duration) + b"\x00" * 80)
+    moov = mp4_atom(b"moov", mvhd + mp4_atom(b"udta", meta))
+    ftyp = mp4_atom(b"ftyp", b"M4A \x00\x00\x00\x00M4A mp42isom")
+    return ftyp + moov + mp4_atom(b"mdat", b"\x00" * 64)
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("APP_ROOT_URL", "http://localhost/")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from feed_generator import FeedGenerator, FileIO, TemplateRenderer  # noqa: E402
+
+
+@pytest.fixture
+def htdocs(tmp_path, monkeypatch):
+    """FileIO の入出力先を一時ディレクトリの htdocs に向け、プロセス内の状態を初期化する"""
+    htdocs_dir_path = f"{tmp_path}/htdocs/"
+    paths = {
+        "htdocs_dir_path": htdocs_dir_path,
+        "music_files_dir_path": f"{htdocs_dir_path}music_files/",
+        "index_html_file_path": f"{htdocs_dir_path}index.html",
+        "opml_file_path": f"{htdocs_dir_path}feeds.opml",
+        "catalog_json_file_path": f"{htdocs_dir_path}catalog.json",
+        "output_xml_dir_path": f"{htdocs_dir_path}{FileIO.feeds_dir_name}/",
+        "thumbnail_dir_path": f"{htdocs_dir_path}{FileIO.thumbnail_dir_name}/",
+        "index_db_file_path": f"{htdocs_dir_path}music_index.sqlite3",
+        "legacy_index_file_path": f"{htdocs_dir_path}music_index.pkl",
+        "legacy_tag_cache_file_path": f"{htdocs_dir_path}music_tag_cache.pkl",
+        "templates_dir_path": os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app", "templates", ""),
+    }
+    for name, value in paths.items():
+        monkeypatch.setattr(FileIO, name, value)
+    for dir_path in [FileIO.music_files_dir_path, FileIO.output_xml_dir_path, FileIO.thumbnail_dir_path]:
+        os.makedirs(dir_path)
+    monkeypatch.setattr(FileIO, "tag_parse_workers", 1)
+    monkeypatch.setattr(FileIO, "music_index", None)
+    monkeypatch.setattr(FileIO, "template_environment", None)
+    monkeypatch.setattr(FileIO, "written_file_hashes", {})
+    monkeypatch.setattr(FeedGenerator, "catalog", None)
+    monkeypatch.setattr(FeedGenerator, "on_demand_feeds", False)
+    monkeypatch.setattr(TemplateRenderer, "feed_page_signatures", {})
+    monkeypatch.setattr(TemplateRenderer, "index_page_signatures", {})
+    TemplateRenderer.clear_item_xml_cache()
+    monkeypatch.setattr(TemplateRenderer, "item_xml_cache_template", None)
+
+    yield htdocs_dir_path
+
+    FeedGenerator.render_scheduler.wait()
+    if FileIO.music_index is not None:
+        FileIO.music_index.connection.close()
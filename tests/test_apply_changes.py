@@ -0,0 +1,85 @@
+import os
+import threading
+
+from audio_fixtures import make_mp3
+from feed_generator import FeedGenerator, FeedInfo, FileIO
+
+
+def write_file(file_path: str, data: bytes):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as f:
+        f.write(data)
+
+
+def feed_item_count(album_name: str) -> int:
+    FeedGenerator.render_scheduler.wait()
+    with open(FeedInfo(album_name=album_name).file_path(), encoding="utf-8") as f:
+        return f.read().count("<item>")
+
+
+def test_add_and_remove(htdocs):
+    first_path = f"{FileIO.music_files_dir_path}album/1.mp3"
+    second_path = f"{FileIO.music_files_dir_path}album/2.mp3"
+    write_file(first_path, make_mp3("Album", "Track 1"))
+    write_file(second_path, make_mp3("Album", "Track 2"))
+    FeedGenerator.generate()
+    assert feed_item_count("Album") == 2
+
+    os.remove(second_path)
+    FeedGenerator.remove_music_file(second_path)
+    assert feed_item_count("Album") == 1
+    assert FileIO.get_music_index().get(second_path) is None
+
+
+def test_replace_with_same_stat_key_keeps_track(htdocs):
+    """削除と追加が1つのイベント（置き換え）にまとめられ、stat キーが変わっていない場合もトラックを失わない"""
+    first_path = f"{FileIO.music_files_dir_path}album/1.mp3"
+    second_path = f"{FileIO.music_files_dir_path}album/2.mp3"
+    write_file(first_path, make_mp3("Album", "Track 1"))
+    write_file(second_path, make_mp3("Album", "Track 2"))
+    FeedGenerator.generate()
+
+    FeedGenerator.apply_changes(added_paths=[second_path], removed_paths=[second_path])
+
+    assert second_path in FeedGenerator.get_catalog()
+    assert FileIO.get_music_index().get(second_path) is not None
+    assert feed_item_count("Album") == 2
+
+
+def test_catalog_is_unchanged_while_parsing(htdocs, monkeypatch):
+    """タグの読み込み中は、置き換え対象のトラックがカタログから消えない"""
+    first_path = f"{FileIO.music_files_dir_path}album/1.mp3"
+    write_file(first_path, make_mp3("Album", "Track 1"))
+    FeedGenerator.generate()
+
+    write_file(first_path, make_mp3("Album", "Track 1 (new)", frame_count=200))
+    titles_while_parsing = []
+    parse_music_files = FileIO.parse_music_files
+
+    def observe_and_parse(fullpaths):
+        titles_while_parsing.extend(music_info.title for music_info in FeedGenerator.get_catalog().album_tracks("Album"))
+        return parse_music_files(fullpaths)
+    monkeypatch.setattr(FileIO, "parse_music_files", observe_and_parse)
+
+    FeedGenerator.apply_changes(added_paths=[first_path], removed_paths=[first_path])
+
+    assert titles_while_parsing == ["Track 1"]
+    assert [music_info.title for music_info in FeedGenerator.get_catalog().album_tracks("Album")] == ["Track 1 (new)"]
+
+
+def test_last_update_date_waits_for_catalog_lock(htdocs):
+    """描画スレッドは、変更の反映中のカタログを走査しない"""
+    write_file(f"{FileIO.music_files_dir_path}album/1.mp3", make_mp3("Album", "Track 1"))
+    FeedGenerator.generate()
+    catalog = FeedGenerator.get_catalog()
+    catalog.last_modified = None
+    results = []
+    reader = threading.Thread(target=lambda: results.append(FeedGenerator._get_last_update_date()))
+
+    with catalog.lock:
+        reader.start()
+        reader.join(timeout=0.1)
+        assert results == []
+    reader.join()
+
+    assert len(results) == 1
@@ -0,0 +1,77 @@
+import errno
+import os
+
+import file_watcher
+from file_watcher import DirectoryScanner
+
+
+def write_file(file_path: str, data: bytes = b"\x00" * 16):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as f:
+        f.write(data)
+
+
+def make_library(tmp_path) -> DirectoryScanner:
+    root = f"{tmp_path}/music_files"
+    write_file(f"{root}/a/1.mp3")
+    write_file(f"{root}/a/sub/2.mp3")
+    write_file(f"{root}/b/3.mp3")
+    scanner = DirectoryScanner(root, [".mp3", ".m4a"])
+    assert len(scanner.scan().created) == 3
+    return scanner
+
+
+def fail_once(monkeypatch, function_name: str, failing_path: str):
+    """指定したディレクトリに対する os の関数呼び出しを、1回だけ ESTALE で失敗させる"""
+    original = getattr(os, function_name)
+    failures = []
+
+    def flaky(path, *args, **kwargs):
+        if os.fspath(path) == failing_path and not failures:
+            failures.append(path)
+            raise OSError(errno.ESTALE, os.strerror(errno.ESTALE), path)
+        return original(path, *args, **kwargs)
+    monkeypatch.setattr(file_watcher.os, function_name, flaky)
+    return failures
+
+
+def test_scandir_error_keeps_subtree(tmp_path, monkeypatch):
+    """ディレクトリの読み込みが一時的に失敗しても、配下のファイルを削除として扱わない"""
+    scanner = make_library(tmp_path)
+    directory_path = os.path.join(scanner.root_directory, "a")
+    write_file(f"{directory_path}/4.mp3")
+    failures = fail_once(monkeypatch, "scandir", directory_path)
+
+    result = scanner.scan(full=True)
+
+    assert failures
+    assert result.deleted == []
+    assert result.created == []
+    result = scanner.scan()
+    assert result.deleted == []
+    assert result.created == [f"{directory_path}/4.mp3"]
+
+
+def test_stat_error_keeps_subtree(tmp_path, monkeypatch):
+    """ディレクトリの stat が一時的に失敗しても、配下のファイルを削除として扱わない"""
+    scanner = make_library(tmp_path)
+    directory_path = os.path.join(scanner.root_directory, "a")
+    failures = fail_once(monkeypatch, "stat", directory_path)
+
+    result = scanner.scan(full=True)
+
+    assert failures
+    assert not result.has_changes()
+    assert sorted(scanner.files()) == sorted([
+        f"{directory_path}/1.mp3", f"{directory_path}/sub/2.mp3", f"{scanner.root_directory}/b/3.mp3"])
+
+
+def test_removed_directory_is_reported_deleted(tmp_path):
+    scanner = make_library(tmp_path)
+    directory_path = os.path.join(scanner.root_directory, "a")
+    os.remove(f"{directory_path}/sub/2.mp3")
+    os.rmdir(f"{directory_path}/sub")
+
+    result = scanner.scan()
+
+    assert result.deleted == [f"{directory_path}/sub/2.mp3"]
@@ -0,0 +1,93 @@
+import os
+from typing import List
+
+from feed_generator import FeedInfo, FileIO, MusicInfo, TemplateRenderer
+
+feed_info = FeedInfo(album_name="Album")
+
+
+def make_music_list(track_count: int) -> List[MusicInfo]:
+    """新しいものから順に並んだトラックの一覧（カタログの album_tracks と同じ順序）"""
+    return [MusicInfo(fullpath=f"{FileIO.music_files_dir_path}Album/{i:02d}.mp3", album_name="Album", title=f"Track {i:02d}",
+                      duration_seconds=60, file_size_bytes=1000, created_timestamp=1_600_000_000 + i,
+                      thumbnail_url=FileIO.default_thumbnail_url)
+            for i in reversed(range(track_count))]
+
+
+def read_feed(page_number: int = 0) -> str:
+    with open(feed_info.file_path(page_number), encoding="utf-8") as f:
+        return f.read()
+
+
+def link(rel: str, page_number: int) -> str:
+    return f'<atom:link href="{feed_info.url(page_number)}" rel="{rel}" type="application/rss+xml" />'
+
+
+def test_feed_pages_and_links(htdocs, monkeypatch):
+    monkeypatch.setattr(TemplateRenderer, "feed_page_size", 2)
+    music_list = make_music_list(5)
+
+    pages = TemplateRenderer.feed_pages(feed_info, music_list)
+
+    # アーカイブページは古いエピソードから詰め、先頭ページには残りの新しいエピソードを載せる
+    assert [(page_number, [music_info.title for music_info in page_music_list], first_url, next_url)
+            for page_number, page_music_list, first_url, next_url in pages] == [
+        (0, ["Track 04"], None, feed_info.url(2)),
+        (1, ["Track 01", "Track 00"], feed_info.url(), None),
+        (2, ["Track 03", "Track 02"], feed_info.url(), feed_info.url(1)),
+    ]
+
+    TemplateRenderer.render_feed_xml(feed_info, music_list)
+
+    assert link("next", 2) in read_feed(0)
+    assert 'rel="first"' not in read_feed(0)
+    assert link("first", 0) in read_feed(2) and link("next", 1) in read_feed(2)
+    assert link("first", 0) in read_feed(1) and 'rel="next"' not in read_feed(1)
+    assert "Track 00" in read_feed(1) and "Track 00" not in read_feed(0)
+
+
+def test_no_pagination_within_page_size(htdocs, monkeypatch):
+    monkeypatch.setattr(TemplateRenderer, "feed_page_size", 5)
+
+    TemplateRenderer.render_feed_xml(feed_info, make_music_list(5))
+
+    assert 'rel="next"' not in read_feed()
+    assert not os.path.exists(feed_info.file_path(1))
+
+
+def test_new_episode_leaves_archive_pages_untouched(htdocs, monkeypatch):
+    monkeypatch.setattr(TemplateRenderer, "feed_page_size", 2)
+    TemplateRenderer.render_feed_xml(feed_info, make_music_list(5))
+    archive_mtimes = [os.stat(feed_info.file_path(page_number)).st_mtime_ns for page_number in [1, 2]]
+    rendered_page_titles = []
+    generate_feed_xml = TemplateRenderer.generate_feed_xml
+
+    def record_and_generate(feed_info, music_info_list, *args, **kwargs):
+        rendered_page_titles.append([music_info.title for music_info in music_info_list])
+        return generate_feed_xml(feed_info, music_info_list, *args, **kwargs)
+    monkeypatch.setattr(TemplateRenderer, "generate_feed_xml", record_and_generate)
+
+    TemplateRenderer.render_feed_xml(feed_info, make_music_list(6))
+
+    # 描画し直すのは先頭ページだけで、アーカイブページのファイルも置き換えない
+    assert rendered_page_titles == [["Track 05", "Track 04"]]
+    assert [os.stat(feed_info.file_path(page_number)).st_mtime_ns for page_number in [1, 2]] == archive_mtimes
+    assert "Track 05" in read_feed(0)
+
+
+def test_extra_pages_are_removed(htdocs, monkeypatch):
+    monkeypatch.setattr(TemplateRenderer, "feed_page_size", 2)
+    TemplateRenderer.render_feed_xml(feed_info, make_music_list(5))
+    assert os.path.exists(f"{feed_info.file_path(2)}.gz")
+
+    TemplateRenderer.render_feed_xml(feed_info, make_music_list(3))
+
+    assert os.path.exists(feed_info.file_path(1))
+    assert not os.path.exists(feed_info.file_path(2))
+    assert not os.path.exists(f"{feed_info.file_path(2)}.gz")
+    assert feed_info.file_path(2) not in TemplateRenderer.feed_page_signatures
+
+    TemplateRenderer.render_feed_xml(feed_info, make_music_list(2))
+
+    assert not os.path.exists(feed_info.file_path(1))
+    assert 'rel="next"' not in read_feed()
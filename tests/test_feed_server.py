@@ -0,0 +1,123 @@
+import gzip
+import os
+from email.utils import formatdate
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+
+import feed_server
+from audio_fixtures import make_mp3
+from feed_generator import FeedGenerator, FeedInfo, FileIO, TemplateRenderer
+from feed_server import FeedServer
+
+
+class FakeTime:
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+def write_track(album_name: str, title: str) -> str:
+    file_path = f"{FileIO.music_files_dir_path}{album_name}/{title}.mp3"
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as f:
+        f.write(make_mp3(album_name, title))
+    return file_path
+
+
+def request(server: FeedServer, path: str, method: str = "GET", **headers: str) -> Tuple[str, Dict[str, str], bytes]:
+    environ = {"REQUEST_METHOD": method, "PATH_INFO": path}
+    environ.update({f"HTTP_{name.upper()}": value for name, value in headers.items()})
+    response: List = []
+
+    def start_response(status: str, response_headers: List[Tuple[str, str]]):
+        response.extend([status, dict(response_headers)])
+    body = b"".join(server(environ, start_response))
+    return response[0], response[1], body
+
+
+def feed_path(album_name: str, page_number: int = 0) -> str:
+    return f"/feeds/{FeedInfo(album_name=album_name).hash()}{FeedInfo(album_name=album_name).page_suffix(page_number)}.xml"
+
+
+@pytest.fixture
+def server(htdocs, monkeypatch) -> FeedServer:
+    monkeypatch.setattr(FeedGenerator, "on_demand_feeds", True)
+    monkeypatch.setattr(FeedGenerator, "album_change_listeners", [])
+    write_track("Album", "Track 1")
+    FeedGenerator.generate()
+    return FeedServer()
+
+
+def test_conditional_requests(server):
+    status, headers, body = request(server, feed_path("Album"))
+    assert status == "200 OK"
+    assert b"Track 1" in body
+
+    assert request(server, feed_path("Album"), if_none_match=headers["ETag"])[0] == "304 Not Modified"
+    assert request(server, feed_path("Album"), if_none_match=f'"other", W/{headers["ETag"]}')[0] == "304 Not Modified"
+    assert request(server, feed_path("Album"), if_none_match='"other"')[0] == "200 OK"
+    assert request(server, feed_path("Album"), if_modified_since=headers["Last-Modified"])[0] == "304 Not Modified"
+    assert request(server, feed_path("Album"), if_modified_since=formatdate(0, usegmt=True))[0] == "200 OK"
+    # If-None-Match がある場合は If-Modified-Since を見ない
+    assert request(server, feed_path("Album"), if_none_match='"other"',
+                   if_modified_since=headers["Last-Modified"])[0] == "200 OK"
+
+
+def test_gzip_and_head(server):
+    status, headers, body = request(server, feed_path("Album"), accept_encoding="gzip, br")
+    assert headers["Content-Encoding"] == "gzip"
+    assert b"Track 1" in gzip.decompress(body)
+
+    status, headers, body = request(server, feed_path("Album"), method="HEAD")
+    assert status == "200 OK"
+    assert body == b""
+    assert int(headers["Content-Length"]) > 0
+
+    assert request(server, feed_path("Album"), method="POST")[0] == "405 Method Not Allowed"
+
+
+def test_not_found(server, monkeypatch):
+    assert request(server, feed_path("Unknown"))[0] == "404 Not Found"
+    assert request(server, feed_path("Album", 1))[0] == "404 Not Found"
+    assert request(server, "/feeds/not-a-hash.xml")[0] == "404 Not Found"
+
+    monkeypatch.setattr(TemplateRenderer, "feed_page_size", 1)
+    write_track("Album", "Track 2")
+    FeedGenerator.add_music_file(f"{FileIO.music_files_dir_path}Album/Track 2.mp3")
+    assert request(server, feed_path("Album", 1))[0] == "200 OK"
+    assert request(server, feed_path("Album", 2))[0] == "404 Not Found"
+
+
+def test_album_change_invalidates_cache(server, monkeypatch):
+    """アルバムが変わると描画結果を破棄し、同じ秒のうちの変更でも Last-Modified を進める"""
+    fake_time = FakeTime(2_000_000_000.5)
+    monkeypatch.setattr(feed_server, "time", fake_time)
+    _, headers, _ = request(server, feed_path("Album"))
+    assert request(server, feed_path("Album"))[1]["ETag"] == headers["ETag"]
+
+    FeedGenerator.add_music_file(write_track("Album", "Track 2"))
+    status, changed_headers, body = request(server, feed_path("Album"), if_modified_since=headers["Last-Modified"])
+    assert status == "200 OK"
+    assert b"Track 2" in body
+    assert changed_headers["ETag"] != headers["ETag"]
+
+    FeedGenerator.add_music_file(write_track("Album", "Track 3"))
+    status, _, body = request(server, feed_path("Album"), if_modified_since=changed_headers["Last-Modified"])
+    assert status == "200 OK"
+    assert b"Track 3" in body
+    # 時刻が進んでいなくても、前回の変更より1秒進める
+    assert server.cache.modified_at["Album"] == 2_000_000_001
+
+
+def test_other_album_change_keeps_cache(server):
+    _, headers, _ = request(server, feed_path("Album"))
+    rendered_feed = server.cache.get("Album", 0)
+
+    FeedGenerator.add_music_file(write_track("Other", "Track 1"))
+
+    assert server.cache.get("Album", 0) is rendered_feed
+    assert request(server, feed_path("Other"))[0] == "200 OK"
+    assert request(server, feed_path("Album"), if_none_match=headers["ETag"])[0] == "304 Not Modified"
@@ -0,0 +1,183 @@
+import os
+import time
+from typing import List, Optional, Tuple
+
+import pytest
+
+import file_watcher
+from audio_fixtures import make_mp3
+from feed_generator import FeedGenerator, FileIO
+from file_watcher import MusicFileHandler
+
+
+class FakeClock:
+    """file_watcher から見える時刻（time.time / time.monotonic）を進められるようにする"""
+
+    def __init__(self):
+        self.offset = 0.0
+
+    def time(self) -> float:
+        return time.time() + self.offset
+
+    def monotonic(self) -> float:
+        return time.monotonic() + self.offset
+
+    def advance(self, seconds: float):
+        self.offset += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    fake_clock = FakeClock()
+    monkeypatch.setattr(file_watcher, "time", fake_clock)
+    return fake_clock
+
+
+@pytest.fixture
+def applied_changes(monkeypatch) -> List[dict]:
+    """FeedGenerator.apply_changes の呼び出しを記録する（フィードには反映しない）"""
+    calls = []
+
+    def record(added_paths=(), removed_paths=(), moved_paths=()):
+        calls.append({"added": sorted(added_paths), "removed": sorted(removed_paths), "moved": sorted(moved_paths)})
+    monkeypatch.setattr(FeedGenerator, "apply_changes", record)
+    return calls
+
+
+def make_handler(close_events_supported: bool = True) -> MusicFileHandler:
+    # ワーカースレッドはキューが空のため待機したままになり、イベントはテストから直接まとめる
+    return MusicFileHandler(debounce_seconds=0.0, settle_seconds=60.0, close_events_supported=close_events_supported)
+
+
+def touch(file_path: str):
+    with open(file_path, "wb") as f:
+        f.write(b"\x00" * 16)
+
+
+# (説明, イベントの前にあるファイル, イベント (種別, パス, 移動元), イベントの後にあるファイル, 追加, 削除, 移動)
+merge_cases = [
+    ("copy", [], [("created", "a", None), ("written", "a", None), ("closed", "a", None)], ["a"],
+     ["a"], [], []),
+    ("created only (no close event expected)", [], [("created", "a", None)], ["a"],
+     ["a"], [], []),
+    ("rewrite after close waits for the next close", [], [("written", "a", None), ("closed", "a", None), ("written", "a", None), ("closed", "a", None)], ["a"],
+     ["a"], [], []),
+    ("delete and recreate", ["a"], [("deleted", "a", None), ("created", "a", None), ("written", "a", None), ("closed", "a", None)], ["a"],
+     ["a"], ["a"], []),
+    ("delete", ["a"], [("deleted", "a", None)], [],
+     [], ["a"], []),
+    # 作成の前からインデックスにあったかは分からないため、削除として反映する（無ければ何もしない）
+    ("created then deleted", [], [("created", "a", None), ("written", "a", None), ("deleted", "a", None)], [],
+     [], ["a"], []),
+    ("move", ["a"], [("moved", "b", "a")], ["b"],
+     [], [], [("a", "b")]),
+    ("chained moves", ["a"], [("moved", "b", "a"), ("moved", "c", "b")], ["c"],
+     [], [], [("a", "c")]),
+    ("move back to the original path", ["a"], [("moved", "b", "a"), ("moved", "a", "b")], ["a"],
+     [], [], []),
+    ("move then delete", ["a"], [("moved", "b", "a"), ("deleted", "b", None)], [],
+     [], ["a", "b"], []),
+    ("move onto an indexed path", ["a", "b"], [("moved", "b", "a")], ["b"],
+     [], [], [("a", "b")]),
+    ("move then write", ["a"], [("moved", "b", "a"), ("written", "b", None), ("closed", "b", None)], ["b"],
+     [], [], [("a", "b")]),
+    ("new file moved before it was applied", [], [("created", "a", None), ("written", "a", None), ("closed", "a", None), ("moved", "b", "a")], ["b"],
+     ["b"], [], []),
+    ("replaced file moved away", ["a"], [("deleted", "a", None), ("created", "a", None), ("closed", "a", None), ("moved", "b", "a")], ["b"],
+     ["b"], ["a"], []),
+    ("moved file disappears before it is applied", ["a"], [("moved", "b", "a")], [],
+     [], ["a"], []),
+]
+
+
+@pytest.mark.parametrize("description,files_before,events,files_after,added,removed,moved", merge_cases,
+                         ids=[case[0] for case in merge_cases])
+def test_merge_events(tmp_path, applied_changes, description: str, files_before: List[str],
+                      events: List[Tuple[str, str, Optional[str]]], files_after: List[str],
+                      added: List[str], removed: List[str], moved: List[Tuple[str, str]]):
+    def path(name: str) -> str:
+        return f"{tmp_path}/{name}.mp3"
+    for name in files_before:
+        touch(path(name))
+    handler = make_handler()
+    for kind, name, src_name in events:
+        handler._merge_event(kind, path(name), path(src_name) if src_name is not None else None)
+    for name in set(files_before) - set(files_after):
+        os.remove(path(name))
+    for name in files_after:
+        touch(path(name))
+
+    handler._apply_pending_events()
+
+    expected = {
+        "added": sorted(path(name) for name in added),
+        "removed": sorted(path(name) for name in removed),
+        "moved": sorted((path(src_name), path(dest_name)) for src_name, dest_name in moved),
+    }
+    assert applied_changes == ([expected] if added or removed or moved else [])
+    assert handler.pending_events == {}
+    assert handler.move_sources == {}
+    assert handler.writing_files == {}
+
+
+def test_missing_close_falls_back_to_settle(tmp_path, clock, applied_changes):
+    """クローズイベントが届かないファイルは、settle_seconds だけ更新が無ければ完了とみなす"""
+    file_path = f"{tmp_path}/a.mp3"
+    touch(file_path)
+    handler = make_handler()
+    handler._merge_event("created", file_path)
+    handler._merge_event("written", file_path)
+
+    handler._apply_pending_events()
+    assert applied_changes == []
+    assert handler.writing_files == {file_path: "created"}
+    # 再確認は settle_seconds 後まで行わない
+    clock.advance(handler.settle_seconds / 2)
+    handler._resume_due_writing_files()
+    assert handler.pending_events == {}
+
+    clock.advance(handler.settle_seconds / 2)
+    handler._resume_due_writing_files()
+    handler._apply_pending_events()
+    assert applied_changes == [{"added": [file_path], "removed": [], "moved": []}]
+    assert handler.writing_files == {}
+    assert handler.written_files == set()
+
+
+def test_event_while_writing_resumes_immediately(tmp_path, clock, applied_changes):
+    """書き込み中のファイルにクローズイベントが届いたら、再確認の予定を待たずに処理する"""
+    file_path = f"{tmp_path}/a.mp3"
+    touch(file_path)
+    handler = make_handler()
+    handler._merge_event("written", file_path)
+    handler._apply_pending_events()
+    assert handler.writing_files == {file_path: "created"}
+
+    handler._merge_event("closed", file_path)
+    handler._apply_pending_events()
+    assert applied_changes == [{"added": [file_path], "removed": [], "moved": []}]
+    # 残った再確認の予定は、時刻になっても何もしない
+    clock.advance(handler.settle_seconds)
+    handler._resume_due_writing_files()
+    assert handler.pending_events == {}
+
+
+def test_move_onto_indexed_path_replaces_track(htdocs):
+    """インデックス済みのパスへの移動では、移動先にあったトラックを移動元のトラックで置き換える"""
+    src_path = f"{FileIO.music_files_dir_path}album/1.mp3"
+    dest_path = f"{FileIO.music_files_dir_path}album/2.mp3"
+    os.makedirs(os.path.dirname(src_path))
+    for file_path, title in [(src_path, "Track 1"), (dest_path, "Track 2")]:
+        with open(file_path, "wb") as f:
+            f.write(make_mp3("Album", title))
+    FeedGenerator.generate()
+    handler = make_handler()
+    os.replace(src_path, dest_path)
+
+    handler._merge_event("moved", dest_path, src_path)
+    handler._apply_pending_events()
+
+    catalog = FeedGenerator.get_catalog()
+    assert src_path not in catalog
+    assert [music_info.title for music_info in catalog.album_tracks("Album")] == ["Track 1"]
+    assert FileIO.get_music_index().get(src_path) is None
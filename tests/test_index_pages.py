@@ -0,0 +1,80 @@
+import os
+from datetime import datetime
+from typing import List
+
+from feed_generator import FeedInfo, FileIO, TemplateRenderer
+
+last_update_date = datetime(2024, 1, 1)
+
+
+def make_feed_info_list(album_names: List[str]) -> List[FeedInfo]:
+    return [FeedInfo(album_name=album_name) for album_name in album_names]
+
+
+def read_index(page_number: int = 0) -> str:
+    with open(FileIO.index_html_page_file_path(page_number), encoding="utf-8") as f:
+        return f.read()
+
+
+def page_mtimes(page_count: int) -> List[int]:
+    return [os.stat(FileIO.index_html_page_file_path(page_number)).st_mtime_ns for page_number in range(page_count)]
+
+
+def test_index_pages(htdocs, monkeypatch):
+    monkeypatch.setattr(TemplateRenderer, "index_page_size", 2)
+
+    TemplateRenderer.render_index_html(make_feed_info_list(["E", "D", "C", "B", "A"]), last_update_date)
+
+    # アルバム名の順に2件ずつ分け、全ページに他のページへのリンクを載せる
+    assert FileIO.index_html_page_file_path(1).endswith("index-2.html")
+    for page_number, album_names in enumerate([["A", "B"], ["C", "D"], ["E"]]):
+        html = read_index(page_number)
+        for album_name in album_names:
+            assert FeedInfo(album_name=album_name).url() in html
+        assert f"<strong>{page_number + 1}</strong>" in html
+        assert FileIO.get_htdocs_url(FileIO.index_html_page_file_path((page_number + 1) % 3)) in html
+    assert FeedInfo(album_name="C").url() not in read_index(0)
+    assert not os.path.exists(FileIO.index_html_page_file_path(3))
+
+
+def test_unchanged_index_pages_are_not_rewritten(htdocs, monkeypatch):
+    monkeypatch.setattr(TemplateRenderer, "index_page_size", 2)
+    TemplateRenderer.render_index_html(make_feed_info_list(["A", "B", "C", "D", "E"]), last_update_date)
+    mtimes = page_mtimes(3)
+    rendered_pages = []
+    output_index_html = FileIO.output_index_html
+
+    def record_and_output(html_chunks, page_number=0):
+        rendered_pages.append(page_number)
+        return output_index_html(html_chunks, page_number)
+    monkeypatch.setattr(FileIO, "output_index_html", record_and_output)
+
+    # 最後のページだけ載せるアルバムが変わる
+    TemplateRenderer.render_index_html(make_feed_info_list(["A", "B", "C", "D", "E", "F"]), datetime(2024, 1, 2))
+
+    assert rendered_pages == [0, 2]
+    assert page_mtimes(3)[1] == mtimes[1]
+    assert FeedInfo(album_name="F").url() in read_index(2)
+
+    # 先頭にアルバムが加わると、後ろのページはすべてずれる
+    rendered_pages.clear()
+    TemplateRenderer.render_index_html(make_feed_info_list(["0", "A", "B", "C", "D", "E", "F"]), datetime(2024, 1, 3))
+    assert rendered_pages == [0, 1, 2, 3]
+
+
+def test_extra_index_pages_are_removed(htdocs, monkeypatch):
+    monkeypatch.setattr(TemplateRenderer, "index_page_size", 2)
+    TemplateRenderer.render_index_html(make_feed_info_list(["A", "B", "C", "D", "E"]), last_update_date)
+
+    TemplateRenderer.render_index_html(make_feed_info_list(["A", "B", "C"]), last_update_date)
+
+    assert not os.path.exists(FileIO.index_html_page_file_path(2))
+    assert not os.path.exists(f"{FileIO.index_html_page_file_path(2)}.gz")
+    assert FileIO.index_html_page_file_path(2) not in TemplateRenderer.index_page_signatures
+    # ページ数が変わったため、残ったページもページ一覧を描画し直している
+    assert FileIO.get_htdocs_url(FileIO.index_html_page_file_path(2)) not in read_index(1)
+
+    TemplateRenderer.render_index_html(make_feed_info_list(["A"]), last_update_date)
+
+    assert not os.path.exists(FileIO.index_html_page_file_path(1))
+    assert "<strong>" not in read_index(0)
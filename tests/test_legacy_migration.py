@@ -0,0 +1,105 @@
+import os
+import pickle
+import sqlite3
+from dataclasses import dataclass
+
+import pytest
+
+import feed_generator
+from feed_generator import FileIO, MusicIndex
+
+
+@dataclass
+class MusicInfo:
+    """旧バージョンの MusicInfo と同じ形のクラス（__dict__ に属性を持ち、absolute_url も保存されていた）"""
+    fullpath: str = ""
+    album_name: str = ""
+    title: str = ""
+    duration_seconds: int = ""
+    absolute_url: str = ""
+    file_size_bytes: int = 0
+    created_timestamp: int = 0
+    thumbnail_url: str = ""
+
+
+def legacy_music_info(name: str) -> MusicInfo:
+    return MusicInfo(fullpath=f"{FileIO.music_files_dir_path}Album/{name}.mp3", album_name="Album", title=name,
+                     duration_seconds=180, absolute_url=f"http://old-host/music_files/Album/{name}.mp3",
+                     file_size_bytes=3_000_000, created_timestamp=1_600_000_000,
+                     thumbnail_url=f"{FileIO.thumbnail_dir_url}{name}.jpg")
+
+
+@pytest.fixture
+def legacy_files(htdocs):
+    """旧形式のインデックス（MusicInfo のリスト）とタグ情報キャッシュ（パス → (stat キー, MusicInfo か None)）を作る"""
+    indexed = legacy_music_info("Track 1")
+    # 旧バージョンで後から追加された属性など、現在の MusicInfo に無い属性は無視される
+    indexed.stray_attribute = "ignored"
+    cached = legacy_music_info("Track 2")
+    skipped_path = f"{FileIO.music_files_dir_path}Album/broken.mp3"
+    with open(FileIO.legacy_index_file_path, "wb") as f:
+        pickle.dump([indexed], f)
+    with open(FileIO.legacy_tag_cache_file_path, "wb") as f:
+        pickle.dump({
+            indexed.fullpath: ((3_000_000, 1, 11), indexed),
+            cached.fullpath: ((3_000_000, 2, 12), cached),
+            skipped_path: ((100, 3, 13), None),
+        }, f)
+    return indexed, cached, skipped_path
+
+
+def count_committed_rows(table: str) -> int:
+    """移行中のインデックスとは別の接続から、コミット済みの行数を数える"""
+    connection = sqlite3.connect(FileIO.index_db_file_path)
+    try:
+        return connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_migrate_from_pickle(legacy_files, monkeypatch):
+    indexed, cached, skipped_path = legacy_files
+    committed_rows_at_removal = []
+    remove = os.remove
+
+    def record_and_remove(path):
+        if path.endswith(".pkl"):
+            committed_rows_at_removal.append((count_committed_rows("tracks"), count_committed_rows("skipped_files")))
+        remove(path)
+    monkeypatch.setattr(feed_generator.os, "remove", record_and_remove)
+
+    FileIO.music_index = music_index = MusicIndex(FileIO.index_db_file_path)
+    music_index.migrate_from_pickle(FileIO.legacy_index_file_path, FileIO.legacy_tag_cache_file_path)
+
+    # 旧ファイルはインデックスへの書き込みがコミットされてから削除される
+    assert committed_rows_at_removal == [(2, 1), (2, 1)]
+    assert not os.path.exists(FileIO.legacy_index_file_path)
+    assert not os.path.exists(FileIO.legacy_tag_cache_file_path)
+
+    music_info = music_index.get(indexed.fullpath)
+    assert (music_info.album_name, music_info.title, music_info.thumbnail_url) == ("Album", "Track 1", indexed.thumbnail_url)
+    assert not hasattr(music_info, "stray_attribute")
+    # 配信URLは保存されていた古い値ではなく、現在の設定から求める
+    assert music_info.absolute_url == FileIO.get_absolute_url(indexed.fullpath)
+    row = music_index.connection.execute("SELECT absolute_url FROM tracks WHERE fullpath = ?", (indexed.fullpath,)).fetchone()
+    assert row[0] == FileIO.get_absolute_url(indexed.fullpath)
+
+    assert music_index.get_stat_key(indexed.fullpath) == (3_000_000, 1, 11)
+    assert music_index.get(cached.fullpath).title == "Track 2"
+    assert music_index.get_stat_key(cached.fullpath) == (3_000_000, 2, 12)
+    assert music_index.get(skipped_path) is None
+    assert music_index.get_stat_key(skipped_path) == (100, 3, 13)
+
+
+def test_failed_migration_keeps_legacy_files(legacy_files, monkeypatch):
+    """取り込みに失敗した場合は何もコミットせず、旧ファイルも削除しない"""
+    def broken_mark_skipped(self, fullpath, stat_key):
+        raise sqlite3.OperationalError("disk I/O error")
+    monkeypatch.setattr(MusicIndex, "mark_skipped", broken_mark_skipped)
+
+    with pytest.raises(sqlite3.OperationalError):
+        FileIO.get_music_index()
+
+    assert os.path.exists(FileIO.legacy_index_file_path)
+    assert os.path.exists(FileIO.legacy_tag_cache_file_path)
+    assert count_committed_rows("tracks") == 0
@@ -0,0 +1,152 @@
+import gzip
+import os
+import types
+
+import pytest
+
+import feed_generator
+from audio_fixtures import make_mp3
+from feed_generator import FeedGenerator, FeedInfo, FileIO, TemplateRenderer
+
+
+def test_stale_precompressed_variants_are_removed(htdocs, monkeypatch):
+    """出力しない形式の古い圧縮済みファイルは削除し、出力する形式は新しい内容で作り直す"""
+    file_path = f"{htdocs}index.html"
+    for extension in ["gz", "br"]:
+        with open(f"{file_path}.{extension}", "wb") as f:
+            f.write(b"stale")
+    monkeypatch.setattr(feed_generator, "brotli", None)
+    monkeypatch.setattr(FileIO, "precompressed_encodings", ["gzip", "br"])
+
+    FileIO.write_file_atomically(file_path, ["<html>new</html>"])
+
+    assert not os.path.exists(f"{file_path}.br")
+    with gzip.open(f"{file_path}.gz") as f:
+        assert f.read() == b"<html>new</html>"
+
+
+def test_disabled_encoding_is_removed(htdocs, monkeypatch):
+    file_path = f"{htdocs}index.html"
+    FileIO.write_file_atomically(file_path, ["<html>old</html>"])
+    assert os.path.exists(f"{file_path}.gz")
+    monkeypatch.setattr(FileIO, "precompressed_encodings", [])
+
+    FileIO.write_file_atomically(file_path, ["<html>new</html>"])
+
+    assert not os.path.exists(f"{file_path}.gz")
+    assert not os.path.exists(f"{file_path}.br")
+
+
+def write_music_file(file_path: str, data: bytes):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as f:
+        f.write(data)
+
+
+def test_deleted_output_is_recreated(htdocs):
+    """出力済みのファイルが外部で削除された場合は、内容が同じでも出力し直す"""
+    write_music_file(f"{FileIO.music_files_dir_path}album/1.mp3", make_mp3("Album", "Track 1"))
+    FeedGenerator.generate()
+    FeedGenerator.render_scheduler.wait()
+    os.remove(FileIO.index_html_file_path)
+    os.remove(f"{FileIO.index_html_file_path}.gz")
+
+    FeedGenerator._render_catalog_outputs()
+
+    assert os.path.exists(FileIO.index_html_file_path)
+    assert os.path.exists(f"{FileIO.index_html_file_path}.gz")
+
+
+def test_modified_output_is_rewritten(htdocs):
+    """記録したハッシュは、ファイルのサイズ・更新日時が変わっていれば使わない"""
+    file_path = f"{htdocs}index.html"
+    assert FileIO.write_file_atomically(file_path, ["<html>same</html>"])
+    with open(file_path, "w") as f:
+        f.write("broken")
+
+    assert FileIO.write_file_atomically(file_path, ["<html>same</html>"])
+    with open(file_path) as f:
+        assert f.read() == "<html>same</html>"
+
+
+def test_deleted_archive_pages_are_recreated(htdocs, monkeypatch):
+    """外部で削除されたアーカイブページ・インデックスページは、署名が同じでも出力し直す"""
+    monkeypatch.setattr(TemplateRenderer, "feed_page_size", 1)
+    monkeypatch.setattr(TemplateRenderer, "index_page_size", 1)
+    for album_name in ["Album A", "Album B"]:
+        for i in range(2):
+            write_music_file(f"{FileIO.music_files_dir_path}{album_name}/{i}.mp3", make_mp3(album_name, f"Track {i}"))
+    FeedGenerator.generate()
+    FeedGenerator.render_scheduler.wait()
+    feed_info = FeedInfo(album_name="Album A")
+    os.remove(feed_info.file_path(1))
+    os.remove(FileIO.index_html_page_file_path(1))
+
+    FeedGenerator._render_album_feed("Album A")
+    FeedGenerator._render_catalog_outputs()
+
+    assert os.path.exists(feed_info.file_path(1))
+    assert os.path.exists(FileIO.index_html_page_file_path(1))
+
+
+def test_precompressed_files_are_replaced_before_source(htdocs, monkeypatch):
+    """圧縮済みファイルは元のファイルより先に、新しい内容で置き換える"""
+    file_path = f"{htdocs}index.html"
+    FileIO.write_file_atomically(file_path, ["<html>old</html>"])
+    replaced_paths = []
+    replace_with_temp_file = FileIO.replace_with_temp_file
+
+    def record_and_replace(f, tmp_file_path, dest_path):
+        replaced_paths.append(dest_path)
+        replace_with_temp_file(f, tmp_file_path, dest_path)
+    monkeypatch.setattr(FileIO, "replace_with_temp_file", record_and_replace)
+
+    FileIO.write_file_atomically(file_path, ["<html>new</html>"])
+
+    assert replaced_paths == [f"{file_path}.gz", file_path]
+    with gzip.open(f"{file_path}.gz") as f:
+        assert f.read() == b"<html>new</html>"
+    # 元のファイルより後に置き換えた扱いにならず、次の書き込みで作り直さない
+    assert os.stat(f"{file_path}.gz").st_mtime_ns == os.stat(file_path).st_mtime_ns
+    replaced_paths.clear()
+    FileIO.write_file_atomically(file_path, ["<html>new</html>"])
+    assert replaced_paths == []
+
+
+def test_failed_compression_keeps_previous_output(htdocs, monkeypatch):
+    """圧縮に失敗した場合は、元のファイルも圧縮済みファイルも置き換えない"""
+    file_path = f"{htdocs}index.html"
+    FileIO.write_file_atomically(file_path, ["<html>old</html>"])
+
+    def broken_gzip_file(*args, **kwargs):
+        raise OSError("disk full")
+    with monkeypatch.context() as m, pytest.raises(OSError):
+        m.setattr(feed_generator.gzip, "GzipFile", broken_gzip_file)
+        FileIO.write_file_atomically(file_path, ["<html>new</html>"])
+
+    with open(file_path) as f:
+        assert f.read() == "<html>old</html>"
+    with gzip.open(f"{file_path}.gz") as f:
+        assert f.read() == b"<html>old</html>"
+    assert [name for name in os.listdir(htdocs) if name.endswith(".tmp")] == []
+
+
+def test_brotli_quality(htdocs, monkeypatch):
+    qualities = []
+
+    class FakeCompressor:
+        def __init__(self, quality: int = 11):
+            qualities.append(quality)
+
+        def process(self, data: bytes) -> bytes:
+            return data
+
+        def finish(self) -> bytes:
+            return b""
+    monkeypatch.setattr(feed_generator, "brotli", types.SimpleNamespace(Compressor=FakeCompressor))
+    monkeypatch.setattr(FileIO, "brotli_quality", 4)
+
+    FileIO.write_file_atomically(f"{htdocs}index.html", ["<html></html>"])
+
+    assert qualities == [4]
+    assert os.path.exists(f"{htdocs}index.html.br")
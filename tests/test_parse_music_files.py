@@ -0,0 +1,23 @@
+import os
+
+from audio_fixtures import cover_image_data, make_mp3
+from feed_generator import FileIO
+
+
+def test_worker_processes_use_parent_paths(htdocs, monkeypatch):
+    """spawn で起動したワーカーも、親プロセスで書き換えた htdocs にサムネイルを保存する"""
+    monkeypatch.setattr(FileIO, "tag_parse_workers", 2)
+    monkeypatch.setattr(FileIO, "tag_parse_chunk_size", 1)
+    fullpaths = []
+    for i in range(2):
+        fullpath = f"{FileIO.music_files_dir_path}{i}.mp3"
+        with open(fullpath, "wb") as f:
+            f.write(make_mp3("Album", f"Track {i}", cover=cover_image_data))
+        fullpaths.append(fullpath)
+
+    music_info_list = FileIO.parse_music_files(fullpaths)
+
+    assert [music_info.title for music_info in music_info_list] == ["Track 0", "Track 1"]
+    thumbnail_url = music_info_list[0].thumbnail_url
+    assert thumbnail_url.startswith(FileIO.thumbnail_dir_url) and thumbnail_url != FileIO.default_thumbnail_url
+    assert os.path.exists(FileIO.thumbnail_dir_path + thumbnail_url[len(FileIO.thumbnail_dir_url):])
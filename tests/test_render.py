@@ -0,0 +1,33 @@
+import os
+
+from audio_fixtures import make_m4a, make_mp3
+from feed_generator import FeedGenerator, FeedInfo, FileIO, MusicInfo, TemplateRenderer
+
+
+def test_enclosure_type_follows_extension(htdocs):
+    os.makedirs(f"{FileIO.music_files_dir_path}album")
+    with open(f"{FileIO.music_files_dir_path}album/1.mp3", "wb") as f:
+        f.write(make_mp3("Album", "Track 1"))
+    with open(f"{FileIO.music_files_dir_path}album/2.m4a", "wb") as f:
+        f.write(make_m4a("Album", "Track 2"))
+
+    FeedGenerator.generate()
+
+    with open(FeedInfo(album_name="Album").file_path(), encoding="utf-8") as f:
+        feed_xml = f.read()
+    assert 'url="http://localhost/music_files/album/1.mp3" type="audio/mpeg"' in feed_xml
+    assert 'url="http://localhost/music_files/album/2.m4a" type="audio/mp4"' in feed_xml
+
+
+def test_item_xml_cache_is_bounded(htdocs, monkeypatch):
+    monkeypatch.setattr(TemplateRenderer, "item_xml_cache_size", 3)
+    music_info_list = [MusicInfo(fullpath=f"{FileIO.music_files_dir_path}{i}.mp3", album_name="Album", title=f"Track {i}",
+                                 duration_seconds=60, thumbnail_url=FileIO.default_thumbnail_url) for i in range(5)]
+    feed_info = FeedInfo(album_name="Album")
+
+    first_xml = "".join(TemplateRenderer.generate_feed_xml(feed_info, music_info_list, FileIO.default_thumbnail_url))
+    second_xml = "".join(TemplateRenderer.generate_feed_xml(feed_info, music_info_list, FileIO.default_thumbnail_url))
+
+    assert first_xml == second_xml
+    assert first_xml.count("<item>") == 5
+    assert list(TemplateRenderer.item_xml_cache) == [music_info.fullpath for music_info in music_info_list[2:]]
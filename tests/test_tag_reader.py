@@ -0,0 +1,69 @@
+import pytest
+
+import tag_reader
+from audio_fixtures import cover_image_data, make_m4a, make_mp3
+
+
+def write_file(tmp_path, filename: str, data: bytes) -> str:
+    path = str(tmp_path / filename)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+@pytest.mark.parametrize("version", [3, 4])
+def test_id3v2_text_frames(tmp_path, version):
+    path = write_file(tmp_path, "track.mp3", make_mp3("アルバム", "タイトル", version=version))
+
+    tag_info = tag_reader.read_tags(path)
+
+    assert tag_info.album == "アルバム"
+    assert tag_info.title == "タイトル"
+    assert tag_info.cover is None
+
+
+@pytest.mark.parametrize("version", [3, 4])
+def test_id3v2_apic_cover(tmp_path, version):
+    path = write_file(tmp_path, "track.mp3", make_mp3("Album", "Title", version=version, cover=cover_image_data))
+
+    cover = tag_reader.read_tags(path).cover
+
+    assert cover.mime_type == "image/jpeg"
+    assert cover.read(path) == cover_image_data
+
+
+def test_xing_duration(tmp_path):
+    path = write_file(tmp_path, "track.mp3", make_mp3("Album", "Title", frame_count=1000))
+
+    # MPEG1 Layer III は1フレーム 1152 サンプル、44.1kHz
+    assert tag_reader.read_tags(path).duration_seconds == pytest.approx(1000 * 1152 / 44100)
+
+
+def test_id3v1_fallback(tmp_path):
+    path = write_file(tmp_path, "track.mp3", make_mp3("Album v1", "Title v1", id3v1=True))
+
+    tag_info = tag_reader.read_tags(path)
+
+    assert tag_info.album == "Album v1"
+    assert tag_info.title == "Title v1"
+
+
+def test_mp4_ilst_and_covr(tmp_path):
+    path = write_file(tmp_path, "track.m4a", make_m4a("アルバム", "タイトル", cover=cover_image_data,
+                                                      timescale=1000, duration=90500))
+
+    tag_info = tag_reader.read_tags(path)
+
+    assert tag_info.album == "アルバム"
+    assert tag_info.title == "タイトル"
+    assert tag_info.duration_seconds == pytest.approx(90.5)
+    assert tag_info.cover.mime_type == "image/jpeg"
+    assert tag_info.cover.read(path) == cover_image_data
+
+
+def test_unsupported_file(tmp_path):
+    path = write_file(tmp_path, "notes.mp3", b"not a music file" * 10)
+
+    tag_info = tag_reader.read_tags(path)
+
+    assert tag_info is None or tag_info.album is None
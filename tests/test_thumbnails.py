@@ -0,0 +1,93 @@
+import os
+
+import feed_generator
+import tag_reader
+from audio_fixtures import cover_image_data, make_mp3
+from feed_generator import FeedGenerator, FileIO
+
+
+def write_track(file_path: str, album_name: str, title: str, cover: bytes = cover_image_data):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as f:
+        f.write(make_mp3(album_name, title, cover=cover))
+
+
+def test_tracks_with_same_cover_share_one_thumbnail_and_read_it_once(htdocs, monkeypatch):
+    read_count = []
+    read = tag_reader.CoverArt.read
+    monkeypatch.setattr(tag_reader.CoverArt, "read", lambda self, fullpath: read_count.append(fullpath) or read(self, fullpath))
+    fullpaths = [f"{FileIO.music_files_dir_path}album/{i}.mp3" for i in range(3)]
+    for i, fullpath in enumerate(fullpaths):
+        write_track(fullpath, "Album", f"Track {i}")
+
+    music_info_list = FileIO.parse_music_files(fullpaths)
+
+    assert len({music_info.thumbnail_url for music_info in music_info_list}) == 1
+    assert len(read_count) == 1
+    assert len(os.listdir(FileIO.thumbnail_dir_path)) == 1
+
+
+def test_different_covers_get_different_thumbnails(htdocs):
+    large_cover = b"\xff\xd8" + os.urandom(64 * 1024) + b"\xff\xd9"
+    fullpaths = [f"{FileIO.music_files_dir_path}album/{i}.mp3" for i in range(3)]
+    for fullpath, cover in zip(fullpaths, [cover_image_data, large_cover, large_cover]):
+        write_track(fullpath, "Album", os.path.basename(fullpath), cover)
+
+    music_info_list = FileIO.parse_music_files(fullpaths)
+
+    assert music_info_list[0].thumbnail_url != music_info_list[1].thumbnail_url
+    assert music_info_list[1].thumbnail_url == music_info_list[2].thumbnail_url
+    with open(FileIO.thumbnail_dir_path + music_info_list[1].thumbnail_url[len(FileIO.thumbnail_dir_url):], "rb") as f:
+        assert f.read() == large_cover
+
+
+def test_orphaned_thumbnails_are_removed_on_startup(htdocs):
+    write_track(f"{FileIO.music_files_dir_path}album/1.mp3", "Album", "Track 1")
+    # 旧バージョンが楽曲の MD5 をファイル名にして保存し、参照されなくなった画像と既定の画像
+    orphaned_path = f"{FileIO.thumbnail_dir_path}0123456789abcdef0123456789abcdef.jpg"
+    default_path = FileIO.thumbnail_dir_path + FileIO.default_thumbnail_url[len(FileIO.thumbnail_dir_url):]
+    for path in [orphaned_path, default_path]:
+        with open(path, "wb") as f:
+            f.write(cover_image_data)
+
+    FeedGenerator.generate()
+
+    thumbnail_url = FeedGenerator.get_catalog().album_tracks("Album")[0].thumbnail_url
+    assert not os.path.exists(orphaned_path)
+    assert os.path.exists(default_path)
+    assert os.path.exists(FileIO.thumbnail_dir_path + thumbnail_url[len(FileIO.thumbnail_dir_url):])
+
+
+def test_thumbnail_size_change_rederives_thumbnails(htdocs, monkeypatch):
+    """THUMBNAIL_MAX_SIZE を変えると、インデックス済みのトラックのサムネイルも新しい設定で作り直す"""
+    write_track(f"{FileIO.music_files_dir_path}album/1.mp3", "Album", "Track 1")
+    FeedGenerator.generate()
+    old_thumbnail_url = FeedGenerator.get_catalog().album_tracks("Album")[0].thumbnail_url
+
+    # Pillow の代わりに、縮小したことが分かるデータを返す
+    monkeypatch.setattr(feed_generator, "Image", object())
+    monkeypatch.setattr(FileIO, "resize_thumbnail", staticmethod(lambda image_data, extension: b"resized"))
+    monkeypatch.setattr(FileIO, "thumbnail_max_size", 300)
+    parsed_paths = []
+    parse_music_files = FileIO.parse_music_files
+    monkeypatch.setattr(FileIO, "parse_music_files", lambda fullpaths: parsed_paths.extend(fullpaths) or parse_music_files(fullpaths))
+
+    def restart():
+        FeedGenerator.render_scheduler.wait()
+        FileIO.music_index.connection.close()
+        FileIO.music_index = None
+        FeedGenerator.catalog = None
+        FeedGenerator.generate()
+    restart()
+
+    new_thumbnail_url = FeedGenerator.get_catalog().album_tracks("Album")[0].thumbnail_url
+    assert parsed_paths == [f"{FileIO.music_files_dir_path}album/1.mp3"]
+    assert new_thumbnail_url.endswith("-300.jpg")
+    assert not os.path.exists(FileIO.thumbnail_dir_path + old_thumbnail_url[len(FileIO.thumbnail_dir_url):])
+    with open(FileIO.thumbnail_dir_path + new_thumbnail_url[len(FileIO.thumbnail_dir_url):], "rb") as f:
+        assert f.read() == b"resized"
+
+    # 設定が変わらなければ読み直さない
+    parsed_paths.clear()
+    restart()
+    assert parsed_paths == []